@@ -0,0 +1,206 @@
+"""
+Helpers for writing many oparl objects with a few queries instead of a few queries per object.
+
+Django 2.1 neither has QuerySet.bulk_update nor returns the ids of bulk inserted rows on mysql, and bulk
+operations skip the signals that write the history and update the search index, so those are done here.
+"""
+
+from collections import defaultdict, OrderedDict
+from typing import Dict, Iterable, List, Set, Type, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Q, Value, When
+from django.utils import timezone
+
+from mainapp.functions.alert_percolator import percolate
+from mainapp.functions.search_tools import bump_search_generation
+from mainapp.models import DefaultFields
+
+
+def bulk_update(model: Type[DefaultFields], objects: List[DefaultFields]):
+    """ Writes all fields of the objects with one UPDATE per batch, like QuerySet.bulk_update in django 2.2 """
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    # Each object needs two parameters per field plus one for the where clause
+    batch_size = max(
+        connection.ops.bulk_batch_size(fields * 2 + [model._meta.pk], objects), 1
+    )
+    for start in range(0, len(objects), batch_size):
+        batch = objects[start : start + batch_size]
+        updates = {}
+        for field in fields:
+            whens = [
+                When(
+                    pk=obj.pk,
+                    then=Value(getattr(obj, field.attname), output_field=field),
+                )
+                for obj in batch
+            ]
+            updates[field.attname] = Case(*whens, output_field=field)
+        model.objects_with_deleted.filter(pk__in=[obj.pk for obj in batch]).update(
+            **updates
+        )
+
+
+def bulk_history_create(
+    model: Type[DefaultFields], objects: List[DefaultFields], history_type: str
+):
+    """ Writes the historical records a save() would have written, with history_type "+" or "~" """
+    history_date = timezone.now()
+    historical_model = model.history.model
+    historical_objects = []
+    for obj in objects:
+        fields = {
+            field.attname: getattr(obj, field.attname) for field in model._meta.fields
+        }
+        historical_objects.append(
+            historical_model(
+                history_date=history_date,
+                history_type=history_type,
+                history_user=None,
+                **fields
+            )
+        )
+    historical_model.objects.bulk_create(historical_objects)
+
+
+def update_search_index(model: Type[DefaultFields], objects: List[DefaultFields]):
+    """ Bulk variant of the update that the save and m2m_changed signals would have triggered """
+    if not settings.ELASTICSEARCH_ENABLED or not objects:
+        return
+
+    from django_elasticsearch_dsl.registries import registry
+
+    objects = list(OrderedDict((obj.pk, obj) for obj in objects).values())
+    for document in registry.get_documents([model]):
+        if not document._doc_type.ignore_signals:
+            document().update(objects)
+    bump_search_generation()
+    percolate(model, objects)
+
+
+def bulk_save(
+    model: Type[DefaultFields],
+    new_objects: List[DefaultFields],
+    changed_objects: List[DefaultFields],
+    history: bool = True,
+):
+    """ Inserts the new objects and updates the changed ones, including their history unless disabled """
+    if new_objects:
+        model.objects_with_deleted.bulk_create(new_objects)
+        # Only postgres returns the ids of bulk inserted rows
+        ids = dict(
+            model.objects_with_deleted.filter(
+                oparl_id__in=[obj.oparl_id for obj in new_objects]
+            ).values_list("oparl_id", "id")
+        )
+        for obj in new_objects:
+            obj.id = ids[obj.oparl_id]
+            obj._state.adding = False
+            obj._state.db = model.objects_with_deleted.db
+        if history:
+            bulk_history_create(model, new_objects, "+")
+
+    if changed_objects:
+        now = timezone.now()
+        for obj in changed_objects:
+            obj.modified = now
+        bulk_update(model, changed_objects)
+        if history:
+            bulk_history_create(model, changed_objects, "~")
+
+
+def sync_m2m(obj: DefaultFields, field_name: str, ids: Iterable[int]) -> bool:
+    """
+    Like getattr(obj, field_name).set(ids), but compares the primary keys with one query and only writes
+    the rows that were added or removed. Returns whether the relation changed
+    """
+    field = obj._meta.get_field(field_name)
+    through = field.remote_field.through
+    source_name = field.m2m_field_name()
+    target_name = field.m2m_reverse_field_name()
+
+    rows = through.objects.filter(**{source_name: obj.id})
+    current = set(rows.values_list(target_name, flat=True))
+    new = set(ids)
+    if current == new:
+        return False
+
+    if current - new:
+        rows.filter(**{target_name + "__in": current - new}).delete()
+    if new - current:
+        through.objects.bulk_create(
+            [
+                through(**{source_name + "_id": obj.id, target_name + "_id": target})
+                for target in new - current
+            ]
+        )
+    return True
+
+
+class M2MBatch:
+    """
+    Collects the new values of all many-to-many relations of a batch of objects and writes only the
+    differences, with one query per relation for reading and at most two for writing.
+    """
+
+    def __init__(self, model: Type[DefaultFields], objects: Iterable[DefaultFields]):
+        self.model = model
+        self.ids = {obj.id for obj in objects}
+        self.current = {}  # type: Dict[str, Dict[int, Set[int]]]
+        self.pending = defaultdict(dict)  # type: Dict[str, Dict[int, Set[int]]]
+
+        for field in model._meta.many_to_many:
+            rows = field.remote_field.through.objects.filter(
+                **{field.m2m_field_name() + "__in": self.ids}
+            ).values_list(field.m2m_field_name(), field.m2m_reverse_field_name())
+            self.current[field.name] = defaultdict(set)
+            for source, target in rows:
+                self.current[field.name][source].add(target)
+
+    def contains(self, obj: DefaultFields) -> bool:
+        return isinstance(obj, self.model) and obj.id in self.ids
+
+    def set(self, obj: DefaultFields, field_name: str, ids: Iterable[int]) -> bool:
+        """ Like getattr(obj, field_name).set(ids), but only stored. Returns whether the relation changed """
+        new = set(ids)
+        self.pending[field_name][obj.id] = new
+        return new != self.current[field_name][obj.id]
+
+    def add(self, obj: DefaultFields, field_name: str, ids: Iterable[int]) -> bool:
+        """ Like getattr(obj, field_name).add(*ids), but only stored. Returns whether the relation changed """
+        pending = self.pending[field_name].get(obj.id)
+        if pending is None:
+            pending = self.current[field_name][obj.id]
+        return self.set(obj, field_name, pending | set(ids))
+
+    def flush(self):
+        for field_name, pending in self.pending.items():
+            field = self.model._meta.get_field(field_name)
+            through = field.remote_field.through
+            source_name = field.m2m_field_name()
+            target_name = field.m2m_reverse_field_name()
+
+            removed = Q()
+            added = []  # type: List[Tuple[int, int]]
+            for source, targets in pending.items():
+                current = self.current[field_name][source]
+                if current - targets:
+                    removed |= Q(
+                        **{source_name: source, target_name + "__in": current - targets}
+                    )
+                added.extend((source, target) for target in targets - current)
+                self.current[field_name][source] = targets
+
+            if removed:
+                through.objects.filter(removed).delete()
+            if added:
+                through.objects.bulk_create(
+                    [
+                        through(
+                            **{source_name + "_id": source, target_name + "_id": target}
+                        )
+                        for source, target in added
+                    ]
+                )
+        self.pending.clear()
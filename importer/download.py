@@ -0,0 +1,128 @@
+import hashlib
+import logging
+from tempfile import NamedTemporaryFile
+from typing import Optional, Dict
+
+import requests
+from minio.definitions import Object
+from minio.error import NoSuchKey
+
+from mainapp.functions.minio import minio_client
+from mainapp.models import File, FileBlob
+
+logger = logging.getLogger(__name__)
+
+sha256_metadata = "X-Amz-Meta-Sha256"
+
+
+class Download:
+    """ A file downloaded to disk, with its size and sha256 computed while downloading """
+
+    def __init__(self):
+        self.tmpfile = NamedTemporaryFile()
+        self.size = 0
+        self.sha256 = None  # type: Optional[str]
+        self.etag = None  # type: Optional[str]
+        self.last_modified = None  # type: Optional[str]
+
+    @property
+    def name(self) -> str:
+        return self.tmpfile.name
+
+    def get_metadata(self) -> Dict[str, str]:
+        return {sha256_metadata: self.sha256}
+
+    def close(self):
+        self.tmpfile.close()
+
+
+def get_stored_object(bucket: str, object_name: str) -> Optional[Object]:
+    try:
+        return minio_client.stat_object(bucket, object_name)
+    except NoSuchKey:
+        return None
+
+
+def get_conditional_headers(file: File) -> Dict[str, str]:
+    """
+    Returns If-None-Match and If-Modified-Since headers for the source of the last download of the file.
+
+    The validators belong to the file and not to the stored object, which can be shared by files from other urls.
+    """
+    headers = {}
+    if file.source_etag:
+        headers["If-None-Match"] = file.source_etag
+    if file.source_last_modified:
+        headers["If-Modified-Since"] = file.source_last_modified
+    return headers
+
+
+def stream_download(
+    session: requests.Session,
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+    chunk_size: int = 64 * 1024,
+) -> Optional[Download]:
+    """
+    Downloads the url to a temporary file in chunks, so the memory usage doesn't depend on the file size.
+
+    Returns None if the server answered a conditional request with 304 Not Modified. Raises HTTPError for
+    other unsuccessful responses.
+    """
+    with session.get(
+        url, headers=headers, stream=True, allow_redirects=True, timeout=timeout
+    ) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        download = Download()
+        sha256 = hashlib.sha256()
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                download.tmpfile.write(chunk)
+                sha256.update(chunk)
+                download.size += len(chunk)
+        except Exception:
+            download.close()
+            raise
+
+        download.tmpfile.flush()
+        download.tmpfile.seek(0)
+        download.sha256 = sha256.hexdigest()
+        download.etag = response.headers.get("ETag")
+        download.last_modified = response.headers.get("Last-Modified")
+        return download
+
+
+def upload_download(
+    download: Download, bucket: str, object_name: str, content_type: str
+):
+    """ Uploads the file from disk, which minio does with a multipart upload for large files """
+    download.tmpfile.seek(0)
+    minio_client.put_object(
+        bucket,
+        object_name,
+        download.tmpfile,
+        download.size,
+        content_type=content_type,
+        metadata=download.get_metadata(),
+    )
+    download.tmpfile.seek(0)
+
+
+def store_blob(download: Download, bucket: str, mime_type: str) -> FileBlob:
+    """
+    Returns the blob for the content of the download, which is only uploaded if it wasn't stored before.
+
+    The object is named by the sha256, so files with the same content share one object.
+    """
+    blob, created = FileBlob.objects.get_or_create(
+        sha256=download.sha256, defaults={"size": download.size, "mime_type": mime_type}
+    )
+    if created or not get_stored_object(bucket, blob.sha256):
+        upload_download(download, bucket, blob.sha256, mime_type)
+    else:
+        logger.info("The content of {} is already stored".format(download.sha256))
+    return blob
@@ -20,7 +20,14 @@ def get_importer(options: dict) -> "OParlImport":
 
     from importer.oparl_resolve import OParlResolver
 
-    resolver = OParlResolver(options["entrypoint"], options["use_cache"])
+    resolver = OParlResolver(
+        options["entrypoint"],
+        options["use_cache"],
+        timeout=options["timeout"],
+        retries=options["retries"],
+        prefetch_workers=options["prefetch_workers"],
+        max_requests_per_host=options["max_requests_per_host"],
+    )
 
     system = json.loads(resolver.resolve(options["entrypoint"]).get_resolved_data())
 
@@ -0,0 +1,96 @@
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Optional, Set, Type, Iterable
+
+from django.db.models.signals import post_save
+
+from mainapp.models import DefaultFields
+
+logger = logging.getLogger(__name__)
+
+
+class IdentityMap:
+    """
+    Maps the oparl ids to the primary keys of the imported objects, so looking up the target of a reference
+    doesn't need a query.
+
+    The ids of a model are loaded with a single query on the first lookup and every saved object is added
+    through the post_save signal. Objects written with bulk queries need to be added with add(). Ids that are
+    still unknown are looked up in the database, because they might have been imported by another process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = {}  # type: Dict[Type[DefaultFields], Dict[str, int]]
+        self.deleted = {}  # type: Dict[Type[DefaultFields], Set[int]]
+        self.hits = Counter()  # type: Counter
+        self.queries = Counter()  # type: Counter
+
+        post_save.connect(self.saved)
+
+    def preload(self, model: Type[DefaultFields]):
+        with self.lock:
+            if model in self.ids:
+                return
+            self.ids[model] = {}
+            self.deleted[model] = set()
+            rows = model.objects_with_deleted.exclude(oparl_id=None).values_list(
+                "oparl_id", "id", "deleted"
+            )
+            for oparl_id, pk, deleted in rows:
+                self._add(model, oparl_id, pk, deleted)
+
+    def _add(self, model: Type[DefaultFields], oparl_id: str, pk: int, deleted: bool):
+        self.ids[model][oparl_id] = pk
+        if deleted:
+            self.deleted[model].add(pk)
+        else:
+            self.deleted[model].discard(pk)
+
+    def add(self, objects: Iterable[DefaultFields]):
+        with self.lock:
+            for obj in objects:
+                if obj.oparl_id and obj.__class__ in self.ids:
+                    self._add(obj.__class__, obj.oparl_id, obj.pk, obj.deleted)
+
+    # noinspection PyUnusedLocal
+    def saved(self, sender, instance, **kwargs):
+        if isinstance(instance, DefaultFields):
+            self.add([instance])
+
+    def get(
+        self, model: Type[DefaultFields], oparl_id: str, with_deleted: bool = False
+    ) -> Optional[int]:
+        """ Returns the primary key for the oparl id or None. Deleted objects are ignored unless with_deleted """
+        self.preload(model)
+        with self.lock:
+            pk = self.ids[model].get(oparl_id)
+            if pk is not None:
+                self.hits[model.__name__] += 1
+                if not with_deleted and pk in self.deleted[model]:
+                    return None
+                return pk
+            self.queries[model.__name__] += 1
+
+        row = (
+            model.objects_with_deleted.filter(oparl_id=oparl_id)
+            .values_list("id", "deleted")
+            .first()
+        )
+        if not row:
+            return None
+        pk, deleted = row
+        with self.lock:
+            self._add(model, oparl_id, pk, deleted)
+        if deleted and not with_deleted:
+            return None
+        return pk
+
+    def log_statistics(self):
+        for model_name in sorted(set(self.hits) | set(self.queries)):
+            logger.info(
+                "{}: {} lookups served by the identity map, {} from the database".format(
+                    model_name, self.hits[model_name], self.queries[model_name]
+                )
+            )
@@ -1,18 +1,34 @@
 import json
 import logging
-from datetime import date, datetime
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 from importlib import import_module
-from typing import Optional, Type, Tuple, TypeVar, Callable
+from typing import Optional, Type, Tuple, TypeVar, Callable, List, Dict, Set
 
 import gi
 from django.conf import settings
 from django.utils import dateparse
 
+from importer.bulk import (
+    bulk_history_create,
+    bulk_save,
+    bulk_update,
+    M2MBatch,
+    sync_m2m,
+    update_search_index,
+)
+from importer.identity_map import IdentityMap
+from importer.profiling import profiled, profiler
+from mainapp.functions.alert_percolator import percolate
 from mainapp.functions.document_parsing import (
-    extract_text_from_pdf,
-    get_page_count_from_pdf,
+    extract_locations,
+    extract_persons,
+    get_extraction_version,
 )
-from mainapp.models import DefaultFields, File
+from mainapp.functions.extraction import ExtractionPool, extractable_mime_types
+from mainapp.models import DefaultFields, File, FileBlob
 from mainapp.models.default_fields import ShortableNameFields
 
 gi.require_version("OParl", "0.4")
@@ -29,6 +45,19 @@ default_options = {
     "batchsize": 1,
     "threadcount": 10,
     "entrypoint": settings.OPARL_ENDPOINT,
+    "timeout": 60,
+    "retries": 3,
+    "prefetch_workers": 4,
+    "max_requests_per_host": 4,
+    "extraction_workers": None,
+    "processes": 0,
+    "pages_per_shard": 10,
+    "resume": False,
+    "pipeline": False,
+    "parse_workers": 1,
+    "persist_workers": 2,
+    "download_workers": 4,
+    "queue_size": 4,
 }
 
 
@@ -39,6 +68,7 @@ class OParlHelper:
     """
 
     def __init__(self, options, resolver):
+        self.options = options
         self.resolver = resolver
         self.ignore_modified = options["ignore_modified"]
         self.entrypoint = options["entrypoint"]
@@ -47,9 +77,17 @@ class OParlHelper:
         self.threadcount = options["threadcount"]
         self.batchsize = options["batchsize"]
         self.no_threads = options["no_threads"]
+        self.processes = options["processes"]
+        self.pages_per_shard = options["pages_per_shard"]
+        self.resume = options["resume"]
         self.download_files = options["download_files"]
         self.official_geojson = True
         self.filename_length_cutoff = 100
+        # How far incremental syncs reach back before the start of the last sync
+        self.sync_overlap = timedelta(hours=1)
+        # The sharded import retries failed objects with exponential backoff, starting with this many seconds
+        self.failure_retries = 3
+        self.failure_backoff = 10
         self.organization_classification = {
             "Fraktion": settings.PARLIAMENTARY_GROUPS_TYPE[0],
             "Fraktionen": settings.PARLIAMENTARY_GROUPS_TYPE[0],
@@ -63,6 +101,12 @@ class OParlHelper:
         self.errorlist = []
         self.logger = logging.getLogger(__name__)
 
+        # The rows and many-to-many relations loaded in advance for the batch that is currently processed.
+        # Every thread of run_multithreaded processes its own batches
+        self.batch = threading.local()
+        self.identity_map = IdentityMap()
+        self.extraction_pool = ExtractionPool(options["extraction_workers"])
+
         if settings.CUSTOM_IMPORT_HOOKS:
             self.custom_hooks = import_module(settings.CUSTOM_IMPORT_HOOKS)
         else:
@@ -110,6 +154,7 @@ class OParlHelper:
     T = TypeVar("T", bound=DefaultFields)
     U = TypeVar("U", bound=OParl.Object)
 
+    @profiled("process_object", 2)
     def process_object(
         self,
         libobject: U,
@@ -120,31 +165,191 @@ class OParlHelper:
         """
         We split an object into two parts: It's value properties and the embedded objects. This is necessary because
         the outer object might not have been modified while its embedded inner objects have.
+
+        If the fingerprint of the json is the one of the last import, both parts are skipped.
         """
         outer_object, do_update = self.check_for_modification(libobject, constructor)
+        if not do_update and self.fingerprint_matches(libobject, outer_object):
+            return outer_object
         if do_update:
             core(libobject, outer_object)
             outer_object.save()
         if outer_object:
-            associates_changed = embedded(libobject, outer_object)
+            with self.forget_fingerprints_on_error(constructor, [outer_object]):
+                associates_changed = embedded(libobject, outer_object)
             if associates_changed:
                 outer_object.save()
+            if do_update or associates_changed:
+                # Only now the organizations and persons are set
+                percolate(constructor, [outer_object])
 
         return outer_object
 
+    @profiled("process_batch", 2)
+    def process_batch(
+        self,
+        libobjects: List[U],
+        constructor: Type[T],
+        core: Callable[[U, T], None],
+        embedded: Callable[[U, T], bool],
+        embedded_objects: Optional[Dict[Type[DefaultFields], Callable]] = None,
+    ) -> List[T]:
+        """
+        Does the same as process_object for a whole batch of objects, but loads the existing rows and
+        many-to-many relations with one query per model and writes them with bulk queries.
+
+        embedded_objects maps models to functions returning the embedded liboparl objects of that type,
+        e.g. the files of a paper, which are then also loaded in advance.
+        """
+        # A duplicate would be inserted twice
+        unique = OrderedDict()  # type: Dict[str, U]
+        for libobject in libobjects:
+            unique.setdefault(libobject.get_id(), libobject)
+        libobjects = list(unique.values())
+
+        self.batch.prefetched = {}
+        self.batch.m2m = None
+        try:
+            self.prefetch(constructor, [i.get_id() for i in libobjects])
+            for model, get_embedded in (embedded_objects or {}).items():
+                oparl_ids = []
+                for libobject in libobjects:
+                    oparl_ids += [i.get_id() for i in get_embedded(libobject) if i]
+                self.prefetch(model, oparl_ids)
+
+            outer_objects = []
+            new_objects = []
+            changed_objects = []  # type: List[T]
+            unchanged = set()  # type: Set[str]
+            for libobject in libobjects:
+                outer_object, do_update = self.check_for_modification(
+                    libobject, constructor
+                )
+                if not do_update and self.fingerprint_matches(libobject, outer_object):
+                    unchanged.add(libobject.get_id())
+                elif do_update:
+                    core(libobject, outer_object)
+                    if outer_object.id:
+                        changed_objects.append(outer_object)
+                    else:
+                        new_objects.append(outer_object)
+                outer_objects.append(outer_object)
+            # The embedded objects need the ids. The history is written once they set the foreign keys
+            bulk_save(constructor, new_objects, [], history=False)
+            self.identity_map.add(new_objects)
+            new_ids = {obj.id for obj in new_objects}
+
+            existing = [i for i in outer_objects if i and i.oparl_id not in unchanged]
+            self.batch.m2m = M2MBatch(constructor, existing)
+            associated_new_objects = []
+            try:
+                with self.forget_fingerprints_on_error(constructor, existing):
+                    for libobject, outer_object in zip(libobjects, outer_objects):
+                        if outer_object and outer_object.oparl_id not in unchanged:
+                            associates_changed = embedded(libobject, outer_object)
+                            if not associates_changed:
+                                continue
+                            if outer_object.id in new_ids:
+                                associated_new_objects.append(outer_object)
+                            elif outer_object not in changed_objects:
+                                changed_objects.append(outer_object)
+            except Exception:
+                # They were inserted nonetheless
+                bulk_history_create(constructor, new_objects, "+")
+                raise
+            self.batch.m2m.flush()
+            # The new objects get only the "+" entry, with the associations they ended up with
+            bulk_update(constructor, associated_new_objects)
+            bulk_history_create(constructor, new_objects, "+")
+            bulk_save(constructor, [], changed_objects)
+            update_search_index(constructor, new_objects + changed_objects)
+        finally:
+            self.batch.prefetched = {}
+            self.batch.m2m = None
+
+        return outer_objects
+
+    def prefetch(self, constructor: Type[DefaultFields], oparl_ids: List[str]):
+        """ Loads the rows for the current batch with one query, so check_for_modification needs none """
+        rows = constructor.objects_with_deleted.in_bulk(
+            oparl_ids, field_name="oparl_id"
+        )
+        prefetched = self.batch.prefetched.setdefault(constructor, {})
+        for oparl_id in oparl_ids:
+            prefetched[oparl_id] = rows.get(oparl_id)
+
+    def get_existing(
+        self, constructor: Type[DefaultFields], oparl_id: str
+    ) -> Optional[DefaultFields]:
+        prefetched = getattr(self.batch, "prefetched", {}).get(constructor, {})
+        if oparl_id in prefetched:
+            # Objects created later in the batch aren't in there, so we only use this once for a missing row
+            if prefetched[oparl_id] is None:
+                return prefetched.pop(oparl_id)
+            return prefetched[oparl_id]
+        return constructor.objects_with_deleted.filter(oparl_id=oparl_id).first()
+
+    def set_m2m(self, obj: DefaultFields, field_name: str, values: List) -> bool:
+        """ Sets a many-to-many relation to objects or primary keys and returns whether it has changed """
+        ids = [value if isinstance(value, int) else value.id for value in values]
+        m2m = getattr(self.batch, "m2m", None)  # type: Optional[M2MBatch]
+        if m2m and m2m.contains(obj):
+            return m2m.set(obj, field_name, ids)
+        return sync_m2m(obj, field_name, ids)
+
+    def fingerprint_matches(
+        self, libobject: OParl.Object, dbobject: Optional[DefaultFields]
+    ) -> bool:
+        """ Whether the object was imported from exactly the same json before """
+        if not dbobject or not dbobject.id or self.ignore_modified:
+            return False
+        fingerprint = self.resolver.get_fingerprint(libobject.get_id())
+        return fingerprint is not None and dbobject.oparl_fingerprint == fingerprint
+
+    @contextmanager
+    def forget_fingerprints_on_error(
+        self, constructor: Type[DefaultFields], objects: List[DefaultFields]
+    ):
+        """
+        If importing the embedded objects fails or adds to the error list, the fingerprints are removed
+        again, so the objects aren't skipped by the next import
+        """
+        errors_before = len(self.errorlist)
+        try:
+            yield
+        except Exception:
+            self.forget_fingerprints(constructor, objects)
+            raise
+        if len(self.errorlist) > errors_before:
+            self.forget_fingerprints(constructor, objects)
+
+    @staticmethod
+    def forget_fingerprints(
+        constructor: Type[DefaultFields], objects: List[DefaultFields]
+    ):
+        for obj in objects:
+            obj.oparl_fingerprint = None
+        constructor.objects_with_deleted.filter(
+            id__in=[obj.id for obj in objects if obj.id]
+        ).update(oparl_fingerprint=None)
+
     E = TypeVar("E", bound=DefaultFields)
 
+    @profiled("check_for_modification", 2)
     def check_for_modification(
         self, libobject: OParl.Object, constructor: Type[E], name_fixup=None
     ) -> Tuple[Optional[E], bool]:
-        """ Checks common criterias for oparl objects. """
+        """ Checks common criterias for oparl objects.
+
+        If the resolver knows the fingerprint of the json, it decides whether the object has been modified,
+        otherwise the modified date does.
+        """
         if not libobject:
             return None, False
 
         oparl_id = libobject.get_id()
-        dbobject = constructor.objects_with_deleted.filter(
-            oparl_id=oparl_id
-        ).first()  # type: DefaultFields
+        dbobject = self.get_existing(constructor, oparl_id)  # type: DefaultFields
+        fingerprint = self.resolver.get_fingerprint(oparl_id)
         if not dbobject:
             if libobject.get_deleted():
                 # This was deleted before it could be imported, so we skip it
@@ -152,6 +357,7 @@ class OParlHelper:
             self.logger.debug("New %s", oparl_id)
             dbobject = constructor()
             dbobject.oparl_id = oparl_id
+            dbobject.oparl_fingerprint = fingerprint
             dbobject.deleted = libobject.get_deleted()
             if isinstance(dbobject, ShortableNameFields):
                 dbobject.name = libobject.get_name() or name_fixup
@@ -167,6 +373,8 @@ class OParlHelper:
         parsed_modified = self.glib_datetime_to_python(libobject.get_modified())
         if self.ignore_modified:
             is_modified = True
+        elif fingerprint:
+            is_modified = dbobject.oparl_fingerprint != fingerprint
         elif not libobject.get_modified():
             self.logger.debug("No modified on {}".format(oparl_id))
             is_modified = True
@@ -183,6 +391,7 @@ class OParlHelper:
                 dbobject.id,
                 oparl_id,
             )
+            dbobject.oparl_fingerprint = fingerprint
             if isinstance(dbobject, ShortableNameFields):
                 dbobject.name = libobject.get_name() or name_fixup
                 dbobject.set_short_name(libobject.get_short_name() or dbobject.name)
@@ -196,28 +405,62 @@ class OParlHelper:
             )
         return dbobject, is_modified
 
-    def extract_text_from_file(self, file: File, path: str):
-        parsed_text = None
-        if file.mime_type == "application/pdf":
-            self.logger.info(
-                "Extracting text from PDF for file {} ({})".format(file.id, file)
+    @profiled("extract_text_from_file")
+    def extract_text_from_file(self, file: File, path: str) -> Optional[str]:
+        """ Waits for the text and the page count from the extraction pool """
+        if file.mime_type not in extractable_mime_types:
+            return None
+
+        self.logger.info(
+            "Extracting text from {} for file {} ({})".format(
+                file.mime_type, file.id, file
             )
-            try:
-                parsed_text = extract_text_from_pdf(path)
-                file.page_count = get_page_count_from_pdf(path)
-            except Exception as e:
-                message = "Could not parse pdf for file {}: {}".format(file.id, e)
-                self.logger.exception(message)
-                self.errorlist.append(message)
-        elif file.mime_type == "text/text":
-            with open(path) as f:
-                parsed_text = f.read()
+        )
+        try:
+            parsed_text, page_count = self.extraction_pool.extract(path, file.mime_type)
+        except Exception as e:
+            message = "Could not parse {} for file {}: {}".format(
+                file.mime_type, file.id, e
+            )
+            self.logger.exception(message)
+            self.errorlist.append(message)
+            return None
+
+        if page_count is not None:
+            file.page_count = page_count
         return parsed_text
 
-    @staticmethod
-    def is_queryset_equal_list(queryset, other):
-        """ Sufficiently correct comparison of a querysets and a list, inspired by django's assertQuerysetEqual """
-        return list(queryset.order_by("id").all()) == sorted(other, key=id)
+    def extract_blob(self, file: File, path: str):
+        """
+        Extracts text, page count, locations and persons from the content of the file. This is done only once
+        per content, the other files with the same content reuse the results stored with the blob.
+        """
+        blob = file.blob
+        if blob.extracted:
+            self.logger.info(
+                "Reusing the extracted data of {} for file {}".format(
+                    blob.sha256, file.id
+                )
+            )
+            return
+
+        file.page_count = None
+        blob.parsed_text = self.extract_text_from_file(file, path)
+        blob.page_count = file.page_count
+        blob.extracted = True
+        self.extract_blob_associations(blob, get_extraction_version())
+
+    def extract_blob_associations(self, blob: FileBlob, version: str):
+        """ Extracts the locations and the persons from the text of the blob and saves it """
+        with profiler.stage("extract_locations"):
+            blob.locations.set(extract_locations(blob.parsed_text))
+        # The name of the file is matched separately, as it can differ between files with the same content
+        with profiler.stage("extract_persons"):
+            blob.mentioned_persons.set(
+                extract_persons("\n" + (blob.parsed_text or "") + "\n")
+            )
+        blob.extraction_version = version
+        blob.save()
 
     def call_custom_hook(self, hook_name, hook_parameter):
         if self.custom_hooks and hasattr(self.custom_hooks, hook_name):
@@ -1,18 +1,50 @@
 import concurrent
+import json
 import logging
 import sys
+import time
 import traceback
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor as Pool
-from typing import Callable, TypeVar, List
+from multiprocessing import Pool as ProcessPool
+from typing import Callable, TypeVar, List, Optional, Dict, NamedTuple, Tuple, Any
 
 import gi
+from django.db import connections
+from django.utils import timezone
 
-from mainapp.models import Body
+from importer.functions import get_importer
+from importer.pipeline import ImportPipeline
+from mainapp.models import Body, SyncWatermark, ImportJournal, ImportCheckpoint
 from .oparl_objects import OParlObjects
 
 gi.require_version("OParl", "0.4")
 from gi.repository import GLib, OParl
 
+# A range of pages of one list of a body, which is imported by one worker process
+Shard = NamedTuple(
+    "Shard",
+    [("body", str), ("list_name", str), ("list_url", str), ("pages", List[str])],
+)
+
+
+# The importer of a worker process of run_multiprocess
+worker_importer = None  # type: Optional[OParlImport]
+
+
+def init_worker(options: Dict[str, Any]):
+    """ Every worker process has its own liboparl client, resolver and database connection """
+    global worker_importer
+    worker_importer = get_importer(options)
+
+
+def import_shard(shard: Shard) -> Tuple[Shard, Dict[str, Any], List[list]]:
+    """ Runs in a worker process. Returns the queues for add_missing_associations and the failures """
+    worker_importer.reset_queues()
+    worker_importer.errorlist = []
+    worker_importer.import_shard(shard)
+    return shard, worker_importer.export_queues(), worker_importer.get_failures()
+
 
 class OParlImport(OParlObjects):
     """ Imports a oparl 1.0 compatible endpoint into the database.
@@ -35,31 +67,72 @@ class OParlImport(OParlObjects):
             self.logger.fatal("Aborting.")
             sys.exit(1)
 
+    def batches(self, objectlist: List[T]) -> List[List[T]]:
+        return [
+            objectlist[i : i + self.batchsize]
+            for i in range(0, len(objectlist), self.batchsize)
+        ]
+
     def list_batched(
-        self, objectlistfn: Callable[[], List[T]], fn: Callable[[T], None]
+        self,
+        objectlistfn: Callable[[], List[T]],
+        fn: Callable[[T], None],
+        batchfn: Optional[Callable[[List[T]], None]] = None,
     ):
-        """ This was meant for batchwise processing, but is disabled since the apis can be so slow that it timed out """
+        """ Processes the list with batchfn in batches of batchsize or with fn one by one if the batchsize is 1 """
         objectlist = objectlistfn()
-        for item in objectlist:
-            fn(item)
+        if batchfn and self.batchsize > 1:
+            for batch in self.batches(objectlist):
+                batchfn(batch)
+        else:
+            for item in objectlist:
+                fn(item)
 
     def list_caught(
-        self, objectlistfn: Callable[[], List[T]], fn: Callable[[T], None]
+        self,
+        objectlistfn: Callable[[], List[T]],
+        fn: Callable[[T], None],
+        batchfn: Optional[Callable[[List[T]], None]] = None,
     ) -> int:
         """ Downloads and parses a body list and llogs all errors immediately.
 
-        This is a fixup for python's broken error handling with threadpools.
+        This is a fixup for python's broken error handling with threadpools. If a batch fails, its objects are
+        processed again one by one, so only the broken objects are missing.
         """
+        return self.process_caught(objectlistfn(), fn, batchfn)
+
+    def process_caught(
+        self,
+        objectlist: List[T],
+        fn: Callable[[T], None],
+        batchfn: Optional[Callable[[List[T]], None]] = None,
+    ) -> int:
+        """ The processing part of list_caught, returns the number of errors """
         err_count = 0
-        objectlist = objectlistfn()
-        for item in objectlist:
-            try:
-                fn(item)
-            except Exception as e:
-                self.logger.error("An error occured: {}".format(e))
-                self.logger.error(traceback.format_exc())
-                self.errorlist.append((item.get_id(), e, traceback.format_exc()))
-                err_count += 1
+        if batchfn and self.batchsize > 1:
+            batches = self.batches(objectlist)
+        else:
+            batches = [[item] for item in objectlist]
+
+        for batch in batches:
+            if len(batch) > 1:
+                try:
+                    batchfn(batch)
+                    continue
+                except Exception as e:
+                    self.logger.error(
+                        "An error occured in a batch, retrying one by one: {}".format(e)
+                    )
+                    self.logger.error(traceback.format_exc())
+
+            for item in batch:
+                try:
+                    fn(item)
+                except Exception as e:
+                    self.logger.error("An error occured: {}".format(e))
+                    self.logger.error(traceback.format_exc())
+                    self.errorlist.append((item.get_id(), e, traceback.format_exc()))
+                    err_count += 1
 
         return err_count
 
@@ -91,13 +164,18 @@ class OParlImport(OParlObjects):
                         "side. This looks fishy".format(body.get_id)
                     )
                 continue
-            self.list_batched(body.get_paper, self.paper)
-            self.list_batched(body.get_person, self.person)
-            self.list_batched(body.get_organization, self.organization)
-            self.list_batched(body.get_meeting, self.meeting)
+            self.list_batched(body.get_paper, self.paper, self.paper_batch)
+            self.list_batched(body.get_person, self.person, self.person_batch)
+            self.list_batched(
+                body.get_organization, self.organization, self.organization_batch
+            )
+            self.list_batched(body.get_meeting, self.meeting, self.meeting_batch)
 
         self.logger.info("Finished creating objects")
         self.add_missing_associations()
+        self.identity_map.log_statistics()
+        self.resolver.close()
+        self.extraction_pool.close()
 
     def bodies_multithread(self, bodies):
         self.logger.info("Creating bodies")
@@ -118,18 +196,25 @@ class OParlImport(OParlObjects):
             self.logger.info("Submitting concurrent tasks")
             futures = {}
             for body in bodies:
-                future = executor.submit(self.list_caught, body.get_paper, self.paper)
+                future = executor.submit(
+                    self.list_caught, body.get_paper, self.paper, self.paper_batch
+                )
                 futures[future] = body.get_short_name() or body.get_name() + ": Paper"
-                future = executor.submit(self.list_caught, body.get_person, self.person)
+                future = executor.submit(
+                    self.list_caught, body.get_person, self.person, self.person_batch
+                )
                 futures[future] = body.get_short_name() or body.get_name() + ": Person"
                 future = executor.submit(
-                    self.list_caught, body.get_organization, self.organization
+                    self.list_caught,
+                    body.get_organization,
+                    self.organization,
+                    self.organization_batch,
                 )
                 futures[future] = (
                     body.get_short_name() or body.get_name() + ": Organization"
                 )
                 future = executor.submit(
-                    self.list_caught, body.get_meeting, self.meeting
+                    self.list_caught, body.get_meeting, self.meeting, self.meeting_batch
                 )
                 futures[future] = body.get_short_name() or body.get_name() + ": Meeting"
             self.logger.info("Finished submitting concurrent tasks")
@@ -150,8 +235,305 @@ class OParlImport(OParlObjects):
         for i in self.errorlist:
             self.logger.error(i)
 
+        self.identity_map.log_statistics()
+        self.resolver.close()
+        self.extraction_pool.close()
+
+    def get_list_urls(self, body: OParl.Body) -> Dict[str, str]:
+        """ liboparl doesn't expose the urls of the lists of a body, so we take them from the json """
+        data = json.loads(self.resolver.resolve(body.get_id()).get_resolved_data())
+        return {
+            list_name: data[list_name]
+            for list_name in ["paper", "person", "organization", "meeting"]
+            if data.get(list_name)
+        }
+
+    def sync_list(
+        self,
+        body: Body,
+        list_name: str,
+        url: Optional[str],
+        objectlistfn: Callable[[], List[T]],
+        fn: Callable[[T], None],
+        batchfn: Callable[[List[T]], None],
+        full: bool,
+    ):
+        """
+        Imports the objects of the list that were modified since the last sync, or all of them if there
+        wasn't a sync before or full is set. Deleted objects come as tombstones with deleted set.
+
+        The watermark is only moved once the whole list was imported, so a failed sync is repeated
+        the next time.
+        """
+        watermark = SyncWatermark.objects.filter(body=body, list_name=list_name).first()
+        started = timezone.now()
+
+        if watermark and url and not full:
+            # Objects modified while the last sync was running might have been missed otherwise
+            modified_since = watermark.modified - self.sync_overlap
+            self.logger.info(
+                "Loading the {} of {} modified since {}".format(
+                    list_name, body, modified_since
+                )
+            )
+            self.resolver.set_modified_since(url, modified_since)
+        else:
+            self.logger.info("Loading all {} of {}".format(list_name, body))
+
+        try:
+            self.list_batched(objectlistfn, fn, batchfn)
+        finally:
+            if url:
+                self.resolver.set_modified_since(url, None)
+
+        SyncWatermark.objects.update_or_create(
+            body=body, list_name=list_name, defaults={"modified": started}
+        )
+
+    def run_incremental(self, full: bool = False):
+        """ Like run_singlethread, but only loads the objects that were modified since the last sync """
+        bodies = self.get_bodies()
+        self.bodies_singlethread(bodies)
+
+        self.logger.info("Syncing objects")
+        for libobject in bodies:
+            body = Body.objects.filter(oparl_id=libobject.get_id()).first()
+            if not body:
+                self.logger.error(
+                    "Body {} is not in the database, skipping.".format(
+                        libobject.get_id()
+                    )
+                )
+                continue
+
+            urls = self.get_list_urls(libobject)
+            lists = [
+                ("paper", libobject.get_paper, self.paper, self.paper_batch),
+                ("person", libobject.get_person, self.person, self.person_batch),
+                (
+                    "organization",
+                    libobject.get_organization,
+                    self.organization,
+                    self.organization_batch,
+                ),
+                ("meeting", libobject.get_meeting, self.meeting, self.meeting_batch),
+            ]
+            for list_name, objectlistfn, fn, batchfn in lists:
+                self.sync_list(
+                    body,
+                    list_name,
+                    urls.get(list_name),
+                    objectlistfn,
+                    fn,
+                    batchfn,
+                    full,
+                )
+
+        self.logger.info("Finished syncing objects")
+        self.add_missing_associations()
+        self.identity_map.log_statistics()
+        self.resolver.close()
+        self.extraction_pool.close()
+
+    def get_page_urls(self, url: str) -> List[str]:
+        """ Follows the next links of a list. The pages end up in the resolver cache for the workers """
+        pages = []
+        while url:
+            pages.append(url)
+            data = json.loads(self.resolver.resolve(url).get_resolved_data())
+            url = data.get("links", {}).get("next")
+        return pages
+
+    def get_shards(self, bodies: List[OParl.Body]) -> List[Shard]:
+        shards = []
+        for body in bodies:
+            for list_name, url in self.get_list_urls(body).items():
+                pages = self.get_page_urls(url)
+                for i in range(0, len(pages), self.pages_per_shard):
+                    shard_pages = pages[i : i + self.pages_per_shard]
+                    shards.append(Shard(body.get_id(), list_name, url, shard_pages))
+        return shards
+
+    def get_list_functions(
+        self, list_name: str
+    ) -> Tuple[Callable[[T], Any], Callable[[List[T]], Any]]:
+        """ The functions to import one object or a batch of objects of the list """
+        return {
+            "paper": (self.paper, self.paper_batch),
+            "person": (self.person, self.person_batch),
+            "organization": (self.organization, self.organization_batch),
+            "meeting": (self.meeting, self.meeting_batch),
+        }[list_name]
+
+    def import_shard(self, shard: Shard):
+        # A new body object, so liboparl loads the list again
+        body = self.client.parse_url(shard.body)
+        objectlistfn = getattr(body, "get_" + shard.list_name)
+        fn, batchfn = self.get_list_functions(shard.list_name)
+        self.resolver.set_list_range(shard.list_url, shard.pages[0], shard.pages[-1])
+        try:
+            err_count = self.list_caught(objectlistfn, fn, batchfn)
+        finally:
+            self.resolver.set_list_range(shard.list_url, None, None)
+        self.logger.info(
+            "Finished {} pages of the {} of {} with {} errors".format(
+                len(shard.pages), shard.list_name, shard.body, err_count
+            )
+        )
+
+    def get_failures(self) -> List[list]:
+        """ The errorlist as json serializable [oparl id or None, error] pairs """
+        failures = []
+        for error in self.errorlist:
+            if isinstance(error, tuple):
+                failures.append([error[0], str(error[1])])
+            else:
+                failures.append([None, str(error)])
+        return failures
+
+    def import_by_url(self, url: str):
+        libobject = self.client.parse_url(url)
+        functions = [
+            (OParl.Paper, self.paper),
+            (OParl.Person, self.person),
+            (OParl.Organization, self.organization),
+            (OParl.Meeting, self.meeting),
+        ]
+        for object_type, fn in functions:
+            if isinstance(libobject, object_type):
+                fn(libobject)
+                return
+        raise ValueError("Can't import {} on its own".format(url))
+
+    def retry_failures(self, oparl_ids: List[str]) -> Dict[str, str]:
+        """ Imports the failed objects again, waiting longer before every round.
+
+        Returns the errors of the objects that still fail.
+        """
+        failed = OrderedDict((oparl_id, "") for oparl_id in oparl_ids)
+        for attempt in range(self.failure_retries):
+            if not failed:
+                break
+            delay = self.failure_backoff * 2 ** attempt
+            self.logger.info(
+                "Retrying {} failed objects in {}s".format(len(failed), delay)
+            )
+            time.sleep(delay)
+            for oparl_id in list(failed):
+                try:
+                    self.import_by_url(oparl_id)
+                    del failed[oparl_id]
+                except Exception as e:
+                    self.logger.error("Retrying {} failed: {}".format(oparl_id, e))
+                    failed[oparl_id] = str(e)
+        return failed
+
+    def get_journal(self, resume: bool) -> ImportJournal:
+        journal = ImportJournal.objects.filter(entrypoint=self.entrypoint).first()
+        if resume and journal and not journal.finished:
+            self.logger.info(
+                "Resuming the import started at {} after {} shards".format(
+                    journal.started, journal.checkpoints.count()
+                )
+            )
+            return journal
+        if resume:
+            self.logger.info("There is no interrupted import, starting a new one")
+        if journal:
+            journal.delete()
+        return ImportJournal.objects.create(entrypoint=self.entrypoint)
+
+    def run_multiprocess(self, resume: bool = False):
+        """ Shards the lists of all bodies into ranges of pages, which are imported by a pool of processes.
+
+        Every imported shard is recorded in the import journal with the objects that couldn't be associated yet
+        and the failures, so with resume only the missing shards are imported. At the end, the failed objects
+        are retried and the missing associations of all shards are added.
+        """
+        bodies = self.get_bodies()
+        self.bodies_singlethread(bodies)
+
+        journal = self.get_journal(resume)
+        completed = set(journal.checkpoints.values_list("list_name", "first_page"))
+        shards = [
+            shard
+            for shard in self.get_shards(bodies)
+            if (shard.list_name, shard.pages[0]) not in completed
+        ]
+        self.logger.info(
+            "Importing {} shards with {} processes".format(len(shards), self.processes)
+        )
+
+        # The workers must not share the connections with this process
+        self.resolver.close()
+        connections.close_all()
+        # The workers are already running in parallel, so they extract the text themselves
+        options = dict(self.options, extraction_workers=0)
+        with ProcessPool(
+            max(self.processes, 1), initializer=init_worker, initargs=(options,)
+        ) as pool:
+            for shard, queues, failures in pool.imap_unordered(import_shard, shards):
+                ImportCheckpoint.objects.create(
+                    journal=journal,
+                    list_name=shard.list_name,
+                    first_page=shard.pages[0],
+                    queues=json.dumps(queues),
+                    failures=json.dumps(failures),
+                )
+
+        self.logger.info("Finished creating objects")
+        failed_ids = []
+        for checkpoint in journal.checkpoints.all():
+            self.merge_queues(json.loads(checkpoint.queues))
+            for oparl_id, error in json.loads(checkpoint.failures):
+                if oparl_id:
+                    failed_ids.append(oparl_id)
+                else:
+                    self.errorlist.append(error)
+        failed = self.retry_failures(failed_ids)
+        self.add_missing_associations()
+
+        journal.failures = json.dumps(list(failed.items()))
+        journal.finished = timezone.now()
+        journal.save()
+
+        for i in self.errorlist + list(failed.items()):
+            self.logger.error(i)
+
+        self.identity_map.log_statistics()
+        self.resolver.close()
+        self.extraction_pool.close()
+
+    def run_pipeline(self):
+        """ Imports the lists page by page with the stages of ImportPipeline """
+        bodies = self.get_bodies()
+        self.bodies_singlethread(bodies)
+
+        pipeline = ImportPipeline(
+            self,
+            self.options["parse_workers"],
+            self.options["persist_workers"],
+            self.options["download_workers"],
+            self.options["queue_size"],
+        )
+        pipeline.run(bodies)
+
+        self.logger.info("Finished creating objects")
+        self.add_missing_associations()
+
+        for i in self.errorlist:
+            self.logger.error(i)
+
+        self.identity_map.log_statistics()
+        self.resolver.close()
+        self.extraction_pool.close()
+
     def run(self):
-        if self.no_threads:
+        if self.processes or self.resume:
+            self.run_multiprocess(self.resume)
+        elif self.options["pipeline"]:
+            self.run_pipeline()
+        elif self.no_threads:
             self.run_singlethread()
         else:
             self.run_multithreaded()
@@ -161,7 +543,7 @@ class OParlImport(OParlObjects):
         """ This method is requried as instances of this class can't be moved to other processes """
         logger = logging.getLogger(__name__)
         try:
-            runner = cls(config)
+            runner = get_importer(config)
             runner.run_multithreaded()
         except Exception:
             logger.error(
@@ -1,8 +1,9 @@
 import mimetypes
 import textwrap
-from collections import defaultdict
-from tempfile import NamedTemporaryFile
-from typing import Type, Optional
+import time
+from collections import defaultdict, OrderedDict
+from queue import Queue
+from typing import Type, Optional, List, Dict, Any, Iterable, TypeVar, Tuple
 
 import gi
 import requests
@@ -13,11 +14,25 @@ from django.utils.translation import ugettext as _
 from requests import HTTPError
 from slugify.slugify import slugify
 
+from importer.bulk import bulk_save, M2MBatch, update_search_index
+from importer.download import (
+    Download,
+    get_conditional_headers,
+    get_stored_object,
+    stream_download,
+    store_blob,
+)
 from importer.functions import normalize_body_name
 from importer.oparl_helper import OParlHelper
-from mainapp.functions.document_parsing import extract_locations, extract_persons
+from importer.profiling import profiled, profiler
+from mainapp.functions.alert_percolator import percolate
+from mainapp.functions.document_parsing import (
+    extract_locations,
+    extract_persons,
+    get_extraction_version,
+)
 from mainapp.functions.geo_functions import geocode
-from mainapp.functions.minio import minio_client, minio_file_bucket
+from mainapp.functions.minio import minio_file_bucket
 from mainapp.models import (
     Body,
     LegislativeTerm,
@@ -40,6 +55,8 @@ from mainapp.models.paper_type import PaperType
 gi.require_version("OParl", "0.4")
 from gi.repository import OParl
 
+T = TypeVar("T")
+
 
 class OParlObjects(OParlHelper):
     """ Methods for saving the oparl objects as database entries. """
@@ -50,16 +67,17 @@ class OParlObjects(OParlHelper):
         # We need this here for the sternberg fixup
         self.client = None
 
-        # mappings that could not be resolved because the target object
-        # hasn't been imported yet
-        self.meeting_person_queue = defaultdict(list)
-        self.meeting_organization_queue = defaultdict(list)
-        self.agenda_item_paper_queue = {}
-        self.membership_queue = []
-        self.consultation_meeting_queue = []
-        self.consultation_paper_queue = []
-        self.consultation_organization_queue = defaultdict(list)
-        self.paper_organization_queue = []
+        self.timeout = options["timeout"]
+        self.download_session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.threadcount)
+        self.download_session.mount("http://", adapter)
+        self.download_session.mount("https://", adapter)
+
+        self.reset_queues()
+        # The queues are resolved in batches of this size with bulk queries
+        self.association_batchsize = 1000
+        # Set by the pipeline, which downloads the files in a separate stage
+        self.download_queue = None  # type: Optional[Queue]
 
         # Ensure the existence of the three predefined organization types
         group = settings.PARLIAMENTARY_GROUPS_TYPE
@@ -75,6 +93,23 @@ class OParlObjects(OParlHelper):
             id=department[0], defaults={"name": department[1]}
         )
 
+    def reset_queues(self):
+        # mappings that could not be resolved because the target object
+        # hasn't been imported yet
+        self.meeting_person_queue = defaultdict(list)
+        self.meeting_organization_queue = defaultdict(list)
+        self.agenda_item_paper_queue = {}
+        self.membership_queue = []
+        self.consultation_meeting_queue = []
+        self.consultation_paper_queue = []
+        self.consultation_organization_queue = defaultdict(list)
+        self.paper_organization_queue = []
+        # The objects loaded by merge_queues. An object in several queues has to be a single instance, or
+        # saving one instance would write back the stale foreign keys of the other one
+        self.merged_objects = (
+            {}
+        )  # type: Dict[Tuple[Type[DefaultFields], int], DefaultFields]
+
     def body(self, libobject: OParl.Body):
         return self.process_object(libobject, Body, self.body_core, self.body_embedded)
 
@@ -90,10 +125,7 @@ class OParlObjects(OParlHelper):
             saved_term = self.term(term)
             if saved_term:
                 terms.append(saved_term)
-        changed = changed or not self.is_queryset_equal_list(
-            body.legislative_terms, terms
-        )
-        body.legislative_terms.set(terms)
+        changed = self.set_m2m(body, "legislative_terms", terms) or changed
         location = self.location(libobject.get_location())
         if location and location.geometry:
             if location.geometry["type"] == "Point":
@@ -135,14 +167,23 @@ class OParlObjects(OParlHelper):
             libobject, Paper, self.paper_core, self.paper_embedded
         )
 
+    def paper_batch(self, libobjects: List[OParl.Paper]):
+        return self.process_batch(
+            libobjects,
+            Paper,
+            self.paper_core,
+            self.paper_embedded,
+            {
+                File: lambda i: [i.get_main_file()] + i.get_auxiliary_file(),
+                Consultation: lambda i: i.get_consultation(),
+            },
+        )
+
     def paper_embedded(self, libobject, paper):
         changed = False
         files_with_none = [self.file(file) for file in libobject.get_auxiliary_file()]
         files_without_none = [file for file in files_with_none if file is not None]
-        changed = changed or not self.is_queryset_equal_list(
-            paper.files, files_without_none
-        )
-        paper.files.set(files_without_none)
+        changed = self.set_m2m(paper, "files", files_without_none) or changed
         old_main_file = paper.main_file
         paper.main_file = self.file(libobject.get_main_file())
         changed = changed or old_main_file != paper.main_file
@@ -151,15 +192,12 @@ class OParlObjects(OParlHelper):
 
         organizations = []
         for org_url in libobject.get_under_direction_of_url():
-            organization = Organization.objects.filter(oparl_id=org_url).first()
+            organization = self.identity_map.get(Organization, org_url)
             if organization:
                 organizations.append(organization)
             else:
                 self.paper_organization_queue.append((paper, org_url))
-        changed = changed or not self.is_queryset_equal_list(
-            paper.organizations, organizations
-        )
-        paper.organizations.set(organizations)
+        changed = self.set_m2m(paper, "organizations", organizations) or changed
         return changed
 
     def paper_core(self, libobject, paper):
@@ -182,6 +220,11 @@ class OParlObjects(OParlHelper):
             libobject, Organization, self.organization_core, self.organization_embedded
         )
 
+    def organization_batch(self, libobjects: List[OParl.Organization]):
+        return self.process_batch(
+            libobjects, Organization, self.organization_core, self.organization_embedded
+        )
+
     def organization_without_embedded(self, libobject: OParl.Organization):
         return self.process_object(
             libobject, Organization, self.organization_core, lambda x, y: False
@@ -204,7 +247,9 @@ class OParlObjects(OParlHelper):
                 name=libobject.get_organization_type()
             )
         organization.organization_type = orgtype
-        organization.body = Body.by_oparl_id(libobject.get_body().get_id())
+        organization.body_id = self.identity_map.get(
+            Body, libobject.get_body().get_id()
+        )
         organization.start = self.glib_datetime_or_date_to_python(
             libobject.get_start_date()
         )
@@ -219,6 +264,24 @@ class OParlObjects(OParlHelper):
             libobject, Meeting, self.meeting_core, self.meeting_embedded
         )
 
+    def meeting_batch(self, libobjects: List[OParl.Meeting]):
+        return self.process_batch(
+            libobjects,
+            Meeting,
+            self.meeting_core,
+            self.meeting_embedded,
+            {
+                File: lambda i: [
+                    i.get_invitation(),
+                    i.get_results_protocol(),
+                    i.get_verbatim_protocol(),
+                ]
+                + i.get_auxiliary_file(),
+                Location: lambda i: [i.get_location()],
+                AgendaItem: lambda i: i.get_agenda_item(),
+            },
+        )
+
     def meeting_embedded(self, libobject, meeting):
         changed = False
         auxiliary_files = []
@@ -226,37 +289,28 @@ class OParlObjects(OParlHelper):
             djangofile = self.file(oparlfile)
             if djangofile:
                 auxiliary_files.append(djangofile)
-        changed = changed or not self.is_queryset_equal_list(
-            meeting.auxiliary_files, auxiliary_files
-        )
-        meeting.auxiliary_files.set(auxiliary_files)
+        changed = self.set_m2m(meeting, "auxiliary_files", auxiliary_files) or changed
         persons = []
         for oparlperson in libobject.get_participant():
-            djangoperson = Person.by_oparl_id(oparlperson.get_id())
+            djangoperson = self.identity_map.get(Person, oparlperson.get_id())
             if djangoperson:
                 persons.append(djangoperson)
             else:
                 self.meeting_person_queue[libobject.get_id()].append(
                     oparlperson.get_id()
                 )
-        changed = changed or not self.is_queryset_equal_list(meeting.persons, persons)
-        meeting.persons.set(persons)
+        changed = self.set_m2m(meeting, "persons", persons) or changed
         for index, oparlitem in enumerate(libobject.get_agenda_item()):
             self.agendaitem(oparlitem, index, meeting)
 
         organizations = []
         for organization_url in libobject.get_organization_url():
-            djangoorganization = Organization.objects.filter(
-                oparl_id=organization_url
-            ).first()
+            djangoorganization = self.identity_map.get(Organization, organization_url)
             if djangoorganization:
                 organizations.append(djangoorganization)
             else:
                 self.meeting_organization_queue[meeting].append(organization_url)
-        changed = changed or not self.is_queryset_equal_list(
-            meeting.organizations, organizations
-        )
-        meeting.organizations.set(organizations)
+        changed = self.set_m2m(meeting, "organizations", organizations) or changed
 
         return changed
 
@@ -378,80 +432,69 @@ class OParlObjects(OParlHelper):
         consultation.save()
 
         if libobject.get_meeting():
-            meeting = Meeting.objects.filter(
-                oparl_id=libobject.get_meeting().get_id()
-            ).first()
+            meeting = self.identity_map.get(Meeting, libobject.get_meeting().get_id())
             if not meeting:
                 self.consultation_meeting_queue.append(
                     (consultation, libobject.get_meeting().get_id())
                 )
             else:
-                consultation.meeting = meeting
+                consultation.meeting_id = meeting
 
         if libobject.get_paper():
-            paper = Meeting.objects.filter(
-                oparl_id=libobject.get_paper().get_id()
-            ).first()
+            paper = self.identity_map.get(Paper, libobject.get_paper().get_id())
             if not paper:
                 self.consultation_paper_queue.append(
                     (consultation, libobject.get_paper().get_id())
                 )
             else:
-                consultation.paper = paper
+                consultation.paper_id = paper
 
         orgas = []
         for org_url in libobject.get_organization_url():
-            organization = Meeting.objects.filter(oparl_id=org_url).first()
+            organization = self.identity_map.get(Organization, org_url)
             if not organization:
                 self.consultation_organization_queue[consultation].append(org_url)
             else:
                 orgas.append(organization)
-        consultation.organizations.set(orgas)
+        self.set_m2m(consultation, "organizations", orgas)
 
         consultation.save()
 
         return consultation
 
+    @profiled("download_file")
     def download_file(
-        self, file: File, url: str, libobject: OParl.File
-    ) -> Optional[NamedTemporaryFile]:
-        last_modified = self.glib_datetime_to_python(libobject.get_modified())
-
-        if (
-            file.filesize
-            and file.filesize > 0
-            and file.modified
-            and last_modified
-            and last_modified < file.modified
-            and minio_client.has_object(minio_file_bucket, str(file.id))
-        ):
-            self.logger.info("Skipping cached download: {}".format(url))
-            return
+        self, file: File, url: str, libobject: Optional[OParl.File] = None
+    ) -> Optional[Download]:
+        """
+        Streams the file to disk and stores its content in minio, unless another file has the same content.
+        Returns None if the download failed or if the server says that the file hasn't changed since the
+        last download.
+        """
+        stored = get_stored_object(minio_file_bucket, file.get_storage_name())
+        headers = get_conditional_headers(file) if stored else {}
 
         self.logger.info("Downloading {}".format(url))
 
-        response = requests.get(url, allow_redirects=True)
-
         try:
-            response.raise_for_status()
-        except HTTPError as e:
-            self.logger.exception("Failed to download file {}: {}", file.id, e)
-            return
+            download = stream_download(
+                self.download_session, url, headers, timeout=self.timeout
+            )
+        except (HTTPError, requests.ConnectionError, requests.Timeout) as e:
+            self.logger.exception("Failed to download file {}: {}".format(file.id, e))
+            return None
 
-        tmpfile = NamedTemporaryFile()
-        content = response.content
-        tmpfile.write(content)
-        tmpfile.file.seek(0)
-        file.filesize = len(content)
-
-        minio_client.put_object(
-            minio_file_bucket,
-            str(file.id),
-            tmpfile.file,
-            file.filesize,
-            content_type=file.mime_type,
-        )
-        return tmpfile
+        if not download:
+            self.logger.info("Not modified since the last download: {}".format(url))
+            file.filesize = stored.size
+            return None
+
+        profiler.add_bytes("download_file", download.size)
+        file.filesize = download.size
+        file.source_etag = download.etag
+        file.source_last_modified = download.last_modified
+        file.blob = store_blob(download, minio_file_bucket, file.mime_type)
+        return download
 
     def file(self, libobject: OParl.File):
         file, do_update = self.check_for_modification(libobject, File)
@@ -489,13 +532,31 @@ class OParlObjects(OParlHelper):
         if libobject.get_text():
             file.parsed_text = libobject.get_text()
 
-        if self.download_files:
-            url = libobject.get_download_url() or libobject.get_access_url()
-            tmpfile = self.download_file(file, url, libobject)
-            if tmpfile:
-                file.parsed_text = self.extract_text_from_file(file, tmpfile.name)
-                tmpfile.close()
+        url = libobject.get_download_url() or libobject.get_access_url()
+        if self.download_files and self.download_queue is None:
+            self.download_file_content(file, url)
+
+        file = self.finish_file(file, file_name_before, parsed_text_before)
+
+        if self.download_files and self.download_queue is not None:
+            # The pipeline downloads the file in a later stage, once the file has been saved
+            self.download_queue.put((file.id, url))
 
+        return file
+
+    def download_file_content(self, file: File, url: str):
+        """ Downloads the file and takes the text and the page count from the extraction """
+        download = self.download_file(file, url)
+        if download:
+            self.extract_blob(file, download.name)
+            file.parsed_text = file.blob.parsed_text
+            file.page_count = file.blob.page_count
+            download.close()
+
+    def finish_file(
+        self, file: File, file_name_before: str, parsed_text_before: Optional[str]
+    ) -> File:
+        """ Extracts the locations and the persons if the name or the text changed and saves the file """
         file = self.call_custom_hook("sanitize_file", file)
 
         if len(file.name) > 200:
@@ -506,12 +567,37 @@ class OParlObjects(OParlHelper):
             self.logger.info(
                 "Extracting locations from PDF for file {} ({})".format(file.id, file)
             )
-            file.locations.set(extract_locations(file.parsed_text))
-            file.mentioned_persons.set(
-                extract_persons(file.name + "\n" + (file.parsed_text or "") + "\n")
-            )
+            if (
+                file.blob_id
+                and file.blob.extracted
+                and file.blob.parsed_text == file.parsed_text
+            ):
+                version = get_extraction_version()
+                if file.blob.extraction_version != version:
+                    self.logger.info(
+                        "The persons or streets changed, extracting {} again".format(
+                            file.blob.sha256
+                        )
+                    )
+                    self.extract_blob_associations(file.blob, version)
+                file.locations.set(file.blob.locations.all())
+                mentioned_persons = set(file.blob.mentioned_persons.all())
+                with profiler.stage("extract_persons"):
+                    mentioned_persons.update(extract_persons(file.name))
+                file.mentioned_persons.set(mentioned_persons)
+            else:
+                with profiler.stage("extract_locations"):
+                    file.locations.set(extract_locations(file.parsed_text))
+                with profiler.stage("extract_persons"):
+                    file.mentioned_persons.set(
+                        extract_persons(
+                            file.name + "\n" + (file.parsed_text or "") + "\n"
+                        )
+                    )
 
         file.save()
+        # The text is only known now, so the file is matched against the alerts after the signal indexed it
+        percolate(File, [file])
 
         return file
 
@@ -520,6 +606,15 @@ class OParlObjects(OParlHelper):
             libobject, Person, self.person_core, self.person_embedded
         )
 
+    def person_batch(self, libobjects: List[OParl.Person]):
+        return self.process_batch(
+            libobjects,
+            Person,
+            self.person_core,
+            self.person_embedded,
+            {Location: lambda i: [i.get_location()]},
+        )
+
     def person_embedded(self, libobject, person):
         old_location = person.location
         person.location = self.location(libobject.get_location())
@@ -540,9 +635,9 @@ class OParlObjects(OParlHelper):
         if not membership or not do_update:
             return membership
 
-        person = Person.objects_with_deleted.filter(
-            oparl_id=libobject.get_person().get_id()
-        ).first()
+        person = self.identity_map.get(
+            Person, libobject.get_person().get_id(), with_deleted=True
+        )
         if not person:
             self.membership_queue.append((organization, libobject))
             return None
@@ -554,13 +649,98 @@ class OParlObjects(OParlHelper):
         membership.start = self.glib_datetime_to_python_date(libobject.get_start_date())
         membership.end = self.glib_datetime_to_python_date(libobject.get_end_date())
         membership.role = role
-        membership.person = person
+        membership.person_id = person
         membership.organization = organization
 
         membership.save()
 
         return membership
 
+    def export_queues(self) -> Dict[str, Any]:
+        """ The queues for add_missing_associations in a json serializable form, so they can be sent
+        to another process or stored in the import journal.
+
+        The queued objects are replaced by their ids and the liboparl memberships by their urls.
+        """
+        return {
+            "meeting_person_queue": dict(self.meeting_person_queue),
+            "meeting_organization_queue": [
+                (meeting.id, urls)
+                for meeting, urls in self.meeting_organization_queue.items()
+            ],
+            "agenda_item_paper_queue": self.agenda_item_paper_queue,
+            "membership_queue": [
+                (organization.id, libobject.get_id())
+                for organization, libobject in self.membership_queue
+            ],
+            "consultation_meeting_queue": [
+                (consultation.id, meeting)
+                for consultation, meeting in self.consultation_meeting_queue
+            ],
+            "consultation_paper_queue": [
+                (consultation.id, paper)
+                for consultation, paper in self.consultation_paper_queue
+            ],
+            "consultation_organization_queue": [
+                (consultation.id, urls)
+                for consultation, urls in self.consultation_organization_queue.items()
+            ],
+            "paper_organization_queue": [
+                (paper.id, url) for paper, url in self.paper_organization_queue
+            ],
+        }
+
+    def merge_queues(self, queues: Dict[str, Any]):
+        """ Adds the queues exported by another importer to the own ones """
+
+        def with_objects(model: Type[DefaultFields], queue: List[list]) -> List[tuple]:
+            missing = [pk for pk, _ in queue if (model, pk) not in self.merged_objects]
+            for pk, obj in model.objects_with_deleted.in_bulk(missing).items():
+                self.merged_objects[(model, pk)] = obj
+            return [
+                (self.merged_objects[(model, pk)], value)
+                for pk, value in queue
+                if (model, pk) in self.merged_objects
+            ]
+
+        for key, values in queues["meeting_person_queue"].items():
+            self.meeting_person_queue[key].extend(values)
+        for meeting, urls in with_objects(
+            Meeting, queues["meeting_organization_queue"]
+        ):
+            self.meeting_organization_queue[meeting].extend(urls)
+        for consultation, urls in with_objects(
+            Consultation, queues["consultation_organization_queue"]
+        ):
+            self.consultation_organization_queue[consultation].extend(urls)
+        self.agenda_item_paper_queue.update(queues["agenda_item_paper_queue"])
+        for organization, url in with_objects(Organization, queues["membership_queue"]):
+            self.membership_queue.append((organization, self.client.parse_url(url)))
+        self.consultation_meeting_queue.extend(
+            with_objects(Consultation, queues["consultation_meeting_queue"])
+        )
+        self.consultation_paper_queue.extend(
+            with_objects(Consultation, queues["consultation_paper_queue"])
+        )
+        self.paper_organization_queue.extend(
+            with_objects(Paper, queues["paper_organization_queue"])
+        )
+
+    def batched(self, items: List[T]) -> Iterable[List[T]]:
+        for i in range(0, len(items), self.association_batchsize):
+            yield items[i : i + self.association_batchsize]
+
+    @staticmethod
+    def unique_by_id(objects: Iterable[T]) -> List[T]:
+        """ An object can be queued twice when it was imported twice, in which case the last one counts """
+        return list(OrderedDict((obj.id, obj) for obj in objects).values())
+
+    def get_or_import_organization(self, url: str) -> int:
+        org = self.identity_map.get(Organization, url, with_deleted=True)
+        if not org:
+            org = self.organization_without_embedded(self.client.parse_url(url)).id
+        return org
+
     def _add_organizations(self, queue, othermodel: Type[DefaultFields]):
         length = len(queue)
         self.logger.info(
@@ -568,91 +748,154 @@ class OParlObjects(OParlHelper):
                 Organization.__name__, length, othermodel.__name__
             )
         )
-        for base_object, associated_urls in queue.items():
-            associated = []
-            for url in associated_urls:
-                org = Organization.objects_with_deleted.filter(oparl_id=url).first()
-                if not org:
-                    org = self.organization_without_embedded(self.client.parse_url(url))
-                    org.save()
-                associated.append(org)
-            base_object.organizations.set(associated)
-            base_object.save()
-
-    def add_missing_associations(self):
+        for batch in self.batched(list(queue.items())):
+            base_objects = self.unique_by_id(base_object for base_object, _ in batch)
+            m2m = M2MBatch(othermodel, base_objects)
+            changed = []
+            for base_object, associated_urls in batch:
+                associated = [
+                    self.get_or_import_organization(i) for i in associated_urls
+                ]
+                if m2m.set(base_object, "organizations", associated):
+                    changed.append(base_object)
+            m2m.flush()
+            update_search_index(othermodel, self.unique_by_id(changed))
+
+    def _add_meeting_persons(self):
         self.logger.info(
             "Adding {} missing meeting <-> persons associations".format(
                 len(self.meeting_person_queue.items())
             )
         )
-        for meeting_id, person_ids in self.meeting_person_queue.items():
-            meeting = Meeting.by_oparl_id(meeting_id)
-            meeting.persons = [
-                Person.by_oparl_id(person_id) for person_id in person_ids
+        for batch in self.batched(list(self.meeting_person_queue.items())):
+            meeting_ids = [
+                self.identity_map.get(Meeting, meeting_id, with_deleted=True)
+                for meeting_id, _ in batch
             ]
-            meeting.save()
-
+            meetings = Meeting.objects_with_deleted.in_bulk(
+                [i for i in meeting_ids if i]
+            )
+            m2m = M2MBatch(Meeting, meetings.values())
+            changed = []
+            for meeting_id, (_, person_ids) in zip(meeting_ids, batch):
+                if meeting_id not in meetings:
+                    continue
+                persons = [
+                    self.identity_map.get(Person, person_id) for person_id in person_ids
+                ]
+                persons = [person for person in persons if person]
+                if m2m.set(meetings[meeting_id], "persons", persons):
+                    changed.append(meetings[meeting_id])
+            m2m.flush()
+            update_search_index(Meeting, changed)
+
+    def _add_agenda_item_papers(self):
         self.logger.info(
             "Adding {} missing agenda item <-> paper associations".format(
                 len(self.agenda_item_paper_queue.items())
             )
         )
-        for item_id, paper_id in self.agenda_item_paper_queue.items():
-            item = AgendaItem.objects_with_deleted.get(oparl_id=item_id)
-            item.paper = Paper.objects_with_deleted.filter(oparl_id=paper_id).first()
-            if not item.paper:
-                message = "Missing Paper: {}, ({})".format(paper_id, item_id)
-                self.errorlist.append(message)
-            item.save()
-
+        for batch in self.batched(list(self.agenda_item_paper_queue.items())):
+            items = AgendaItem.objects_with_deleted.in_bulk(
+                [item_id for item_id, _ in batch], field_name="oparl_id"
+            )
+            changed = []
+            for item_id, paper_id in batch:
+                item = items[item_id]
+                paper = self.identity_map.get(Paper, paper_id, with_deleted=True)
+                if not paper:
+                    message = "Missing Paper: {}, ({})".format(paper_id, item_id)
+                    self.errorlist.append(message)
+                if item.paper_id != paper:
+                    item.paper_id = paper
+                    changed.append(item)
+            bulk_save(AgendaItem, [], changed)
+            update_search_index(AgendaItem, changed)
+
+    def _add_memberships(self):
+        """ The memberships are complete objects with a person that might be missing, so they go one by one """
         self.logger.info(
             "Adding {} missing memberships".format(len(self.membership_queue))
         )
         for organization, libobject in self.membership_queue:
-            person = Person.objects_with_deleted.filter(
-                oparl_id=libobject.get_person().get_id()
-            ).first()
+            person = self.identity_map.get(
+                Person, libobject.get_person().get_id(), with_deleted=True
+            )
             if not person:
                 self.logger.warn("The person {} is missing".format(libobject.get_id()))
                 self.person(libobject.get_person())
             self.membership(organization, libobject)
 
+    def _add_consultation_foreign_keys(self, queue, othermodel: Type[DefaultFields]):
+        field_name = othermodel.__name__.lower()
         self.logger.info(
-            "Adding {} missing paper to consultations".format(
-                len(self.consultation_paper_queue)
-            )
-        )
-        for consultation, paper in self.consultation_paper_queue:
-            consultation.paper = Paper.objects_with_deleted.filter(
-                oparl_id=paper
-            ).first()
-            consultation.save()
-
-        self.logger.info(
-            "Adding {} missing meetings to consultations".format(
-                len(self.consultation_meeting_queue)
-            )
+            "Adding {} missing {} to consultations".format(len(queue), field_name)
         )
-        for consultation, meeting in self.consultation_meeting_queue:
-            consultation.meeting = Meeting.objects_with_deleted.filter(
-                oparl_id=meeting
-            ).first()
-            consultation.save()
-
+        for batch in self.batched(queue):
+            changed = []
+            for consultation, oparl_id in batch:
+                pk = self.identity_map.get(othermodel, oparl_id, with_deleted=True)
+                if getattr(consultation, field_name + "_id") != pk:
+                    setattr(consultation, field_name + "_id", pk)
+                    changed.append(consultation)
+            changed = self.unique_by_id(changed)
+            bulk_save(Consultation, [], changed)
+            update_search_index(Consultation, changed)
+
+    def _add_paper_organizations(self):
         self.logger.info(
             "Adding {} missing organizations to papers".format(
                 len(self.paper_organization_queue)
             )
         )
-        for paper, organization_url in self.paper_organization_queue:
-            org = Organization.objects_with_deleted.filter(
-                oparl_id=organization_url
-            ).first()
-            if not org:
-                org = self.organization_without_embedded(
-                    self.client.parse_url(organization_url)
-                )
-            paper.organizations.add(org)
-
-        self._add_organizations(self.consultation_organization_queue, Consultation)
-        self._add_organizations(self.meeting_organization_queue, Meeting)
+        for batch in self.batched(self.paper_organization_queue):
+            papers = self.unique_by_id(paper for paper, _ in batch)
+            m2m = M2MBatch(Paper, papers)
+            changed = []
+            for paper, organization_url in batch:
+                org = self.get_or_import_organization(organization_url)
+                if m2m.add(paper, "organizations", [org]):
+                    changed.append(paper)
+            m2m.flush()
+            update_search_index(Paper, self.unique_by_id(changed))
+
+    @profiled("add_missing_associations")
+    def add_missing_associations(self):
+        """ Resolves the queued associations in batches with bulk queries and logs the time for each queue """
+        steps = [
+            ("meeting persons", self._add_meeting_persons),
+            ("agenda item papers", self._add_agenda_item_papers),
+            ("memberships", self._add_memberships),
+            (
+                "consultation papers",
+                lambda: self._add_consultation_foreign_keys(
+                    self.consultation_paper_queue, Paper
+                ),
+            ),
+            (
+                "consultation meetings",
+                lambda: self._add_consultation_foreign_keys(
+                    self.consultation_meeting_queue, Meeting
+                ),
+            ),
+            ("paper organizations", self._add_paper_organizations),
+            (
+                "consultation organizations",
+                lambda: self._add_organizations(
+                    self.consultation_organization_queue, Consultation
+                ),
+            ),
+            (
+                "meeting organizations",
+                lambda: self._add_organizations(
+                    self.meeting_organization_queue, Meeting
+                ),
+            ),
+        ]
+        durations = []
+        for name, step in steps:
+            start = time.perf_counter()
+            with profiler.stage("association_queue", name):
+                step()
+            durations.append("{} {:.2f}s".format(name, time.perf_counter() - start))
+        self.logger.info("Added the missing associations: " + ", ".join(durations))
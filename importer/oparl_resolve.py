@@ -1,66 +1,334 @@
+import hashlib
+import json
 import logging
-from io import BytesIO
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import datetime
+from typing import Tuple, Optional, Dict, List, Set
+from urllib.parse import urlparse, urlencode
 
 import gi
 import requests
-from minio.error import NoSuchKey
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from mainapp.functions.minio import minio_client, minio_cache_bucket
+from importer.profiling import profiled, profiler
+from importer.resolver_cache import ResolverCache, get_resolver_cache
 
 gi.require_version("OParl", "0.4")
 from gi.repository import OParl
 
+# The urls of referenced objects that liboparl will resolve when the importer processes an object of that type,
+# so they can be loaded in advance. Note that e.g. the organization urls of a meeting are only stored as urls
+prefetch_keys = {
+    "AgendaItem": ["consultation"],
+    "Consultation": ["meeting", "paper"],
+    "Meeting": ["participant"],
+    "Membership": ["person"],
+    "Organization": ["membership"],
+    "Paper": ["consultation", "mainFile", "auxiliaryFile"],
+    "Person": ["location"],
+}
+
+# Some servers change modified without changing anything else, so it's not part of the fingerprint
+fingerprint_ignored_keys = {"modified"}
+
+
+def get_fingerprint(oparl_object: dict) -> str:
+    """ The hash of the normalized json of the object, including its embedded objects and the urls it references """
+
+    def normalize(value):
+        if isinstance(value, dict):
+            return {
+                key: normalize(item)
+                for key, item in value.items()
+                if key not in fingerprint_ignored_keys
+            }
+        if isinstance(value, list):
+            return [normalize(item) for item in value]
+        return value
+
+    normalized = json.dumps(
+        normalize(oparl_object), sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
 
 class OParlResolver:
-    """ Resolver for liboparl """
+    """ Resolver for liboparl
+
+    All requests go through one pooled http session with keep-alive, timeouts and retries with backoff.
+
+    liboparl resolves one url after the other, so with prefetching enabled the next page of a list and
+    the referenced objects listed in prefetch_keys are loaded by a thread pool while the importer is
+    processing the current page. The number of concurrent requests to one host is limited by
+    max_requests_per_host.
+
+    The responses are stored in the cache (by default a local sqlite file, see resolver_cache.py) with their
+    ETag and Last-Modified, so even without use_cache, unchanged responses are revalidated with a conditional
+    request instead of being loaded again.
+
+    For incremental syncs, set_modified_since adds the modified_since filter to the first page of a list.
+    The server keeps the filter in the links to the next pages.
+
+    For the sharded import and the pipeline, set_list_range makes liboparl see only a range of the pages of
+    a list.
+
+    The fingerprints of all objects in the responses are kept, so the importer can skip the objects that
+    haven't changed since they were imported, no matter what the server says about modified.
+    """
 
-    def __init__(self, entrypoint, use_cache):
+    def __init__(
+        self,
+        entrypoint,
+        use_cache,
+        timeout=60,
+        retries=3,
+        prefetch_workers=0,
+        max_requests_per_host=4,
+        max_prefetched=1000,
+        max_fingerprints=100000,
+        cache: Optional[ResolverCache] = None,
+    ):
         self.entrypoint = entrypoint
         self.use_cache = use_cache
+        self.timeout = timeout
+        self.prefetch_workers = prefetch_workers
+        self.max_requests_per_host = max_requests_per_host
+        self.max_prefetched = max_prefetched
+        self.max_fingerprints = max_fingerprints
+        self.cache = cache or get_resolver_cache()
         self.logger = logging.getLogger(__name__)
 
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            max_retries=retry, pool_maxsize=max(10, max_requests_per_host)
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.lock = threading.Lock()
+        self.host_slots = defaultdict(
+            lambda: threading.BoundedSemaphore(self.max_requests_per_host)
+        )  # type: Dict[str, threading.BoundedSemaphore]
+        self.executor = None  # type: Optional[ThreadPoolExecutor]
+        # Prefetched results in the order they were requested, so the oldest unused ones can be dropped
+        self.prefetched = OrderedDict()  # type: OrderedDict[str, Future]
+        # The oldest ones are dropped, the importer then falls back to comparing modified
+        self.fingerprints = OrderedDict()  # type: OrderedDict[str, str]
+        self.list_filters = {}  # type: Dict[str, str]
+        # The list ranges are set per thread, so threads can load different pages of the same list
+        self.local = threading.local()
+
+    def set_modified_since(self, url: str, modified_since: Optional[datetime]):
+        """ Only loads the objects of the list that were modified since the given time, or all with None """
+        with self.lock:
+            if modified_since:
+                self.list_filters[url] = modified_since.replace(
+                    microsecond=0
+                ).isoformat()
+            else:
+                self.list_filters.pop(url, None)
+
+    def set_list_range(
+        self, url: str, first_page: Optional[str], last_page: Optional[str]
+    ):
+        """ When liboparl loads the list, it starts with first_page and stops after last_page. None resets it """
+        if first_page and last_page:
+            self.get_list_ranges()[url] = (first_page, last_page)
+        else:
+            self.get_list_ranges().pop(url, None)
+
+    def get_list_ranges(self) -> Dict[str, Tuple[str, str]]:
+        if not hasattr(self.local, "list_ranges"):
+            self.local.list_ranges = {}
+        return self.local.list_ranges
+
+    @profiled("resolve")
     def resolve(self, url: str):
-        if self.use_cache:
+        with self.lock:
+            modified_since = self.list_filters.get(url)
+        list_ranges = self.get_list_ranges()
+        if url in list_ranges:
+            url = list_ranges[url][0]
+        is_last_page = any(last_page == url for _, last_page in list_ranges.values())
+        if modified_since:
+            separator = "&" if "?" in url else "?"
+            url += separator + urlencode({"modified_since": modified_since})
+
+        with self.lock:
+            future = self.prefetched.pop(url, None)
+
+        if future and not future.cancelled():
+            data, success, status_code = future.result()
+        else:
+            data, success, status_code = self.load(url)
+
+        if success and is_last_page:
+            data = self.without_next_page(data)
+
+        if success:
             try:
-                data = minio_client.get_object(
-                    minio_cache_bucket, url + "-disambiguate-file"
-                )
-                data = data.read().decode()
-                self.logger.info("Cached: " + url)
-                return OParl.ResolveUrlResult(
-                    resolved_data=data, success=True, status_code=304
-                )
-            except NoSuchKey:
-                pass
+                oparl_object = json.loads(data)
+            except ValueError:
+                oparl_object = None
+            if oparl_object is not None:
+                self.add_fingerprints(oparl_object)
+                if self.prefetch_workers > 0:
+                    self.prefetch(oparl_object)
+
+        return OParl.ResolveUrlResult(
+            resolved_data=data, success=success, status_code=status_code
+        )
+
+    def load(self, url: str) -> Tuple[Optional[str], bool, int]:
+        """ Returns the data, whether it was loaded successfully and the status code """
+        cached = self.cache.get(url)
+        if cached and self.use_cache:
+            self.logger.info("Cached: " + url)
+            return cached.data.decode(), True, 304
+
+        # Even without use_cache, we only need to load the response again if it has changed
+        headers = {}
+        if cached and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
 
         try:
             self.logger.info("Loading: " + url)
-            req = requests.get(url)
+            with self.host_slots_for(url):
+                req = self.session.get(url, headers=headers, timeout=self.timeout)
         except Exception as e:
-            self.logger.error("Error loading url: ", e)
-            return OParl.ResolveUrlResult(
-                resolved_data=None, success=False, status_code=-1
-            )
+            self.logger.error("Error loading url {}: {}".format(url, e))
+            return None, False, -1
+
+        if req.status_code == 304 and cached:
+            self.logger.info("Not modified: " + url)
+            return cached.data.decode(), True, 304
 
         content = req.content
         decoded = content.decode()
+        profiler.add_bytes("resolve", len(content))
 
         try:
             req.raise_for_status()
         except Exception as e:
-            self.logger.error("HTTP status code error: ", e)
-            return OParl.ResolveUrlResult(
-                resolved_data=decoded, success=False, status_code=req.status_code
-            )
-
-        # We need to avoid filenames where a prefix already is a file, which fails with a weird minio error
-        minio_client.put_object(
-            minio_cache_bucket,
-            url + "-disambiguate-file",
-            BytesIO(content),
-            len(content),
-        )
+            self.logger.error("HTTP status code error: {}".format(e))
+            return decoded, False, req.status_code
 
-        return OParl.ResolveUrlResult(
-            resolved_data=decoded, success=True, status_code=req.status_code
+        self.cache.set(
+            url, content, req.headers.get("ETag"), req.headers.get("Last-Modified")
         )
+
+        return decoded, True, req.status_code
+
+    def load_ahead(self, url: str) -> Optional[str]:
+        """ Loads the url now and keeps the response for when liboparl resolves it. Returns the data or None """
+        data, success, status_code = self.load(url)
+        future = Future()  # type: Future
+        future.set_result((data, success, status_code))
+        with self.lock:
+            self.prefetched[url] = future
+        return data if success else None
+
+    @staticmethod
+    def without_next_page(data: str) -> str:
+        oparl_list = json.loads(data)
+        oparl_list.get("links", {}).pop("next", None)
+        return json.dumps(oparl_list)
+
+    def host_slots_for(self, url: str) -> threading.BoundedSemaphore:
+        with self.lock:
+            return self.host_slots[urlparse(url).netloc]
+
+    def add_fingerprints(self, oparl_object):
+        """ Stores the fingerprints of the object or the list page and of all embedded objects """
+        fingerprints = []
+
+        def walk(value):
+            if isinstance(value, list):
+                for item in value:
+                    walk(item)
+            elif isinstance(value, dict):
+                if isinstance(value.get("id"), str):
+                    fingerprints.append((value["id"], get_fingerprint(value)))
+                for item in value.values():
+                    walk(item)
+
+        walk(oparl_object)
+        with self.lock:
+            for oparl_id, fingerprint in fingerprints:
+                self.fingerprints.pop(oparl_id, None)
+                self.fingerprints[oparl_id] = fingerprint
+            while len(self.fingerprints) > self.max_fingerprints:
+                self.fingerprints.popitem(last=False)
+
+    def get_fingerprint(self, oparl_id: str) -> Optional[str]:
+        with self.lock:
+            return self.fingerprints.get(oparl_id)
+
+    def prefetch(self, oparl_object):
+        """ Starts loading the next page and the referenced objects in the background """
+        urls = self.get_prefetch_urls(oparl_object)
+
+        with self.lock:
+            if not self.executor:
+                self.executor = ThreadPoolExecutor(self.prefetch_workers)
+            for url in urls:
+                if url in self.prefetched:
+                    continue
+                self.prefetched[url] = self.executor.submit(self.load, url)
+            while len(self.prefetched) > self.max_prefetched:
+                # These were never requested, e.g. because the object wasn't modified
+                _, future = self.prefetched.popitem(last=False)
+                future.cancel()
+
+    def get_prefetch_urls(self, oparl_object) -> List[str]:
+        urls = []  # type: List[str]
+        seen = set()  # type: Set[str]
+
+        def add(value):
+            if isinstance(value, str) and value not in seen:
+                seen.add(value)
+                urls.append(value)
+
+        def walk(value):
+            if isinstance(value, list):
+                for item in value:
+                    walk(item)
+            elif isinstance(value, dict):
+                object_type = str(value.get("type", "")).split("/")[-1]
+                for key in prefetch_keys.get(object_type, []):
+                    if isinstance(value.get(key), list):
+                        for item in value[key]:
+                            add(item)
+                    else:
+                        add(value.get(key))
+                for item in value.values():
+                    walk(item)
+
+        if isinstance(oparl_object, dict):
+            # The next page of a list is needed first
+            links = oparl_object.get("links")
+            if isinstance(links, dict):
+                add(links.get("next"))
+        walk(oparl_object)
+        return urls
+
+    def close(self):
+        """ Drops everything that's still waiting to be prefetched """
+        with self.lock:
+            for future in self.prefetched.values():
+                future.cancel()
+            self.prefetched.clear()
+            if self.executor:
+                self.executor.shutdown(wait=False)
+                self.executor = None
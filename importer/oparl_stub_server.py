@@ -0,0 +1,457 @@
+import json
+import threading
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from typing import Dict, List, Optional, Any
+from urllib.parse import urlparse, parse_qs, quote
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+oparl_schema = "https://schema.oparl.org/1.1/"
+file_header = b"%PDF-1.4\n"
+
+
+def make_pdf(lines: List[str]) -> bytes:
+    """ A minimal pdf with one page showing the lines, so the text extraction has something to do """
+    text = " 0 -14 Td ".join(
+        "({}) Tj".format(
+            line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        )
+        for line in lines
+    )
+    content = "BT /F1 12 Tf 50 800 Td {} ET".format(text).encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length "
+        + str(len(content)).encode()
+        + b" >>\nstream\n"
+        + content
+        + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    pdf = file_header
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += str(number).encode() + b" 0 obj\n" + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += "xref\n0 {}\n0000000000 65535 f \n".format(len(objects) + 1).encode()
+    for offset in offsets:
+        pdf += "{:010d} 00000 n \n".format(offset).encode()
+    pdf += "trailer\n<< /Size {} /Root 1 0 R >>\nstartxref\n{}\n%%EOF\n".format(
+        len(objects) + 1, xref
+    ).encode()
+    return pdf
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class OParlStubServer:
+    """ A local oparl server with synthetic data for benchmarks and tests.
+
+    All objects are generated up front. Lists are paginated with page_size elements per page and every
+    response is delayed by latency seconds to simulate a slow remote server. The files have file_size bytes,
+    or with pdf_files, they are small pdfs with some text. They support conditional requests with an ETag.
+
+    The dataset can be changed with modify() and delete() between imports. Lists support the modified_since
+    filter and then also contain the deleted objects, as the oparl specification demands.
+    """
+
+    def __init__(
+        self,
+        papers: int = 100,
+        persons: int = 50,
+        organizations: int = 10,
+        meetings: int = 20,
+        page_size: int = 20,
+        latency: float = 0.0,
+        file_size: int = 1024,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        bodies: int = 1,
+        agenda_items: int = 1,
+        pdf_files: bool = False,
+    ):
+        self.page_size = page_size
+        self.timestamp = "2018-01-01T00:00:00+01:00"
+        self.pdf_files = pdf_files
+        self.latency = latency
+        self.file_size = file_size
+        self.request_count = 0
+        self.counter_lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.get_handler())
+        self.url = "http://{}:{}".format(host, self.server.server_address[1])
+        self.entrypoint = self.url + "/"
+        self.thread = None  # type: Optional[threading.Thread]
+
+        self.objects = {}  # type: Dict[str, Dict[str, Any]]
+        self.lists = {}  # type: Dict[str, List[Dict[str, Any]]]
+        self.build(bodies, papers, persons, organizations, meetings, agenda_items)
+
+    def build(
+        self,
+        bodies: int,
+        papers: int,
+        persons: int,
+        organizations: int,
+        meetings: int,
+        agenda_items: int,
+    ):
+        self.objects["/"] = self.oparl_object(
+            "System",
+            "/",
+            oparlVersion=oparl_schema,
+            body=self.url + "/bodies",
+            name="Stub System",
+        )
+        self.lists["/bodies"] = []
+        for i in range(bodies):
+            # The ids are numbered across all bodies
+            self.build_body(
+                i,
+                range(i * papers, (i + 1) * papers),
+                range(i * persons, (i + 1) * persons),
+                range(i * organizations, (i + 1) * organizations),
+                range(i * meetings, (i + 1) * meetings),
+                agenda_items,
+            )
+
+        # Like real servers, every object can also be loaded by its url, including embedded ones
+        for path, elements in self.lists.items():
+            for element in elements:
+                self.add_objects(element)
+
+    def oparl_object(self, oparl_type: str, path: str, **kwargs) -> Dict[str, Any]:
+        data = {
+            "id": self.url + path,
+            "type": oparl_schema + oparl_type,
+            "created": self.timestamp,
+            "modified": self.timestamp,
+        }
+        data.update(kwargs)
+        return data
+
+    def build_body(
+        self,
+        number: int,
+        papers: range,
+        persons: range,
+        organizations: range,
+        meetings: range,
+        agenda_items: int,
+    ):
+        oparl_object = self.oparl_object
+        body_path = "/body/{}".format(number)
+        body_url = self.url + body_path
+        body = oparl_object(
+            "Body",
+            body_path,
+            system=self.entrypoint,
+            name="Stadt Beispielstadt" if number == 0 else "Stadt {}".format(number),
+            shortName="Beispielstadt" if number == 0 else "Stadt {}".format(number),
+            organization=body_url + "/organizations",
+            person=body_url + "/persons",
+            meeting=body_url + "/meetings",
+            paper=body_url + "/papers",
+            legislativeTerm=[
+                oparl_object(
+                    "LegislativeTerm",
+                    "/term/{}".format(number),
+                    name="1. Wahlperiode",
+                    startDate="2014-01-01",
+                    endDate="2020-01-01",
+                )
+            ],
+        )
+        self.lists["/bodies"].append(body)
+
+        organization_urls = [
+            self.url + "/organization/{}".format(i) for i in organizations
+        ]
+        person_urls = [self.url + "/person/{}".format(i) for i in persons]
+        meeting_urls = [self.url + "/meeting/{}".format(i) for i in meetings]
+
+        memberships = {}  # type: Dict[str, List[str]]
+        self.lists[body_path + "/persons"] = []
+        for index, i in enumerate(persons):
+            organization_url = (
+                organization_urls[index % len(organizations)] if organizations else None
+            )
+            membership = oparl_object(
+                "Membership",
+                "/membership/{}".format(i),
+                person=person_urls[index],
+                organization=organization_url,
+                role="Mitglied",
+                startDate="2014-01-01",
+            )
+            if organization_url:
+                memberships.setdefault(organization_url, [])
+                memberships[organization_url].append(membership["id"])
+            self.lists[body_path + "/persons"].append(
+                oparl_object(
+                    "Person",
+                    "/person/{}".format(i),
+                    body=body_url,
+                    name="Person {}".format(i),
+                    givenName="Person",
+                    familyName=str(i),
+                    membership=[membership],
+                )
+            )
+
+        self.lists[body_path + "/organizations"] = [
+            oparl_object(
+                "Organization",
+                "/organization/{}".format(i),
+                body=body_url,
+                name="Ausschuss {}".format(i),
+                shortName="A{}".format(i),
+                organizationType="Gremium",
+                classification="Ausschuss",
+                membership=memberships.get(organization_urls[index], []),
+            )
+            for index, i in enumerate(organizations)
+        ]
+
+        self.lists[body_path + "/meetings"] = []
+        for index, i in enumerate(meetings):
+            self.lists[body_path + "/meetings"].append(
+                oparl_object(
+                    "Meeting",
+                    "/meeting/{}".format(i),
+                    name="{}. Sitzung".format(index + 1),
+                    start="2018-01-{:02d}T17:00:00+01:00".format(index % 28 + 1),
+                    organization=[organization_urls[index % len(organizations)]]
+                    if organizations
+                    else [],
+                    participant=person_urls[: min(len(persons), 5)],
+                    agendaItem=[
+                        oparl_object(
+                            "AgendaItem",
+                            "/agendaitem/{}".format(i * agenda_items + j),
+                            meeting=meeting_urls[index],
+                            number=str(j + 1),
+                            name="Verschiedenes"
+                            if j == 0
+                            else "Punkt {}".format(j + 1),
+                            public=True,
+                        )
+                        for j in range(agenda_items)
+                    ],
+                )
+            )
+
+        self.lists[body_path + "/papers"] = []
+        for index, i in enumerate(papers):
+            consultations = []
+            if meetings:
+                consultations.append(
+                    oparl_object(
+                        "Consultation",
+                        "/consultation/{}".format(i),
+                        paper=self.url + "/paper/{}".format(i),
+                        meeting=meeting_urls[index % len(meetings)],
+                        authoritative=False,
+                        role="Beschlussfassung",
+                    )
+                )
+            self.lists[body_path + "/papers"].append(
+                oparl_object(
+                    "Paper",
+                    "/paper/{}".format(i),
+                    body=body_url,
+                    name="Antrag {}".format(i),
+                    reference="{}/2018".format(i),
+                    date="2018-01-01",
+                    paperType="Antrag",
+                    mainFile=oparl_object(
+                        "File",
+                        "/file/{}".format(i),
+                        name="Antrag {}".format(i),
+                        fileName="antrag-{}.pdf".format(i),
+                        mimeType="application/pdf",
+                        accessUrl=self.url + "/file/{}.pdf".format(i),
+                    ),
+                    originatorPerson=[person_urls[index % len(persons)]]
+                    if persons
+                    else [],
+                    consultation=consultations,
+                )
+            )
+
+    def add_objects(self, value):
+        if isinstance(value, list):
+            for item in value:
+                self.add_objects(item)
+        elif isinstance(value, dict):
+            if "id" in value and "type" in value:
+                self.objects[urlparse(value["id"]).path] = value
+            for item in value.values():
+                self.add_objects(item)
+
+    def modify(self, path: str, **changes):
+        """ Changes the object, which is also changed in its list and the objects it's embedded in """
+        oparl_object = self.objects[path]
+        oparl_object.update(changes)
+        oparl_object["modified"] = self.now()
+
+    def delete(self, path: str):
+        self.modify(path, deleted=True)
+
+    @staticmethod
+    def now() -> str:
+        return timezone.now().replace(microsecond=0).isoformat()
+
+    def get_list_page(
+        self, path: str, page: int, modified_since: Optional[str] = None
+    ) -> Dict[str, Any]:
+        if modified_since:
+            since = parse_datetime(modified_since)
+            elements = [
+                element
+                for element in self.lists[path]
+                if parse_datetime(element["modified"]) >= since
+            ]
+            query = "modified_since={}&".format(quote(modified_since))
+        else:
+            elements = [
+                element for element in self.lists[path] if not element.get("deleted")
+            ]
+            query = ""
+
+        total_pages = max(1, (len(elements) + self.page_size - 1) // self.page_size)
+        links = {
+            "first": self.url + path + "?{}page=1".format(query),
+            "last": self.url + path + "?{}page={}".format(query, total_pages),
+        }
+        if page < total_pages:
+            links["next"] = self.url + path + "?{}page={}".format(query, page + 1)
+        return {
+            "data": elements[(page - 1) * self.page_size : page * self.page_size],
+            "pagination": {
+                "totalElements": len(elements),
+                "elementsPerPage": self.page_size,
+                "currentPage": page,
+                "totalPages": total_pages,
+            },
+            "links": links,
+        }
+
+    def get_response(self, url: str) -> Optional[bytes]:
+        parsed = urlparse(url)
+        if parsed.path in self.lists:
+            query = parse_qs(parsed.query)
+            page = int(query.get("page", ["1"])[0])
+            modified_since = query.get("modified_since", [None])[0]
+            return json.dumps(
+                self.get_list_page(parsed.path, page, modified_since)
+            ).encode()
+        if parsed.path in self.objects:
+            return json.dumps(self.objects[parsed.path]).encode()
+        return None
+
+    def is_file(self, url: str) -> bool:
+        path = urlparse(url).path
+        return path.startswith("/file/") and path.endswith(".pdf")
+
+    def get_pdf(self, url: str) -> bytes:
+        number = int(urlparse(url).path[len("/file/") : -len(".pdf")])
+        return make_pdf(
+            [
+                "Antrag {}".format(number),
+                "Eingereicht von Person {}".format(number % 50),
+                "Betrifft die Beispielstraße {}".format(number % 100 + 1),
+            ]
+        )
+
+    def get_file_size(self, url: str) -> int:
+        if self.pdf_files:
+            return len(self.get_pdf(url))
+        return len(file_header) + self.file_size
+
+    def get_file_etag(self, url: str) -> str:
+        return '"{}-{}"'.format(urlparse(url).path, self.get_file_size(url))
+
+    def get_file_chunks(self, url: str, chunk_size: int = 64 * 1024):
+        """ The file content is generated while sending, so large files don't need any memory """
+        if self.pdf_files:
+            yield self.get_pdf(url)
+            return
+        yield file_header
+        remaining = self.file_size
+        while remaining > 0:
+            yield b"0" * min(chunk_size, remaining)
+            remaining -= chunk_size
+
+    def get_handler(self):
+        stub_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub_server.counter_lock:
+                    stub_server.request_count += 1
+                if stub_server.latency:
+                    time.sleep(stub_server.latency)
+
+                if stub_server.is_file(self.path):
+                    self.send_file()
+                    return
+
+                response = stub_server.get_response(self.path)
+                if response is None:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def send_file(self):
+                etag = stub_server.get_file_etag(self.path)
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header(
+                    "Content-Length", str(stub_server.get_file_size(self.path))
+                )
+                self.send_header("ETag", etag)
+                self.end_headers()
+                for chunk in stub_server.get_file_chunks(self.path):
+                    self.wfile.write(chunk)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> str:
+        """ Serves in a background thread and returns the entrypoint """
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.entrypoint
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
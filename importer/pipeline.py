@@ -0,0 +1,194 @@
+import json
+import logging
+import threading
+import time
+import traceback
+from queue import Queue
+from typing import Callable, Dict, List, Optional, TYPE_CHECKING
+
+from django.db import connection
+
+from mainapp.models import File
+
+if TYPE_CHECKING:
+    from importer.oparl_import import OParlImport
+
+logger = logging.getLogger(__name__)
+
+# The lists are imported in this order, so most of the references point to objects that were already imported
+list_priority = ["organization", "person", "meeting", "paper"]
+
+# Tells a worker that nothing more will come
+end_of_queue = object()
+
+
+class ImportPipeline:
+    """
+    Imports the lists of the bodies page by page in stages that are connected by bounded queues:
+
+     * fetch: Loads the pages of the lists in the order of list_priority
+     * parse: Lets liboparl parse the objects of one page
+     * persist: Writes the objects of a page to the database
+     * download: Downloads the files and extracts their text
+
+    When a stage is slower than the one before it, its queue fills up and blocks the previous stage. So at
+    most queue_size pages and download_queue_size files are waiting at a time and the first objects are
+    written as soon as the first page has been loaded.
+    """
+
+    def __init__(
+        self,
+        importer: "OParlImport",
+        parse_workers: int = 1,
+        persist_workers: int = 2,
+        download_workers: int = 4,
+        queue_size: int = 4,
+        download_queue_size: int = 100,
+    ):
+        self.importer = importer
+        self.parse_workers = parse_workers
+        self.persist_workers = persist_workers
+        self.download_workers = download_workers
+
+        self.page_queue = Queue(queue_size)  # type: Queue
+        self.object_queue = Queue(queue_size)  # type: Queue
+        self.download_queue = Queue(download_queue_size)  # type: Queue
+
+        self.lock = threading.Lock()
+        self.pages = 0
+        self.objects = 0
+        self.files = 0
+        self.start = 0.0
+        self.first_written = None  # type: Optional[float]
+
+    def run(self, bodies: list):
+        self.start = time.perf_counter()
+        self.importer.download_queue = self.download_queue
+        try:
+            fetcher = self.start_workers(lambda: self.fetch(bodies), 1)
+            parsers = self.start_workers(self.parse, self.parse_workers)
+            persisters = self.start_workers(self.persist, self.persist_workers)
+            downloaders = self.start_workers(self.download, self.download_workers)
+
+            for thread in fetcher:
+                thread.join()
+            self.finish(self.page_queue, parsers)
+            self.finish(self.object_queue, persisters)
+            self.finish(self.download_queue, downloaders)
+        finally:
+            self.importer.download_queue = None
+
+        duration = time.perf_counter() - self.start
+        logger.info(
+            "Imported {} pages with {} objects and {} files in {:.1f}s, "
+            "the first objects were written after {:.1f}s".format(
+                self.pages,
+                self.objects,
+                self.files,
+                duration,
+                self.first_written - self.start if self.first_written else duration,
+            )
+        )
+
+    @staticmethod
+    def start_workers(target: Callable[[], None], count: int) -> List[threading.Thread]:
+        threads = [threading.Thread(target=target) for _ in range(max(count, 1))]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    @staticmethod
+    def finish(queue: Queue, threads: List[threading.Thread]):
+        """ Lets the workers of a stage finish the queued items and waits for them """
+        for _ in threads:
+            queue.put(end_of_queue)
+        for thread in threads:
+            thread.join()
+
+    def fail(self, message: str):
+        logger.error(message)
+        logger.error(traceback.format_exc())
+        self.importer.errorlist.append(message)
+
+    def fetch(self, bodies: list):
+        list_urls = {}  # type: Dict[str, Dict[str, str]]
+        for body in bodies:
+            try:
+                list_urls[body.get_id()] = self.importer.get_list_urls(body)
+            except Exception as e:
+                self.fail("Failed to load the lists of {}: {}".format(body.get_id(), e))
+
+        for list_name in list_priority:
+            for body_id, urls in list_urls.items():
+                list_url = urls.get(list_name)
+                url = list_url
+                while url:
+                    try:
+                        data = self.importer.resolver.load_ahead(url)
+                        if data is None:
+                            raise ValueError("The server returned an error")
+                        next_url = json.loads(data).get("links", {}).get("next")
+                    except Exception as e:
+                        self.fail("Failed to load {}: {}".format(url, e))
+                        break
+                    self.page_queue.put((body_id, list_name, list_url, url))
+                    url = next_url
+
+    def parse(self):
+        resolver = self.importer.resolver
+        while True:
+            item = self.page_queue.get()
+            if item is end_of_queue:
+                break
+            body_id, list_name, list_url, page_url = item
+            try:
+                # A new body object, so liboparl loads the list again
+                body = self.importer.client.parse_url(body_id)
+                resolver.set_list_range(list_url, page_url, page_url)
+                try:
+                    objects = getattr(body, "get_" + list_name)()
+                finally:
+                    resolver.set_list_range(list_url, None, None)
+            except Exception as e:
+                self.fail("Failed to parse {}: {}".format(page_url, e))
+                continue
+            self.object_queue.put((list_name, objects))
+
+    def persist(self):
+        try:
+            while True:
+                item = self.object_queue.get()
+                if item is end_of_queue:
+                    break
+                list_name, objects = item
+                fn, batchfn = self.importer.get_list_functions(list_name)
+                self.importer.process_caught(objects, fn, batchfn)
+                with self.lock:
+                    self.pages += 1
+                    self.objects += len(objects)
+                    if self.first_written is None:
+                        self.first_written = time.perf_counter()
+        finally:
+            connection.close()
+
+    def download(self):
+        try:
+            while True:
+                item = self.download_queue.get()
+                if item is end_of_queue:
+                    break
+                file_id, url = item
+                try:
+                    file = File.objects_with_deleted.get(id=file_id)
+                    file_name_before, parsed_text_before = file.name, file.parsed_text
+                    self.importer.download_file_content(file, url)
+                    self.importer.finish_file(
+                        file, file_name_before, parsed_text_before
+                    )
+                except Exception as e:
+                    self.fail("Failed to download file {}: {}".format(file_id, e))
+                    continue
+                with self.lock:
+                    self.files += 1
+        finally:
+            connection.close()
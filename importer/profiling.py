@@ -0,0 +1,164 @@
+"""
+Opt-in instrumentation of the importer, enabled with --profile of importoparl and cron.
+
+Each stage records the number of calls, the wall time, the number of sql queries and the bytes fetched, in
+total and per object type. The times and queries of a stage include those of the stages called by it, and
+with threads the time of a stage is the sum over all threads, so it can exceed the total time of the import.
+"""
+
+import cProfile
+import functools
+import json
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.db import connection
+
+StageKey = Tuple[str, Optional[str]]
+
+
+class ImportProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stats = defaultdict(Counter)  # type: Dict[StageKey, Counter]
+        self.started = 0.0
+
+    def enable(self):
+        with self.lock:
+            self.stats.clear()
+        self.started = time.perf_counter()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def get_stack(self) -> List[List[StageKey]]:
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextmanager
+    def stage(self, name: str, object_type: Optional[str] = None):
+        if not self.enabled:
+            yield
+            return
+
+        keys = [(name, None)]  # type: List[StageKey]
+        if object_type:
+            keys.append((name, object_type))
+
+        stack = self.get_stack()
+        # The queries are counted for all stages that are active in this thread
+        wrapper = None
+        if not stack:
+            wrapper = connection.execute_wrapper(self.count_query)
+            wrapper.__enter__()
+        stack.append(keys)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            with self.lock:
+                for key in keys:
+                    self.stats[key]["calls"] += 1
+                    self.stats[key]["time"] += duration
+            if wrapper:
+                wrapper.__exit__(None, None, None)
+
+    def count_query(self, execute, sql, params, many, context):
+        active = {key for keys in self.get_stack() for key in keys}
+        with self.lock:
+            for key in active:
+                self.stats[key]["queries"] += 1
+        return execute(sql, params, many, context)
+
+    def add_bytes(self, name: str, count: int, object_type: Optional[str] = None):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.stats[(name, None)]["bytes"] += count
+            if object_type:
+                self.stats[(name, object_type)]["bytes"] += count
+
+    def report(self) -> Dict[str, Any]:
+        stages = OrderedDict()  # type: Dict[str, Dict[str, Any]]
+        with self.lock:
+            items = sorted(self.stats.items(), key=lambda i: (i[0][0], i[0][1] or ""))
+            for (name, object_type), counter in items:
+                entry = OrderedDict(
+                    [
+                        ("calls", counter["calls"]),
+                        ("time", round(counter["time"], 3)),
+                        ("queries", counter["queries"]),
+                        ("bytes", counter["bytes"]),
+                    ]
+                )
+                stage = stages.setdefault(name, OrderedDict())
+                if object_type:
+                    stage.setdefault("by_type", OrderedDict())[object_type] = entry
+                else:
+                    stage.update(entry)
+        return OrderedDict(
+            [
+                ("total_time", round(time.perf_counter() - self.started, 3)),
+                ("stages", stages),
+            ]
+        )
+
+    def write_report(self, path: str):
+        with open(path, "w") as fp:
+            json.dump(self.report(), fp, indent=2)
+
+
+profiler = ImportProfiler()
+
+
+def profiled(name: str, object_type_arg: Optional[int] = None):
+    """ Records the calls of the decorated function as stage.
+
+    If object_type_arg is given, the calls are also recorded per model class passed as that positional argument.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return fn(*args, **kwargs)
+            object_type = None
+            if object_type_arg is not None and len(args) > object_type_arg:
+                object_type = getattr(args[object_type_arg], "__name__", None)
+            with profiler.stage(name, object_type):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def profile_import(report_path: Optional[str], cprofile_path: Optional[str] = None):
+    """ Writes the json report and the pstats dump of what ran inside the block, if the paths are given
+
+    cProfile only sees the main thread.
+    """
+    if report_path:
+        profiler.enable()
+    cprofile = cProfile.Profile() if cprofile_path else None
+    if cprofile:
+        cprofile.enable()
+    try:
+        yield
+    finally:
+        if cprofile:
+            cprofile.disable()
+            cprofile.dump_stats(cprofile_path)
+        if report_path:
+            profiler.disable()
+            profiler.write_report(report_path)
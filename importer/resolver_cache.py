@@ -0,0 +1,189 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from io import BytesIO
+from typing import Optional, NamedTuple
+
+from django.conf import settings
+from minio.error import NoSuchKey
+
+from mainapp.functions.minio import minio_client, minio_cache_bucket
+
+logger = logging.getLogger(__name__)
+
+CacheEntry = NamedTuple(
+    "CacheEntry",
+    [("data", bytes), ("etag", Optional[str]), ("last_modified", Optional[str])],
+)
+
+
+class ResolverCache:
+    """ Stores the responses of the oparl server with the validators for conditional requests """
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        raise NotImplementedError
+
+    def set(
+        self,
+        url: str,
+        data: bytes,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MinioResolverCache(ResolverCache):
+    """ Every response is an object in the cache bucket, so every lookup is a request to minio """
+
+    etag_metadata = "X-Amz-Meta-Source-Etag"
+    last_modified_metadata = "X-Amz-Meta-Source-Last-Modified"
+
+    @staticmethod
+    def get_object_name(url: str) -> str:
+        # We need to avoid filenames where a prefix already is a file, which fails with a weird minio error
+        return url + "-disambiguate-file"
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        try:
+            response = minio_client.get_object(
+                minio_cache_bucket, self.get_object_name(url)
+            )
+        except NoSuchKey:
+            return None
+        headers = {
+            key.lower(): value
+            for key, value in (getattr(response, "headers", None) or {}).items()
+        }
+        return CacheEntry(
+            response.read(),
+            headers.get(self.etag_metadata.lower()),
+            headers.get(self.last_modified_metadata.lower()),
+        )
+
+    def set(
+        self,
+        url: str,
+        data: bytes,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        metadata = {}
+        if etag:
+            metadata[self.etag_metadata] = etag
+        if last_modified:
+            metadata[self.last_modified_metadata] = last_modified
+        minio_client.put_object(
+            minio_cache_bucket,
+            self.get_object_name(url),
+            BytesIO(data),
+            len(data),
+            metadata=metadata,
+        )
+
+
+class SQLiteResolverCache(ResolverCache):
+    """
+    A local cache in a single sqlite file, so a lookup is an indexed read without any network round trip.
+
+    The responses are compressed with zlib. If the compressed responses exceed max_size bytes, the least
+    recently used ones are evicted until 90% of max_size are left.
+    """
+
+    def __init__(self, path: str, max_size: int):
+        self.path = path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # The cache can be rebuilt from the server, so durability isn't worth a sync on every write
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=OFF")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "url TEXT PRIMARY KEY, data BLOB, etag TEXT, last_modified TEXT, "
+            "size INTEGER, accessed REAL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)"
+        )
+        self.size = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()[0]
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT data, etag, last_modified FROM cache WHERE url = ?", (url,)
+            ).fetchone()
+            if not row:
+                return None
+            self.connection.execute(
+                "UPDATE cache SET accessed = ? WHERE url = ?", (time.time(), url)
+            )
+        data, etag, last_modified = row
+        return CacheEntry(zlib.decompress(data), etag, last_modified)
+
+    def set(
+        self,
+        url: str,
+        data: bytes,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        compressed = zlib.compress(data)
+        with self.lock, self.connection:
+            previous = self.connection.execute(
+                "SELECT size FROM cache WHERE url = ?", (url,)
+            ).fetchone()
+            if previous:
+                self.size -= previous[0]
+            self.connection.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)",
+                (url, compressed, etag, last_modified, len(compressed), time.time()),
+            )
+            self.size += len(compressed)
+
+            if self.size > self.max_size:
+                self.evict()
+
+    def evict(self):
+        """ Removes the least recently used responses, which must be called with the lock held """
+        target = self.max_size * 0.9
+        evicted = 0
+        rows = self.connection.execute(
+            "SELECT url, size FROM cache ORDER BY accessed"
+        ).fetchall()
+        for url, size in rows:
+            if self.size <= target:
+                break
+            self.connection.execute("DELETE FROM cache WHERE url = ?", (url,))
+            self.size -= size
+            evicted += 1
+        logger.debug("Evicted {} responses from the resolver cache".format(evicted))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def get_resolver_cache() -> ResolverCache:
+    if settings.OPARL_CACHE_BACKEND == "minio":
+        return MinioResolverCache()
+    elif settings.OPARL_CACHE_BACKEND == "local":
+        directory = os.path.dirname(settings.OPARL_CACHE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return SQLiteResolverCache(
+            settings.OPARL_CACHE_PATH, settings.OPARL_CACHE_MAX_SIZE * 1024 * 1024
+        )
+    else:
+        raise ValueError(
+            "Invalid OPARL_CACHE_BACKEND: {}".format(settings.OPARL_CACHE_BACKEND)
+        )
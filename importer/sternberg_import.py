@@ -1,4 +1,5 @@
 import json
+from datetime import datetime
 from typing import Optional
 
 import gi
@@ -104,6 +105,23 @@ class SternbergResolver:
 
         return response
 
+    def set_modified_since(self, url: str, modified_since: Optional[datetime]):
+        self.original_resolver.set_modified_since(url, modified_since)
+
+    def set_list_range(
+        self, url: str, first_page: Optional[str], last_page: Optional[str]
+    ):
+        self.original_resolver.set_list_range(url, first_page, last_page)
+
+    def load_ahead(self, url: str) -> Optional[str]:
+        return self.original_resolver.load_ahead(url)
+
+    def get_fingerprint(self, oparl_id: str) -> Optional[str]:
+        return self.original_resolver.get_fingerprint(oparl_id)
+
+    def close(self):
+        self.original_resolver.close()
+
 
 class SternbergImport(OParlImport):
     def __init__(self, options, resolver):
@@ -111,7 +129,7 @@ class SternbergImport(OParlImport):
         super().__init__(options, sternberg_resolver)
 
     def download_file(
-        self, file: File, url: str, libobject: OParl.File
+        self, file: File, url: str, libobject: Optional[OParl.File] = None
     ) -> Optional[bytes]:
         """ Fix the invalid urls of sternberg oparl """
         url = url.replace(r"files//rim", r"files/rim")
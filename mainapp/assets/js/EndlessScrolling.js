@@ -23,9 +23,16 @@ export default class EndlessScrolling {
             return;
         }
 
+        // The cursor of the last page is empty
+        let cursor = this.$button.data("cursor");
+        if (!cursor) {
+            this.isActive = false;
+            return;
+        }
+
         if ($(window).scrollTop() >= $(document).height() - $(window).height() - this.loadFurtherHeight) {
             this.isLoading = true;
-            let url = this.$button.data("url") + "?after=" + this.$target.find("> li").length;
+            let url = this.$button.data("url") + "?cursor=" + encodeURIComponent(cursor);
             $.get(url, (data) => {
                 let $data = $(data["results"]);
                 if ($data.length > 0) {
@@ -33,6 +40,7 @@ export default class EndlessScrolling {
                 } else {
                     this.isActive = false;
                 }
+                this.$button.data("cursor", data["cursor"]);
                 this.isLoading = false;
             });
         }
@@ -89,6 +89,7 @@ export default class FacettedSearch {
             $nothingFound.attr('hidden', 'hidden');
         }
         $btn.data('url', data['more_link']);
+        $btn.data('cursor', data['cursor']);
         $btn.data('widget').reset();
         $("#endless-scroll-target").html($data.find("> li"));
     }
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django_elasticsearch_dsl.registries import registry
+from django_elasticsearch_dsl.signals import RealTimeSignalProcessor
+
+from mainapp.functions.alert_percolator import register_alerts, unregister_alert
+from mainapp.functions.search_tools import bump_search_generation
+from mainapp.models import UserAlert
+
+
+class SearchCacheSignalProcessor(RealTimeSignalProcessor):
+    """
+    Updates the index like the default processor, invalidates the cached search results and keeps the
+    alert percolator in sync
+    """
+
+    @staticmethod
+    def is_indexed(instance) -> bool:
+        model = instance.__class__
+        return model in registry.get_models() or model in registry._related_models
+
+    def handle_save(self, sender, instance, **kwargs):
+        super().handle_save(sender, instance, **kwargs)
+        if self.is_indexed(instance):
+            bump_search_generation()
+
+        # The documents are matched by the importer once their associations are complete
+        if settings.ELASTICSEARCH_PERCOLATE_ALERTS and isinstance(instance, UserAlert):
+            register_alerts([instance.search_string])
+
+    def handle_delete(self, sender, instance, **kwargs):
+        super().handle_delete(sender, instance, **kwargs)
+        if self.is_indexed(instance):
+            bump_search_generation()
+
+        if settings.ELASTICSEARCH_PERCOLATE_ALERTS and isinstance(instance, UserAlert):
+            unregister_alert(instance.search_string)
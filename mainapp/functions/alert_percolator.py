@@ -0,0 +1,198 @@
+"""
+Matches the documents against the search alerts as they are indexed, instead of running every alert as search.
+
+The query of each distinct alert search string is stored in a separate index as percolator query. That index
+contains the mappings of the documents, so the queries are parsed like the search does. Every document that
+the importer creates or changes is percolated once its associations are written, i.e. checked against all
+stored queries, and each match is stored as UserAlertMatch until notifyusers sends it.
+"""
+
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Type
+
+from django.conf import settings
+from django.db import models
+from elasticsearch.helpers import bulk
+from elasticsearch_dsl import Index, Mapping, MultiSearch, Search, Percolator, Keyword
+from elasticsearch_dsl.connections import connections
+
+from mainapp.functions.search_tools import (
+    MainappSearch,
+    search_string_to_params,
+    get_highlights,
+    html_escape_highlight,
+)
+
+logger = logging.getLogger(__name__)
+
+ALERT_QUERY_TYPE = "alert_query"
+# Only these types can be shown in the notifications
+PERCOLATED_TYPES = ["file", "meeting", "paper"]
+# The most alerts a single document can match
+MAX_MATCHES = 10000
+
+
+def get_alert_index_name() -> str:
+    return settings.ELASTICSEARCH_INDEX + "_alerts"
+
+
+def get_alert_index() -> Index:
+    """ The alert index needs the mappings and the analyzers of the documents to parse the queries """
+    # Registers the documents with the index
+    import mainapp.documents  # noqa
+    from mainapp.documents.index import elastic_index
+
+    index = elastic_index.clone(get_alert_index_name())
+    mapping = Mapping(ALERT_QUERY_TYPE)
+    mapping.field("query", Percolator())
+    mapping.field("search_string", Keyword(index=False))
+    index.mapping(mapping)
+    return index
+
+
+def get_alert_query(search_string: str) -> dict:
+    """ The query of the search page for the alert, with the facet filters moved into the query """
+    search = MainappSearch(search_string_to_params(search_string), aggregations=False)
+    body = search._s.to_dict()
+    query = body.get("query", {"match_all": {}})
+    if "post_filter" in body:
+        query = {"bool": {"must": [query], "filter": [body["post_filter"]]}}
+    return query
+
+
+def get_alert_query_id(search_string: str) -> str:
+    return hashlib.sha256(search_string.encode()).hexdigest()
+
+
+def register_alerts(search_strings: Iterable[str]):
+    actions = [
+        {
+            "_index": get_alert_index_name(),
+            "_type": ALERT_QUERY_TYPE,
+            "_id": get_alert_query_id(search_string),
+            "_source": {
+                "query": get_alert_query(search_string),
+                "search_string": search_string,
+            },
+        }
+        for search_string in set(search_strings)
+    ]
+    bulk(connections.get_connection(), actions)
+
+
+def unregister_alert(search_string: str):
+    """ Removes the query unless another alert has the same search """
+    from mainapp.models import UserAlert
+
+    if UserAlert.objects.filter(search_string=search_string).exists():
+        return
+
+    connections.get_connection().delete(
+        index=get_alert_index_name(),
+        doc_type=ALERT_QUERY_TYPE,
+        id=get_alert_query_id(search_string),
+        ignore=404,
+    )
+
+
+def rebuild_alert_index():
+    """ Recreates the index with the queries of all alerts """
+    from mainapp.models import UserAlert
+
+    index = get_alert_index()
+    index.delete(ignore=404)
+    index.create()
+    register_alerts(UserAlert.objects.values_list("search_string", flat=True))
+
+
+def get_percolated_documents(model: Type[models.Model]) -> list:
+    from django_elasticsearch_dsl.registries import registry
+
+    return [
+        document
+        for document in registry.get_documents([model])
+        if document._doc_type.name.replace("_document", "") in PERCOLATED_TYPES
+    ]
+
+
+def percolate(model: Type[models.Model], objects: List[models.Model], batch_size=100):
+    """ Stores the alerts matched by each object, replacing the unsent matches of earlier versions """
+    if (
+        not settings.ELASTICSEARCH_ENABLED
+        or not settings.ELASTICSEARCH_PERCOLATE_ALERTS
+        or not objects
+    ):
+        return
+
+    from mainapp.models import UserAlert, UserAlertMatch
+
+    # A duplicate would create its matches twice
+    objects = list(OrderedDict((obj.pk, obj) for obj in objects).values())
+
+    for document in get_percolated_documents(model):
+        doc_type = document._doc_type.name
+        document_type = doc_type.replace("_document", "")
+        bodies = [document().prepare(obj) for obj in objects]
+
+        # search string -> (object id, title, highlight)
+        matches = {}  # type: Dict[str, List[tuple]]
+        for start in range(0, len(objects), batch_size):
+            multi_search = MultiSearch(index=get_alert_index_name())
+            for body in bodies[start : start + batch_size]:
+                search = (
+                    Search(doc_type=ALERT_QUERY_TYPE)
+                    .extra(
+                        query={
+                            "percolate": {
+                                "field": "query",
+                                "document_type": doc_type,
+                                "document": body,
+                            }
+                        }
+                    )
+                    .source(["search_string"])
+                    .highlight_options(require_field_match=False)
+                    .highlight(
+                        "*", fragment_size=150, pre_tags="<mark>", post_tags="</mark>"
+                    )
+                )
+                multi_search = multi_search.add(search[:MAX_MATCHES])
+            responses = multi_search.execute()
+            for obj, body, response in zip(
+                objects[start : start + batch_size],
+                bodies[start : start + batch_size],
+                responses,
+            ):
+                for hit in response.hits:
+                    parsed = {"name": body["name"]}
+                    highlights = get_highlights(hit, parsed)
+                    highlight = (
+                        html_escape_highlight(highlights[0]) if highlights else None
+                    )
+                    matches.setdefault(hit.search_string, []).append(
+                        (obj.id, body["name"], highlight)
+                    )
+
+        # An update that doesn't match anymore also removes the pending notification
+        UserAlertMatch.objects.filter(
+            document_type=document_type, document_id__in=[obj.id for obj in objects]
+        ).delete()
+        alerts = UserAlert.objects.filter(search_string__in=list(matches))
+        UserAlertMatch.objects.bulk_create(
+            UserAlertMatch(
+                alert=alert,
+                document_type=document_type,
+                document_id=document_id,
+                title=title,
+                highlight=highlight,
+            )
+            for alert in alerts
+            for document_id, title, highlight in matches[alert.search_string]
+        )
+        logger.debug(
+            "Percolated {} {}: {} matching alert searches".format(
+                len(objects), doc_type, len(matches)
+            )
+        )
@@ -1,20 +1,21 @@
 import logging
 import re
 import subprocess
-import tempfile
+import threading
+from collections import defaultdict
+from datetime import datetime
 from subprocess import CalledProcessError
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Pattern, Type, Tuple, FrozenSet
 
 import geoextract
 import requests
 from PyPDF2.pdf import PdfFileReader
 from django.conf import settings
+from django.db.models import Count, Max
 from django.urls import reverse
-from wand.color import Color
-from wand.image import Image
 
-from mainapp.functions.geo_functions import geocode
-from mainapp.models import SearchStreet, Body, Location, Person, Paper
+from mainapp.functions.geo_functions import geocode_many
+from mainapp.models import SearchStreet, Body, Location, Person, Paper, DefaultFields
 
 logger = logging.getLogger(__name__)
 
@@ -77,6 +78,17 @@ def extract_text_from_pdf(pdf_file: str) -> str:
         return ""
 
 
+def extract_text_and_page_count_from_pdf(pdf_file: str) -> Tuple[str, int]:
+    """
+    pdftotext ends every page with a form feed, so the page count comes from the same pass as the text
+    instead of reading the whole document again with PyPDF2. Raises CalledProcessError if pdftotext fails.
+    """
+    text = subprocess.check_output(["pdftotext", pdf_file, "-"]).decode(
+        "utf-8", "ignore"
+    )
+    return text, text.count("\f")
+
+
 def get_page_count_from_pdf(pdf_file: str) -> int:
     with open(pdf_file, "rb") as fp:
         return PdfFileReader(fp).getNumPages()
@@ -104,51 +116,64 @@ def perform_ocr_on_image(imgdata):
     return plain_text
 
 
-def get_ocr_text_from_pdf(file):
-    img = Image(blob=file, resolution=500)
-    recognized_text = ""
-    for single_image in img.sequence:
-        with Image(single_image) as i:
-            i.resolution = 100
-            i.format = "png"
-            i.background_color = Color("white")
-            i.alpha_channel = "remove"
+def create_geoextract_data(bodies: Optional[List[Body]] = None) -> List[Dict[str, str]]:
+    if bodies:
+        streets = SearchStreet.objects.filter(body__in=bodies)
+    else:
+        streets = SearchStreet.objects.all()
 
-            tmpfile = tempfile.TemporaryFile()
-            i.save(file=tmpfile)
-            tmpfile.seek(0)
-            imgdata = tmpfile.read()
-            tmpfile.close()
+    street_names = set()
+    locations = []
+    for displayed_name in streets.values_list("displayed_name", flat=True):
+        if displayed_name not in street_names:
+            street_names.add(displayed_name)
+            locations.append({"type": "street", "name": displayed_name})
 
-            # Workaround: Shrink image until the size is below Azure's upload limit of 4MB
-            while len(imgdata) > 4000000:
-                i.resize(round(i.width * 0.75), round(i.height * 0.75))
+    return locations
 
-                tmpfile = tempfile.TemporaryFile()
-                i.save(file=tmpfile)
-                tmpfile.seek(0)
-                imgdata = tmpfile.read()
-                tmpfile.close()
 
-            recognized_text += perform_ocr_on_image(imgdata)
+def get_table_version(model: Type[DefaultFields]) -> Tuple[int, Optional[datetime]]:
+    """
+    The number of rows and the latest modification of a table, which change on every save and delete.
 
-    return recognized_text
+    This is cheap to query and also catches changes from other processes, so it's used to invalidate
+    data that is derived from a whole table.
+    """
+    version = model.objects_with_deleted.aggregate(
+        count=Count("id"), modified=Max("modified")
+    )
+    return version["count"], version["modified"]
 
 
-def create_geoextract_data(bodies: Optional[List[Body]] = None) -> List[Dict[str, str]]:
-    street_names = []
-    if bodies:
-        streets = SearchStreet.objects.filter(bodies__in=bodies)
-    else:
-        streets = SearchStreet.objects.all()
+def get_extraction_version() -> str:
+    """ Changes with the persons and the streets, which invalidates the locations and persons extracted before """
+    parts = []
+    for model in [Person, SearchStreet]:
+        count, modified = get_table_version(model)
+        parts.append("{}@{}".format(count, modified.isoformat() if modified else ""))
+    return ",".join(parts)
 
-    locations = []
-    for street in streets:
-        if street.displayed_name not in street_names:
-            street_names.append(street.displayed_name)
-            locations.append({"type": "street", "name": street.displayed_name})
 
-    return locations
+_address_pipelines = {}  # type: Dict[Optional[FrozenSet[int]], AddressPipeline]
+_address_pipelines_version = None
+_address_pipelines_lock = threading.Lock()
+
+
+def get_address_pipeline(bodies: Optional[List[Body]] = None) -> AddressPipeline:
+    """ Building the pipeline with all streets is expensive, so it's cached until the streets change """
+    global _address_pipelines_version
+
+    version = get_table_version(SearchStreet)
+    key = frozenset(body.id for body in bodies) if bodies else None
+
+    with _address_pipelines_lock:
+        if _address_pipelines_version != version:
+            _address_pipelines.clear()
+            _address_pipelines_version = version
+        if key not in _address_pipelines:
+            logger.debug("Building the address pipeline")
+            _address_pipelines[key] = AddressPipeline(create_geoextract_data(bodies))
+        return _address_pipelines[key]
 
 
 def get_search_string(location: Dict[str, str], fallback_city_name: str) -> str:
@@ -186,9 +211,7 @@ def format_location_name(location: Dict[str, str]) -> str:
 def extract_found_locations(
     text: str, bodies: Optional[List[Body]] = None
 ) -> List[Dict[str, str]]:
-    search_for = create_geoextract_data(bodies)
-    pipeline = AddressPipeline(search_for)
-    return pipeline.extract(text)
+    return get_address_pipeline(bodies).extract(text)
 
 
 def extract_locations(
@@ -200,6 +223,8 @@ def extract_locations(
     found_locations = extract_found_locations(text)
 
     locations = []
+    # The new locations are geocoded at once, so an address mentioned multiple times is only looked up once
+    to_geocode = []
     for found_location in found_locations:
         if "name" in found_location and len(found_location["name"]) < 5:
             continue
@@ -213,18 +238,22 @@ def extract_locations(
         )
 
         if created:
-            search_str = get_search_string(found_location, fallback_city)
-            geodata = geocode(search_str)
-            if geodata:
-                location.geometry = {
-                    "type": "Point",
-                    "coordinates": [geodata["lng"], geodata["lat"]],
-                }
-                location.save()
+            to_geocode.append(
+                (location, get_search_string(found_location, fallback_city))
+            )
             location.bodies.set([Body.objects.get(id=settings.SITE_DEFAULT_BODY)])
 
         locations.append(location)
 
+    geodata = geocode_many(search_str for _, search_str in to_geocode)
+    for location, search_str in to_geocode:
+        if geodata[search_str]:
+            location.geometry = {
+                "type": "Point",
+                "coordinates": [geodata[search_str]["lng"], geodata[search_str]["lat"]],
+            }
+            location.save()
+
     return locations
 
 
@@ -263,27 +292,102 @@ def index_papers_to_geodata(papers: List[Paper]) -> Dict[str, Any]:
     return geodata
 
 
-def extract_persons(text):
+class PersonMatcher:
     """
-    :type text: str
-    :return: list of mainapp.models.Person
+    Finds the persons mentioned in a text.
+
+    A person matches if either the full name or given and family name (in any order, separated by spaces or
+    commas) occur in the text. Instead of running those regexes for every person on every text, the persons are
+    indexed by a word that has to occur in the text for any of them to match, so only the few candidates whose
+    word is in the text need to be checked with the actual regexes.
     """
-    persons = Person.objects.all()
-    found_persons = []
-    text = " " + text + " "  # Workaround to find names at the very beginning or end
 
-    def match(name_parts):
+    def __init__(self, persons: List[Person]):
+        self.persons = persons
+        self.patterns = {}  # type: Dict[int, List[Pattern]]
+        # Persons without a usable word in their name have to be checked on every text
+        self.unindexed = []  # type: List[int]
+        self.by_word = defaultdict(list)  # type: Dict[str, List[int]]
+
+        for index, person in enumerate(persons):
+            name_word = self._index_word([person.name])
+            names_word = self._index_word([person.given_name, person.family_name])
+            if not name_word or not names_word:
+                self.unindexed.append(index)
+                continue
+            self.by_word[name_word].append(index)
+            if names_word != name_word:
+                self.by_word[names_word].append(index)
+
+    @staticmethod
+    def _index_word(name_parts: List[str]) -> Optional[str]:
+        """ Every word of a name part also appears as a whole word in a matching text, so we take the longest """
+        words = re.findall(r"\w+", " ".join(part or "" for part in name_parts))
+        if not words:
+            return None
+        return max(words, key=len).casefold()
+
+    @staticmethod
+    def _compile(name_parts: List[str]) -> Pattern:
         escaped_parts = []
         for part in name_parts:
-            escaped_parts.append(re.escape(part))
+            escaped_parts.append(re.escape(part or ""))
         matcher = r"[^\w]" + r"[\s,]+".join(escaped_parts) + r"[^\w]"
-        return re.search(matcher, text, re.I | re.S | re.U | re.MULTILINE)
+        return re.compile(matcher, re.I | re.S | re.U | re.MULTILINE)
+
+    def _get_patterns(self, index: int) -> List[Pattern]:
+        # Compiled lazily as most persons will never be a candidate
+        if index not in self.patterns:
+            person = self.persons[index]
+            self.patterns[index] = [
+                self._compile([person.name]),
+                self._compile([person.given_name, person.family_name]),
+                self._compile([person.family_name, person.given_name]),
+            ]
+        return self.patterns[index]
+
+    def match(self, text: str) -> List[Person]:
+        text = " " + text + " "  # Workaround to find names at the very beginning or end
+
+        words = {word.casefold() for word in re.findall(r"\w+", text)}
+        candidates = set(self.unindexed)
+        for word in words & self.by_word.keys():
+            candidates.update(self.by_word[word])
+
+        found_persons = []
+        for index in sorted(candidates):
+            for pattern in self._get_patterns(index):
+                if pattern.search(text):
+                    found_persons.append(self.persons[index])
+                    break
+
+        return found_persons
+
+
+_person_matcher = None  # type: Optional[PersonMatcher]
+_person_matcher_version = None
+_person_matcher_lock = threading.Lock()
 
-    for person in persons:
-        match_name = match([person.name])
-        match_names = match([person.given_name, person.family_name])
-        match_names_reverse = match([person.family_name, person.given_name])
-        if match_name or match_names or match_names_reverse:
-            found_persons.append(person)
 
-    return found_persons
+def get_person_matcher() -> PersonMatcher:
+    """
+    Returns a matcher for all persons, which is only rebuilt when the person table has changed.
+    """
+    global _person_matcher, _person_matcher_version
+
+    version = get_table_version(Person)
+
+    with _person_matcher_lock:
+        if _person_matcher is None or _person_matcher_version != version:
+            logger.debug("Building the person matcher")
+            _person_matcher = PersonMatcher(list(Person.objects.all()))
+            _person_matcher_version = version
+        return _person_matcher
+
+
+def extract_persons(text):
+    """
+    :type text: str
+    :return: list of mainapp.models.Person
+    """
+    return get_person_matcher().match(text)
@@ -0,0 +1,59 @@
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from mainapp.functions.document_parsing import extract_text_and_page_count_from_pdf
+
+extractable_mime_types = ["application/pdf", "text/text"]
+
+
+def extract_from_file(path: str, mime_type: str) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Returns the text and the page count of a file.
+
+    This runs in the worker processes, so it must neither access the database nor log; errors are raised
+    and reported by the caller.
+    """
+    if mime_type == "application/pdf":
+        return extract_text_and_page_count_from_pdf(path)
+    elif mime_type == "text/text":
+        with open(path) as f:
+            return f.read(), None
+    return None, None
+
+
+class ExtractionPool:
+    """
+    Extracts the text of files in a pool of worker processes, so the extraction neither blocks the threads of
+    the importer nor is serialized by the GIL. The files are queued by submitting them; with 0 workers
+    they are extracted in the calling thread.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.executor = None  # type: Optional[ProcessPoolExecutor]
+        self.lock = threading.Lock()
+
+    def submit(self, path: str, mime_type: str) -> Future:
+        if self.workers == 0:
+            future = Future()
+            try:
+                future.set_result(extract_from_file(path, mime_type))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        with self.lock:
+            if not self.executor:
+                self.executor = ProcessPoolExecutor(self.workers)
+        return self.executor.submit(extract_from_file, path, mime_type)
+
+    def extract(self, path: str, mime_type: str) -> Tuple[Optional[str], Optional[int]]:
+        return self.submit(path, mime_type).result()
+
+    def close(self):
+        with self.lock:
+            if self.executor:
+                self.executor.shutdown()
+                self.executor = None
@@ -1,15 +1,42 @@
+import hashlib
+import json
 import logging
 import re
-from typing import Optional, Dict
+import threading
+import time
+from datetime import timedelta
+from typing import Optional, Dict, Callable, Any, Iterable
 
 from django.conf import settings
+from django.utils import timezone
 from geopy import OpenCage, Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 from slugify import slugify
 
+from mainapp.models.geocoding_cache import GeocodingCache
+
 logger = logging.getLogger(__name__)
 
 
+class RateLimiter:
+    """ Ensures a minimum delay between two calls to the geocoder, also across threads """
+
+    def __init__(self, min_delay: float):
+        self.min_delay = min_delay
+        self.last_call = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            delay = self.last_call + self.min_delay - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.last_call = time.monotonic()
+
+
+rate_limiter = RateLimiter(settings.GEOCODING_MIN_DELAY)
+
+
 def get_geolocator(fallback=False):
     if settings.GEOEXTRACT_ENGINE.lower() == "opencage" and not fallback:
         if not settings.OPENCAGE_KEY:
@@ -23,7 +50,48 @@ def get_geolocator(fallback=False):
     return geolocator
 
 
-def geocode(search_str: str) -> Optional[Dict[str, int]]:
+def _cache_key(kind: str, query: str) -> str:
+    return hashlib.sha256(
+        (kind + ":" + settings.GEOEXTRACT_ENGINE.lower() + ":" + query).encode()
+    ).hexdigest()
+
+
+def _normalize_query(search_str: str) -> str:
+    return " ".join(search_str.split()).casefold()
+
+
+def _is_expired(entry: GeocodingCache) -> bool:
+    if entry.result is None:
+        max_age = timedelta(days=settings.GEOCODING_CACHE_NOT_FOUND_DAYS)
+    else:
+        max_age = timedelta(days=settings.GEOCODING_CACHE_DAYS)
+    return entry.modified < timezone.now() - max_age
+
+
+def _decode(entry: GeocodingCache) -> Any:
+    return json.loads(entry.result) if entry.result is not None else None
+
+
+def _cached(kind: str, query: str, lookup: Callable[[], Any]) -> Any:
+    """ Returns the cached result for the query or performs and caches the lookup. Nothing found is cached too """
+    key = _cache_key(kind, query)
+    entry = GeocodingCache.objects.filter(key=key).first()
+    if entry and not _is_expired(entry):
+        return _decode(entry)
+
+    result = lookup()
+    GeocodingCache.objects.update_or_create(
+        key=key,
+        defaults={
+            "query": query,
+            "result": json.dumps(result) if result is not None else None,
+        },
+    )
+    return result
+
+
+def _geocode(search_str: str) -> Optional[Dict[str, float]]:
+    rate_limiter.wait()
     try:
         location = get_geolocator().geocode(
             search_str, language="de", exactly_one=False
@@ -39,6 +107,39 @@ def geocode(search_str: str) -> Optional[Dict[str, int]]:
     return {"lat": location[0].latitude, "lng": location[0].longitude}
 
 
+def geocode(search_str: str) -> Optional[Dict[str, float]]:
+    return _cached(
+        "geocode", _normalize_query(search_str), lambda: _geocode(search_str)
+    )
+
+
+def geocode_many(
+    search_strings: Iterable[str]
+) -> Dict[str, Optional[Dict[str, float]]]:
+    """
+    Geocodes all search strings, with all cached results loaded in a single query.
+
+    Search strings that only differ in case or whitespace are looked up only once, and the remaining
+    lookups are done one after the other to respect the rate limit of the geocoder.
+    """
+    search_strings = list(search_strings)
+    keys = [_cache_key("geocode", _normalize_query(i)) for i in search_strings]
+    entries = GeocodingCache.objects.filter(key__in=set(keys))
+    cached = {entry.key: entry for entry in entries if not _is_expired(entry)}
+
+    resolved = {}  # type: Dict[str, Optional[Dict[str, float]]]
+    results = {}  # type: Dict[str, Optional[Dict[str, float]]]
+    for search_str, key in zip(search_strings, keys):
+        if key not in resolved:
+            if key in cached:
+                resolved[key] = _decode(cached[key])
+            else:
+                resolved[key] = geocode(search_str)
+        results[search_str] = resolved[key]
+
+    return results
+
+
 def _format_opencage_location(location):
     components = location.raw["components"]
     if "road" in components:
@@ -60,13 +161,23 @@ def _format_nominatim_location(location):
         return location.split(",")[0]
 
 
-def latlng_to_address(lat, lng):
+def _latlng_to_address(lat, lng) -> Optional[str]:
+    rate_limiter.wait()
     geolocator = get_geolocator()
     location = geolocator.reverse(str(lat) + ", " + str(lng))
-    if len(location) > 0:
+    if location and len(location) > 0:
         if settings.GEOEXTRACT_ENGINE.lower() == "opencage":
             return _format_opencage_location(location[0])
         else:
             return _format_nominatim_location(location[0])
     else:
+        return None
+
+
+def latlng_to_address(lat, lng) -> str:
+    # Five decimal places are about one meter, which is precise enough to share the results
+    query = "{:.5f}, {:.5f}".format(float(lat), float(lng))
+    address = _cached("reverse", query, lambda: _latlng_to_address(lat, lng))
+    if address is None:
         return str(lat) + ", " + str(lng)
+    return address
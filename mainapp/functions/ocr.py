@@ -0,0 +1,122 @@
+import logging
+import math
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Type
+
+from django.conf import settings
+from wand.color import Color
+from wand.image import Image
+
+from mainapp.functions.document_parsing import (
+    perform_ocr_on_image,
+    get_page_count_from_pdf,
+)
+from mainapp.models import OCRPageCache
+
+logger = logging.getLogger(__name__)
+
+
+class OCRBackend:
+    """ Recognizes the text in the image of a single page """
+
+    # The largest image in bytes the backend accepts, larger images are scaled down
+    max_image_size = None  # type: Optional[int]
+
+    def recognize(self, image: bytes) -> str:
+        raise NotImplementedError
+
+
+class AzureOCRBackend(OCRBackend):
+    max_image_size = 4000000
+
+    def recognize(self, image: bytes) -> str:
+        return perform_ocr_on_image(image)
+
+
+class TesseractOCRBackend(OCRBackend):
+    """ Runs locally, e.g. for development and tests """
+
+    def __init__(self, language: Optional[str] = None):
+        self.language = language or settings.OCR_TESSERACT_LANGUAGE
+
+    def recognize(self, image: bytes) -> str:
+        result = subprocess.run(
+            ["tesseract", "stdin", "stdout", "-l", self.language],
+            input=image,
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+        return result.stdout.decode("utf-8", "ignore")
+
+
+ocr_backends = {
+    "azure": AzureOCRBackend,
+    "tesseract": TesseractOCRBackend,
+}  # type: Dict[str, Type[OCRBackend]]
+
+
+def get_ocr_backend() -> OCRBackend:
+    return ocr_backends[settings.OCR_BACKEND]()
+
+
+class OCRPipeline:
+    """
+    OCRs a pdf page by page.
+
+    Each page is only rasterized when it is recognized and a bounded pool of threads works on the pages at
+    the same time, so at most one page per worker is in memory. The text of every page is cached by the
+    sha256 of the file, so an interrupted run continues with the first page that wasn't recognized yet.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[OCRBackend] = None,
+        workers: Optional[int] = None,
+        resolution: int = 500,
+    ):
+        self.backend = backend or get_ocr_backend()
+        self.workers = workers or settings.OCR_WORKERS
+        self.resolution = resolution
+
+    def rasterize_page(self, path: str, page: int) -> bytes:
+        with Image(
+            filename="{}[{}]".format(path, page), resolution=self.resolution
+        ) as image:
+            image.format = "png"
+            image.background_color = Color("white")
+            image.alpha_channel = "remove"
+            data = image.make_blob()
+
+            max_size = self.backend.max_image_size
+            while max_size and len(data) > max_size:
+                # The size of the png grows roughly with the area, so we scale both sides by the square root
+                factor = min(math.sqrt(max_size / len(data)), 0.9)
+                image.resize(round(image.width * factor), round(image.height * factor))
+                data = image.make_blob()
+
+        return data
+
+    def recognize_page(self, path: str, sha256: str, page: int) -> str:
+        cached = (
+            OCRPageCache.objects.filter(sha256=sha256, page=page)
+            .values_list("text", flat=True)
+            .first()
+        )
+        if cached is not None:
+            return cached
+
+        logger.debug("Recognizing page {} of {}".format(page, sha256))
+        text = self.backend.recognize(self.rasterize_page(path, page))
+        OCRPageCache.objects.update_or_create(
+            sha256=sha256, page=page, defaults={"text": text}
+        )
+        return text
+
+    def recognize(self, path: str, sha256: str) -> str:
+        page_count = get_page_count_from_pdf(path)
+        with ThreadPoolExecutor(self.workers) as executor:
+            texts = executor.map(
+                lambda page: self.recognize_page(path, sha256, page), range(page_count)
+            )
+            return "".join(texts)
@@ -1,12 +1,18 @@
+import base64
 import datetime
+import hashlib
+import json
+import uuid
 from collections import namedtuple
-from typing import Dict
+from typing import Dict, List, Optional
 
 from django.conf import settings
+from django.core.cache import caches
 from django.urls import reverse
 from django.utils.html import escape
 from django.utils.translation import ugettext
-from elasticsearch_dsl import Q, FacetedSearch, TermsFacet
+from elasticsearch_dsl import Q, FacetedSearch, TermsFacet, MultiSearch
+from elasticsearch_dsl.faceted_search import FacetedResponse
 from requests.utils import quote
 
 from mainapp.functions.geo_functions import latlng_to_address
@@ -42,6 +48,58 @@ NotificationSearchResult = namedtuple(
     "NotificationSearchResult", ["title", "url", "type", "type_name", "highlight"]
 )
 
+SEARCH_GENERATION_KEY = "search-generation"
+SEARCH_CACHE_COUNTERS = ["hits", "misses"]
+
+
+def get_search_generation() -> str:
+    """ Is part of the keys of the cached search results and changes whenever something is indexed """
+    cache = caches["search"]
+    generation = cache.get(SEARCH_GENERATION_KEY)
+    if generation is None:
+        cache.add(SEARCH_GENERATION_KEY, uuid.uuid4().hex, None)
+        generation = cache.get(SEARCH_GENERATION_KEY)
+    return generation
+
+
+def bump_search_generation():
+    """ Invalidates all cached search results """
+    caches["search"].set(SEARCH_GENERATION_KEY, uuid.uuid4().hex, None)
+
+
+def count_search_cache(counter: str):
+    cache = caches["search"]
+    key = "search-cache-" + counter
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted in between
+        pass
+
+
+def get_search_cache_stats() -> Dict[str, int]:
+    cache = caches["search"]
+    return {
+        counter: cache.get("search-cache-" + counter, 0)
+        for counter in SEARCH_CACHE_COUNTERS
+    }
+
+
+def encode_search_cursor(sort_values: list) -> str:
+    """ The position after a hit for search_after, opaque to the clients """
+    return base64.urlsafe_b64encode(json.dumps(sort_values).encode()).decode()
+
+
+def decode_search_cursor(cursor: str) -> Optional[list]:
+    try:
+        sort_values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except ValueError:
+        return None
+    if not isinstance(sort_values, list):
+        return None
+    return sort_values
+
 
 class MainappSearch(FacetedSearch):
     index = settings.ELASTICSEARCH_INDEX
@@ -54,11 +112,28 @@ class MainappSearch(FacetedSearch):
         "organization": TermsFacet(field="organization_ids"),
     }
 
-    def __init__(self, params: Dict[str, str], offset=None, limit=None):
+    def __init__(
+        self,
+        params: Dict[str, str],
+        offset=None,
+        limit=None,
+        aggregations=True,
+        cursor: Optional[str] = None,
+    ):
         self.params = params
         self.errors = []
         self.offset = offset
         self.limit = limit
+        self.aggregations = aggregations
+
+        # Deep pages are fetched with search_after instead of an offset, which gets slower the deeper it is
+        self.cursor = None  # type: Optional[list]
+        self.invalid_cursor = False
+        if cursor:
+            self.cursor = decode_search_cursor(cursor)
+            if self.cursor is None:
+                self.invalid_cursor = True
+                self.errors.append(ugettext("The cursor is invalid"))
 
         # Note that for django templates it makes a difference if a value is undefined or None
         self.options = {}
@@ -90,6 +165,15 @@ class MainappSearch(FacetedSearch):
 
         super().__init__(self.params.get("searchterm"), filters, sort)
 
+    def aggregate(self, search):
+        # The facets are only needed for the search page
+        if self.aggregations:
+            super().aggregate(search)
+
+    def sort(self, search):
+        # The unique id breaks ties, so that the cursor points to exactly one position
+        return search.sort(*self._sort, "_uid")
+
     def highlight(self, search):
         search = search.highlight_options(require_field_match=False)
         search = search.highlight(
@@ -140,7 +224,14 @@ class MainappSearch(FacetedSearch):
             search = _add_date_before(search, self.params, self.options, self.errors)
 
         # N.B.: indexing reset from and size
-        if self.limit:
+        if self.invalid_cursor:
+            search = search[:0]
+        elif self.cursor is not None:
+            # search_after needs from to be 0
+            search = search.extra(search_after=self.cursor)
+            if self.limit:
+                search = search[: self.limit]
+        elif self.limit:
             if self.offset:
                 search = search[self.offset : self.limit + self.offset]
             else:
@@ -148,6 +239,51 @@ class MainappSearch(FacetedSearch):
 
         return search
 
+    def get_next_cursor(self, response) -> Optional[str]:
+        """ The cursor for the page after the response, or None if this was the last one """
+        if not self.limit or len(response.hits) < self.limit:
+            return None
+        return encode_search_cursor(list(response.hits[-1].meta.sort))
+
+    def get_cache_key(self) -> str:
+        search = "{}|{}|{}|{}|{}".format(
+            params_to_search_string(self.params),
+            self.offset or 0,
+            self.limit,
+            json.dumps(self.cursor),
+            self.aggregations,
+        )
+        return "search-{}-{}".format(
+            get_search_generation(), hashlib.sha256(search.encode()).hexdigest()
+        )
+
+    def execute(self):
+        """ The responses are cached by the normalized search, until something is indexed """
+        cache = caches["search"]
+        key = self.get_cache_key()
+        data = cache.get(key)
+        if data is not None:
+            count_search_cache("hits")
+            response = FacetedResponse(self._s, data)
+            response._faceted_search = self
+            return response
+
+        count_search_cache("misses")
+        response = super().execute()
+        cache.set(key, response.to_dict(), settings.SEARCH_CACHE_TIMEOUT)
+        return response
+
+
+def execute_multi_search(searches: List[MainappSearch], batch_size: int = 100) -> list:
+    """ Runs the searches with one _msearch request per batch and returns the responses in the same order """
+    responses = []
+    for start in range(0, len(searches), batch_size):
+        multi_search = MultiSearch(index=settings.ELASTICSEARCH_INDEX)
+        for search in searches[start : start + batch_size]:
+            multi_search = multi_search.add(search._s)
+        responses.extend(multi_search.execute())
+    return responses
+
 
 def _add_date_after(search, params, options, errors):
     """ Filters by a date given a string, catching parsing errors. """
@@ -0,0 +1,118 @@
+import random
+import time
+from typing import List, Dict
+
+from django.core.management.base import BaseCommand
+
+from mainapp.functions.document_parsing import AddressPipeline
+
+suffixes = ["straße", "weg", "platz", "allee", "gasse", "ring", "damm"]
+
+syllables = ["Linden", "Berg", "Kirch", "Wald", "Bach", "Rosen", "Garten", "Schul"]
+
+filler_words = (
+    "Der Bauausschuss empfiehlt die Sanierung der Fahrbahn sowie neue Radwege und "
+    "eine Verbesserung der Beleuchtung im gesamten Quartier"
+).split()
+
+
+def create_geoextract_data_with_list(street_names: List[str]) -> List[Dict[str, str]]:
+    """ The previous deduplication with a list, for comparison """
+    seen = []
+    locations = []
+    for street_name in street_names:
+        if street_name not in seen:
+            seen.append(street_name)
+            locations.append({"type": "street", "name": street_name})
+    return locations
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the location extraction with a cached pipeline against rebuilding the pipeline "
+        "for every document on a synthetic corpus. Nothing is written to the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--streets", type=int, default=20000)
+        parser.add_argument("--documents", type=int, default=100)
+        parser.add_argument(
+            "--words", type=int, default=1000, help="Words per document"
+        )
+        parser.add_argument(
+            "--rebuilding-documents",
+            type=int,
+            default=10,
+            help="Rebuilding the pipeline is slow, so it only runs on the first n documents",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def generate_streets(self, rng: random.Random, count: int) -> List[str]:
+        # Real street lists contain many duplicates from streets split into multiple osm ways
+        streets = []
+        for _ in range(count):
+            name = "".join(rng.sample(syllables, 2)) + rng.choice(suffixes)
+            streets.append(name.capitalize() + str(rng.randrange(count // 10 + 1)))
+        return streets
+
+    def generate_document(
+        self, rng: random.Random, streets: List[str], words: int
+    ) -> str:
+        document = [rng.choice(filler_words) for _ in range(words)]
+        for _ in range(rng.randint(0, 5)):
+            address = rng.choice(streets)
+            if rng.random() < 0.5:
+                address += " " + str(rng.randint(1, 100))
+            document.insert(rng.randrange(len(document) + 1), address)
+        return " ".join(document)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        streets = self.generate_streets(rng, options["streets"])
+        documents = [
+            self.generate_document(rng, streets, options["words"])
+            for _ in range(options["documents"])
+        ]
+        self.stdout.write(
+            "{} street entries, {} documents with {} words each".format(
+                len(streets), len(documents), options["words"]
+            )
+        )
+
+        start = time.perf_counter()
+        pipeline = AddressPipeline(
+            [{"type": "street", "name": name} for name in dict.fromkeys(streets)]
+        )
+        build_time = time.perf_counter() - start
+        self.stdout.write("Building the pipeline once: {:.3f}s".format(build_time))
+
+        start = time.perf_counter()
+        cached = [pipeline.extract(document) for document in documents]
+        cached_time = time.perf_counter() - start
+        self.stdout.write(
+            "Cached pipeline: {:.3f}s total, {:.3f}ms per document".format(
+                cached_time, 1000 * cached_time / len(documents)
+            )
+        )
+
+        sample = documents[: options["rebuilding_documents"]]
+        start = time.perf_counter()
+        rebuilt = [
+            AddressPipeline(create_geoextract_data_with_list(streets)).extract(document)
+            for document in sample
+        ]
+        rebuilding_time = time.perf_counter() - start
+        self.stdout.write(
+            "Rebuilding per document: {:.3f}s for {} documents, {:.3f}ms per document".format(
+                rebuilding_time, len(sample), 1000 * rebuilding_time / len(sample)
+            )
+        )
+
+        if rebuilt != cached[: len(sample)]:
+            self.stderr.write("The results differ from rebuilding the pipeline")
+        else:
+            self.stdout.write(
+                "Same results, {:.0f}x faster".format(
+                    (rebuilding_time / len(sample)) / (cached_time / len(documents))
+                )
+            )
@@ -0,0 +1,167 @@
+import random
+import re
+import time
+from typing import List
+
+from django.core.management.base import BaseCommand
+
+from mainapp.functions.document_parsing import PersonMatcher
+from mainapp.models import Person
+
+given_names = [
+    "Anna",
+    "Bernd",
+    "Claudia",
+    "Dieter",
+    "Elke",
+    "Frank",
+    "Gisela",
+    "Hans",
+    "Ingrid",
+    "Jürgen",
+    "Karin",
+    "Lothar",
+    "Monika",
+    "Norbert",
+    "Petra",
+    "Rüdiger",
+    "Sabine",
+    "Thomas",
+    "Ursula",
+    "Werner",
+]
+
+syllables = [
+    "ber",
+    "mann",
+    "schmidt",
+    "hof",
+    "mül",
+    "ler",
+    "wag",
+    "ner",
+    "bach",
+    "stein",
+]
+
+filler_words = (
+    "Der Stadtrat beschließt die Vorlage zur Sanierung der Grundschule sowie den "
+    "Haushalt für das kommende Jahr und verweist den Antrag an den Ausschuss"
+).split()
+
+
+def extract_persons_per_person(persons: List[Person], text: str) -> List[Person]:
+    """ The previous implementation, which runs three regexes per person, for comparison """
+    found_persons = []
+    text = " " + text + " "
+
+    def match(name_parts):
+        escaped_parts = []
+        for part in name_parts:
+            escaped_parts.append(re.escape(part))
+        matcher = r"[^\w]" + r"[\s,]+".join(escaped_parts) + r"[^\w]"
+        return re.search(matcher, text, re.I | re.S | re.U | re.MULTILINE)
+
+    for person in persons:
+        match_name = match([person.name])
+        match_names = match([person.given_name, person.family_name])
+        match_names_reverse = match([person.family_name, person.given_name])
+        if match_name or match_names or match_names_reverse:
+            found_persons.append(person)
+
+    return found_persons
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the person extraction against the previous per-person implementation "
+        "on a synthetic corpus. Nothing is written to the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--persons", type=int, default=5000)
+        parser.add_argument("--documents", type=int, default=10000)
+        parser.add_argument(
+            "--words", type=int, default=1000, help="Words per document"
+        )
+        parser.add_argument(
+            "--per-person-documents",
+            type=int,
+            default=100,
+            help="The previous implementation is slow, so it only runs on the first n documents",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def generate_persons(self, rng: random.Random, count: int) -> List[Person]:
+        persons = []
+        for _ in range(count):
+            given_name = rng.choice(given_names)
+            family_name = "".join(rng.sample(syllables, 3)).capitalize()
+            persons.append(
+                Person(
+                    name=given_name + " " + family_name,
+                    given_name=given_name,
+                    family_name=family_name,
+                )
+            )
+        return persons
+
+    def generate_document(
+        self, rng: random.Random, persons: List[Person], words: int
+    ) -> str:
+        document = [rng.choice(filler_words) for _ in range(words)]
+        for _ in range(rng.randint(0, 5)):
+            person = rng.choice(persons)
+            mention = rng.choice(
+                [person.name, person.family_name + ", " + person.given_name]
+            )
+            document.insert(rng.randrange(len(document) + 1), mention)
+        return " ".join(document)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        persons = self.generate_persons(rng, options["persons"])
+        documents = [
+            self.generate_document(rng, persons, options["words"])
+            for _ in range(options["documents"])
+        ]
+        self.stdout.write(
+            "{} persons, {} documents with {} words each".format(
+                len(persons), len(documents), options["words"]
+            )
+        )
+
+        start = time.perf_counter()
+        matcher = PersonMatcher(persons)
+        build_time = time.perf_counter() - start
+        self.stdout.write("Building the matcher: {:.3f}s".format(build_time))
+
+        start = time.perf_counter()
+        matched = [matcher.match(document) for document in documents]
+        matcher_time = time.perf_counter() - start
+        self.stdout.write(
+            "Matcher: {:.3f}s total, {:.3f}ms per document".format(
+                matcher_time, 1000 * matcher_time / len(documents)
+            )
+        )
+
+        sample = documents[: options["per_person_documents"]]
+        start = time.perf_counter()
+        expected = [
+            extract_persons_per_person(persons, document) for document in sample
+        ]
+        per_person_time = time.perf_counter() - start
+        self.stdout.write(
+            "Per person regexes: {:.3f}s for {} documents, {:.3f}ms per document".format(
+                per_person_time, len(sample), 1000 * per_person_time / len(sample)
+            )
+        )
+
+        if expected != matched[: len(sample)]:
+            self.stderr.write("The results differ from the previous implementation")
+        else:
+            self.stdout.write(
+                "Same results, {:.0f}x faster".format(
+                    (per_person_time / len(sample)) / (matcher_time / len(documents))
+                )
+            )
@@ -0,0 +1,107 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction, connection
+
+from importer.functions import get_importer
+from importer.oparl_helper import default_options
+from importer.oparl_stub_server import OParlStubServer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the wall time of a full import from a local oparl stub server with simulated latency "
+        "for different numbers of prefetching threads and batch sizes. All changes to the database are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            nargs="+",
+            default=[0, 1, 4, 8, 16],
+            help="The numbers of prefetching threads to compare, 0 loads everything serially",
+        )
+        parser.add_argument(
+            "--batchsize",
+            type=int,
+            nargs="+",
+            default=[1],
+            help="The batch sizes to compare, 1 saves every object on its own",
+        )
+        parser.add_argument("--papers", type=int, default=200)
+        parser.add_argument("--persons", type=int, default=50)
+        parser.add_argument("--organizations", type=int, default=10)
+        parser.add_argument("--meetings", type=int, default=50)
+        parser.add_argument("--page-size", dest="page_size", type=int, default=20)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.05,
+            help="Delay of every response in seconds",
+        )
+
+    def handle(self, *args, **options):
+        stub_server = OParlStubServer(
+            papers=options["papers"],
+            persons=options["persons"],
+            organizations=options["organizations"],
+            meetings=options["meetings"],
+            page_size=options["page_size"],
+            latency=options["latency"],
+        )
+
+        with stub_server:
+            for batchsize in options["batchsize"]:
+                for concurrency in options["concurrency"]:
+                    self.run_import(stub_server, concurrency, batchsize)
+
+    def run_import(
+        self, stub_server: OParlStubServer, concurrency: int, batchsize: int
+    ):
+        import_options = default_options.copy()
+        import_options.update(
+            {
+                "entrypoint": stub_server.entrypoint,
+                "use_cache": False,
+                "download_files": False,
+                "no_threads": True,
+                "batchsize": batchsize,
+                "prefetch_workers": concurrency,
+                "max_requests_per_host": max(concurrency, 1),
+            }
+        )
+
+        queries = []
+
+        def count_queries(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        stub_server.request_count = 0
+        start = time.perf_counter()
+        try:
+            with transaction.atomic(), connection.execute_wrapper(count_queries):
+                importer = get_importer(import_options)
+                importer.run_singlethread()
+                raise Rollback()
+        except Rollback:
+            pass
+        duration = time.perf_counter() - start
+
+        self.stdout.write(
+            "Batch size {:>3}, {:>3} prefetching threads: {:.3f}s, {} requests, {} queries, "
+            "{} lookups from the identity map and {} from the database".format(
+                batchsize,
+                concurrency,
+                duration,
+                stub_server.request_count,
+                len(queries),
+                sum(importer.identity_map.hits.values()),
+                sum(importer.identity_map.queries.values()),
+            )
+        )
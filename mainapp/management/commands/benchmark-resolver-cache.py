@@ -0,0 +1,84 @@
+import json
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+from django.core.management.base import BaseCommand
+
+from importer.oparl_stub_server import OParlStubServer
+from importer.resolver_cache import (
+    MinioResolverCache,
+    SQLiteResolverCache,
+    ResolverCache,
+)
+from mainapp.functions.minio import minio_client, minio_cache_bucket
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the cache hits per second of the oparl resolver with the minio and the local backend, "
+        "using list pages of a stub server as responses"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backend",
+            nargs="+",
+            default=["minio", "local"],
+            choices=["minio", "local"],
+        )
+        parser.add_argument("--responses", type=int, default=500)
+        parser.add_argument("--page-size", dest="page_size", type=int, default=20)
+
+    def handle(self, *args, **options):
+        stub_server = OParlStubServer(
+            papers=options["responses"] * options["page_size"],
+            page_size=options["page_size"],
+        )
+        stub_server.server.server_close()
+
+        responses = []
+        for page in range(1, options["responses"] + 1):
+            data = stub_server.get_list_page("/body/0/papers", page)
+            url = stub_server.url + "/body/0/papers?page={}".format(page)
+            responses.append((url, json.dumps(data).encode()))
+        size = sum(len(data) for _, data in responses)
+        self.stdout.write(
+            "{} responses with {:.1f}MB".format(len(responses), size / 1024 / 1024)
+        )
+
+        for backend in options["backend"]:
+            if backend == "minio":
+                self.benchmark(backend, MinioResolverCache(), responses)
+                for url, _ in responses:
+                    minio_client.remove_object(
+                        minio_cache_bucket, MinioResolverCache.get_object_name(url)
+                    )
+            else:
+                with tempfile.TemporaryDirectory() as directory:
+                    cache = SQLiteResolverCache(
+                        os.path.join(directory, "oparl.sqlite3"), 2 * size
+                    )
+                    self.benchmark(backend, cache, responses)
+                    cache.close()
+
+    def benchmark(self, backend: str, cache: ResolverCache, responses: List[tuple]):
+        start = time.perf_counter()
+        for url, data in responses:
+            cache.set(url, data, '"etag"')
+        write_duration = time.perf_counter() - start
+
+        urls = [url for url, _ in responses]
+        random.shuffle(urls)
+        start = time.perf_counter()
+        for url in urls:
+            assert cache.get(url) is not None
+        read_duration = time.perf_counter() - start
+
+        self.stdout.write(
+            "{:>5}: {:.0f} writes/s, {:.0f} hits/s".format(
+                backend, len(urls) / write_duration, len(urls) / read_duration
+            )
+        )
@@ -0,0 +1,226 @@
+import json
+import subprocess
+import time
+from collections import OrderedDict
+from io import StringIO
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction, connection
+from django.test import override_settings
+
+from importer.functions import get_importer
+from importer.oparl_helper import default_options
+from importer.oparl_stub_server import OParlStubServer
+from mainapp.models import UserAlert, UserProfile
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the import, the incremental import, the file rebuilds, the search index rebuild and the user "
+        "notifications against a local oparl stub server and records the wall time, the sql queries and the "
+        "requests of each step. All changes to the database are rolled back, but the search index keeps "
+        "the benchmark data until it is rebuilt."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bodies", type=int, default=1)
+        parser.add_argument("--papers", type=int, default=200)
+        parser.add_argument("--persons", type=int, default=50)
+        parser.add_argument("--organizations", type=int, default=10)
+        parser.add_argument("--meetings", type=int, default=50)
+        parser.add_argument("--agenda-items", dest="agenda_items", type=int, default=3)
+        parser.add_argument("--page-size", dest="page_size", type=int, default=20)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.0,
+            help="Delay of every response in seconds",
+        )
+        parser.add_argument(
+            "--no-download-files",
+            dest="download_files",
+            action="store_false",
+            help="Don't download the files, which otherwise needs minio",
+        )
+        parser.add_argument(
+            "--users", type=int, default=10, help="Users with a search alert"
+        )
+        parser.add_argument("--output", help="Writes the results as json")
+        parser.add_argument(
+            "--compare", help="A json file of a previous run to compare against"
+        )
+
+    def handle(self, *args, **options):
+        self.stub_server = OParlStubServer(
+            bodies=options["bodies"],
+            papers=options["papers"],
+            persons=options["persons"],
+            organizations=options["organizations"],
+            meetings=options["meetings"],
+            agenda_items=options["agenda_items"],
+            page_size=options["page_size"],
+            latency=options["latency"],
+            pdf_files=True,
+        )
+        self.steps = OrderedDict()  # type: Dict[str, Dict[str, Any]]
+
+        import_options = default_options.copy()
+        import_options.update(
+            {
+                "entrypoint": self.stub_server.entrypoint,
+                "use_cache": False,
+                "download_files": options["download_files"],
+                # Everything has to run in the transaction that is rolled back
+                "no_threads": True,
+            }
+        )
+
+        email_backend = "django.core.mail.backends.locmem.EmailBackend"
+        with self.stub_server, override_settings(EMAIL_BACKEND=email_backend):
+            try:
+                with transaction.atomic():
+                    self.create_users(options["users"])
+                    self.run_steps(import_options)
+                    raise Rollback()
+            except Rollback:
+                pass
+
+        results = OrderedDict(
+            [
+                ("commit", self.get_commit()),
+                (
+                    "parameters",
+                    OrderedDict(
+                        (key, options[key])
+                        for key in [
+                            "bodies",
+                            "papers",
+                            "persons",
+                            "organizations",
+                            "meetings",
+                            "agenda_items",
+                            "page_size",
+                            "latency",
+                            "download_files",
+                            "users",
+                        ]
+                    ),
+                ),
+                ("steps", self.steps),
+            ]
+        )
+
+        previous = None
+        if options["compare"]:
+            with open(options["compare"]) as fp:
+                previous = json.load(fp)
+        self.print_results(results, previous)
+
+        if options["output"]:
+            with open(options["output"], "w") as fp:
+                json.dump(results, fp, indent=2)
+
+    def run_steps(self, import_options: dict):
+        quiet = {"stdout": StringIO()}
+
+        self.measure("import", lambda: get_importer(import_options).run_singlethread())
+        self.measure(
+            "incremental_import", lambda: get_importer(import_options).run_incremental()
+        )
+        self.measure(
+            "rebuild_file_locations",
+            lambda: call_command("rebuild-file-locations", all=True, **quiet),
+        )
+        self.measure(
+            "rebuild_file_persons", lambda: call_command("rebuild-file-persons")
+        )
+        if settings.ELASTICSEARCH_ENABLED:
+            self.measure(
+                "search_index",
+                lambda: call_command("search_index", "--rebuild", "-f", **quiet),
+            )
+            self.measure("notifyusers", lambda: call_command("notifyusers", **quiet))
+        else:
+            self.steps["search_index"] = OrderedDict([("skipped", True)])
+            self.steps["notifyusers"] = OrderedDict([("skipped", True)])
+
+    def measure(self, name: str, step: Callable[[], None]):
+        self.stdout.write("Running {}".format(name))
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        self.stub_server.request_count = 0
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            step()
+        duration = time.perf_counter() - start
+
+        self.steps[name] = OrderedDict(
+            [
+                ("time", round(duration, 3)),
+                ("queries", queries[0]),
+                ("requests", self.stub_server.request_count),
+            ]
+        )
+
+    @staticmethod
+    def create_users(count: int):
+        for i in range(count):
+            user = User.objects.create(
+                username="benchmark-{}".format(i),
+                email="benchmark-{}@example.org".format(i),
+            )
+            UserProfile.objects.create(user=user)
+            alert = UserAlert(user=user)
+            alert.set_search_params({"searchterm": "Antrag {}".format(i)})
+            alert.save()
+
+    @staticmethod
+    def get_commit() -> Optional[str]:
+        try:
+            return (
+                subprocess.check_output(
+                    ["git", "rev-parse", "HEAD"],
+                    cwd=settings.BASE_DIR,
+                    stderr=subprocess.DEVNULL,
+                )
+                .decode()
+                .strip()
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def print_results(self, results: dict, previous: Optional[dict]):
+        self.stdout.write("Commit {}".format(results["commit"]))
+        if previous:
+            self.stdout.write("Compared against {}".format(previous.get("commit")))
+            if previous.get("parameters") != results["parameters"]:
+                self.stdout.write(
+                    self.style.WARNING("The parameters of the runs differ")
+                )
+
+        for name, step in results["steps"].items():
+            if step.get("skipped"):
+                self.stdout.write("{:<24} skipped".format(name))
+                continue
+            line = "{:<24} {:>8.3f}s {:>7} queries {:>6} requests".format(
+                name, step["time"], step["queries"], step["requests"]
+            )
+            before = (previous or {}).get("steps", {}).get(name)
+            if before and not before.get("skipped") and before["time"] > 0:
+                line += " ({:+.0%} time, {:+d} queries)".format(
+                    step["time"] / before["time"] - 1,
+                    step["queries"] - before["queries"],
+                )
+            self.stdout.write(line)
@@ -6,6 +6,7 @@ from django.core.management.base import BaseCommand
 
 from importer.functions import get_importer
 from importer.oparl_helper import default_options
+from importer.profiling import profile_import
 from mainapp.functions.minio import minio_client, minio_cache_bucket
 from .notifyusers import Command as NotifyUsersCommand
 
@@ -15,14 +16,30 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = "To be called daily by a cron job. Updates the oparl dataset and sends notifications to users"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Load all objects instead of only those modified since the last sync",
+        )
+        parser.add_argument(
+            "--profile",
+            help="Write a json report with the time, the sql queries and the bytes fetched per stage to this file",
+        )
+        parser.add_argument(
+            "--cprofile", help="Write a pstats dump of the main thread to this file"
+        )
+
     def handle(self, *args, **options):
-        options = default_options.copy()
-        options["use_cache"] = False
-        importer = get_importer(options)
+        full = options["full"]
+        with profile_import(options["profile"], options["cprofile"]):
+            import_options = default_options.copy()
+            import_options["use_cache"] = False
+            importer = get_importer(import_options)
 
-        importer.run_singlethread()
+            importer.run_incremental(full)
 
-        notification_options = {"override_since": None, "debug": False}
+        notification_options = {"override_since": None, "debug": False, "workers": 4}
         NotifyUsersCommand(stdout=self.stdout, stderr=self.stderr).handle(
             **notification_options
         )
@@ -26,20 +26,27 @@ class Command(ImportOParlCommand):
         for body in bodies:
             if options["list"] == "paper":
                 importer.list_batched(
-                    self.get_with_cutoff(body.get_paper, cutoff), importer.paper
+                    self.get_with_cutoff(body.get_paper, cutoff),
+                    importer.paper,
+                    importer.paper_batch,
                 )
             elif options["list"] == "person":
                 importer.list_batched(
-                    self.get_with_cutoff(body.get_person, cutoff), importer.person
+                    self.get_with_cutoff(body.get_person, cutoff),
+                    importer.person,
+                    importer.person_batch,
                 )
             elif options["list"] == "organization":
                 importer.list_batched(
                     self.get_with_cutoff(body.get_organization, cutoff),
                     importer.organization,
+                    importer.organization_batch,
                 )
             elif options["list"] == "meeting":
                 importer.list_batched(
-                    self.get_with_cutoff(body.get_meeting, cutoff), importer.meeting
+                    self.get_with_cutoff(body.get_meeting, cutoff),
+                    importer.meeting,
+                    importer.meeting_batch,
                 )
             else:
                 raise ValueError("Invalid list " + options["list"])
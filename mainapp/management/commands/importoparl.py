@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 
 from importer.functions import get_importer
+from importer.profiling import profile_import
 
 
 class Command(BaseCommand):
@@ -29,8 +30,64 @@ class Command(BaseCommand):
             "--no-threads", dest="no_threads", action="store_true", help="Debug option"
         )
         parser.add_argument("--batchsize", type=int)
+        parser.add_argument(
+            "--timeout", type=int, help="Timeout for the http requests in seconds"
+        )
+        parser.add_argument(
+            "--prefetch-workers",
+            dest="prefetch_workers",
+            type=int,
+            help="Number of threads loading the next pages and referenced objects in advance, 0 to disable",
+        )
+        parser.add_argument(
+            "--max-requests-per-host", dest="max_requests_per_host", type=int
+        )
+        parser.add_argument(
+            "--extraction-workers",
+            dest="extraction_workers",
+            type=int,
+            help="Number of processes extracting the text of the files, defaults to the number of cpus",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            help="Import the lists in shards of pages with a pool of processes instead of threads",
+        )
+        parser.add_argument(
+            "--pages-per-shard",
+            dest="pages_per_shard",
+            type=int,
+            help="Number of list pages imported by one process at a time with --processes",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue the last import with --processes where it was interrupted",
+        )
+        parser.add_argument(
+            "--pipeline",
+            action="store_true",
+            help="Import the lists page by page, with separate threads for parsing, saving and downloading",
+        )
+        parser.add_argument("--parse-workers", dest="parse_workers", type=int)
+        parser.add_argument("--persist-workers", dest="persist_workers", type=int)
+        parser.add_argument("--download-workers", dest="download_workers", type=int)
+        parser.add_argument(
+            "--queue-size",
+            dest="queue_size",
+            type=int,
+            help="Number of pages waiting between two stages of the pipeline",
+        )
+        parser.add_argument(
+            "--profile",
+            help="Write a json report with the time, the sql queries and the bytes fetched per stage to this file",
+        )
+        parser.add_argument(
+            "--cprofile", help="Write a pstats dump of the main thread to this file"
+        )
         parser.set_defaults(**default_options)
 
     def handle(self, *args, **options):
-        importer = get_importer(options)
-        importer.run()
+        with profile_import(options["profile"], options["cprofile"]):
+            importer = get_importer(options)
+            importer.run()
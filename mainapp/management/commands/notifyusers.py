@@ -1,4 +1,7 @@
 import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 
 from django.conf import settings
 from django.contrib.auth.models import User
@@ -9,30 +12,78 @@ from django.utils.translation import ugettext as _
 from html2text import html2text
 
 from mainapp.functions.mail import send_mail
-from mainapp.functions.search_tools import MainappSearch, parse_hit
+from mainapp.functions.search_tools import (
+    MainappSearch,
+    parse_hit,
+    execute_multi_search,
+    params_to_search_string,
+    NotificationSearchResult,
+)
 from mainapp.functions.search_notification_tools import search_result_for_notification
-from mainapp.models import UserAlert
+from mainapp.models import UserAlert, UserAlertMatch
 
 
 class Command(BaseCommand):
     help = "Notifies users about new search results"
 
-    def perform_search(self, alert: UserAlert, override_since=None):
-        if override_since is not None:
-            since = override_since
-        else:
-            if alert.last_match is not None:
-                since = alert.last_match
+    # The number of searches sent with one _msearch request
+    batch_size = 100
+
+    def search_alerts(
+        self, alerts: List[UserAlert], override_since: Optional[datetime.datetime]
+    ) -> Dict[int, List[NotificationSearchResult]]:
+        """
+        Runs every distinct search only once, no matter how many users have subscribed to it, and returns the
+        results by alert id
+        """
+        default_since = timezone.now() - datetime.timedelta(days=14)
+
+        searches = OrderedDict()  # type: Dict[str, Dict[str, str]]
+        alert_searches = {}  # type: Dict[int, str]
+        for alert in alerts:
+            if override_since is not None:
+                since = override_since
             else:
-                since = timezone.now() - datetime.timedelta(days=14)
-
-        params = alert.get_search_params()
-        params["after"] = str(since)
-        mainapp_search = MainappSearch(params)
-
-        executed = mainapp_search.execute()
-        results = [parse_hit(hit) for hit in executed.hits]
+                since = alert.last_match or default_since
+
+            params = alert.get_search_params()
+            params["after"] = str(since)
+            search_string = params_to_search_string(params)
+            searches.setdefault(search_string, params)
+            alert_searches[alert.id] = search_string
+
+        search_strings = list(searches.keys())
+        responses = execute_multi_search(
+            [MainappSearch(searches[i], aggregations=False) for i in search_strings],
+            self.batch_size,
+        )
+        results = {}
+        for search_string, response in zip(search_strings, responses):
+            results[search_string] = [
+                search_result_for_notification(parse_hit(hit)) for hit in response.hits
+            ]
+
+        return {
+            alert_id: results[search_string]
+            for alert_id, search_string in alert_searches.items()
+        }
 
+    def pending_matches(
+        self, alerts: List[UserAlert], until: datetime.datetime
+    ) -> Dict[int, List[NotificationSearchResult]]:
+        """ The documents the percolator matched with the alerts since the last run, by alert id """
+        results = {alert.id: [] for alert in alerts}
+        matches = UserAlertMatch.objects.filter(
+            alert__in=alerts, created__lte=until
+        ).order_by("created", "id")
+        for match in matches:
+            result = {
+                "type": match.document_type,
+                "id": match.document_id,
+                "name": match.title,
+                "highlight": match.highlight,
+            }
+            results[match.alert_id].append(search_result_for_notification(result))
         return results
 
     def send_mail(self, to, message_text, message_html, pgp_key_fingerprint):
@@ -40,34 +91,26 @@ class Command(BaseCommand):
             to, _("New search results"), message_text, message_html, pgp_key_fingerprint
         )
 
-    def notify_user(self, user: User, override_since: datetime, debug: bool):
+    def notify_user(self, user: User, alerts: List[dict], debug: bool) -> bool:
+        """ Renders and sends the mail with the results of the alerts. Returns whether there were any """
         context = {
             "base_url": settings.ABSOLUTE_URI_BASE,
             "site_name": settings.TEMPLATE_META["logo_name"],
-            "alerts": [],
+            "alerts": alerts,
             "email": user.email,
         }
 
-        for alert in user.useralert_set.all():
-            notifyobjects = self.perform_search(alert, override_since)
-            for obj in notifyobjects:
-                search_result_for_notification(obj)
-
-            if len(notifyobjects) > 0:
-                results = []
-                for obj in notifyobjects:
-                    results.append(search_result_for_notification(obj))
-                context["alerts"].append({"title": str(alert), "results": results})
-
         if debug:
             self.stdout.write(
                 "User %s: %i results\n" % (user.email, len(context["alerts"]))
             )
 
         if len(context["alerts"]) == 0:
-            return
+            return False
 
-        message_html = get_template("email/user-alert.html").render(context)
+        # The language is set per thread
+        with translation.override(settings.LANGUAGE_CODE):
+            message_html = get_template("email/user-alert.html").render(context)
         message_html = message_html.replace("&lt;mark&gt;", "<mark>").replace(
             "&lt;/mark&gt;", "</mark>"
         )
@@ -79,25 +122,65 @@ class Command(BaseCommand):
             self.stdout.write("Sending notification to: %s" % user.email)
             self.send_mail(user.email, message_text, message_html, user.profile)
 
-        if not override_since:
-            for alert in user.useralert_set.all():
-                alert.last_match = timezone.now()
-                alert.save()
+        return True
 
     def add_arguments(self, parser):
         parser.add_argument("--override-since", type=str)
         parser.add_argument("--debug", action="store_true")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="The number of threads rendering and sending the mails",
+        )
 
     def handle(self, *args, **options):
-        from django.conf import settings
-
         translation.activate(settings.LANGUAGE_CODE)
 
         override_since = options["override_since"]
         if override_since is not None:
             override_since = datetime.datetime.strptime(override_since, "%Y-%m-%d")
 
-        users = User.objects.all()
+        # All alerts get the same last match, so they can share the searches of the next run
+        now = timezone.now()
+        users = list(
+            User.objects.filter(is_active=True)
+            .select_related("profile")
+            .prefetch_related("useralert_set")
+        )
+        all_alerts = [alert for user in users for alert in user.useralert_set.all()]
+        # Overriding the date range needs the searches
+        percolated = settings.ELASTICSEARCH_PERCOLATE_ALERTS and not override_since
+        if percolated:
+            results = self.pending_matches(all_alerts, now)
+        else:
+            results = self.search_alerts(all_alerts, override_since)
+
+        titles = {}  # type: Dict[str, str]
+        user_alerts = []
         for user in users:
-            if user.is_active:
-                self.notify_user(user, override_since, options["debug"])
+            alerts = []
+            for alert in user.useralert_set.all():
+                if len(results[alert.id]) > 0:
+                    if alert.search_string not in titles:
+                        titles[alert.search_string] = str(alert)
+                    alerts.append(
+                        {
+                            "title": titles[alert.search_string],
+                            "results": results[alert.id],
+                        }
+                    )
+            user_alerts.append((user, alerts))
+
+        with ThreadPoolExecutor(max(options["workers"], 1)) as executor:
+            notified = executor.map(
+                lambda i: self.notify_user(i[0], i[1], options["debug"]), user_alerts
+            )
+            notified_users = [
+                user for (user, alerts), sent in zip(user_alerts, notified) if sent
+            ]
+
+        if not override_since:
+            UserAlert.objects.filter(user__in=notified_users).update(last_match=now)
+        if percolated:
+            UserAlertMatch.objects.filter(created__lte=now).delete()
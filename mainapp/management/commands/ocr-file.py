@@ -1,18 +1,18 @@
+import hashlib
 import logging
+from tempfile import NamedTemporaryFile
 
-import os
-
-from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db.models import Q
 
 from mainapp.functions.document_parsing import (
-    get_ocr_text_from_pdf,
     extract_persons,
     cleanup_extracted_text,
     extract_locations,
+    get_extraction_version,
 )
 from mainapp.functions.minio import minio_client, minio_file_bucket
+from mainapp.functions.ocr import OCRPipeline
 from mainapp.models import File
 
 
@@ -27,31 +27,71 @@ class Command(BaseCommand):
             action="store_true",
             help="OCR all files with empty parsed_text",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Number of pages that are recognized at the same time",
+        )
 
-    def parse_file(self, file: File):
+    def parse_file(self, pipeline: OCRPipeline, file: File):
         logging.info("- Parsing: " + str(file.id) + " (" + file.name + ")")
-        with minio_client.get_object(minio_file_bucket, str(file.id)) as file_handle:
-            recognized_text = get_ocr_text_from_pdf(file_handle.read())
-        if len(recognized_text) > 0:
-            file.parsed_text = cleanup_extracted_text(recognized_text)
-            file.mentioned_persons = extract_persons(
-                file.name + "\n" + (recognized_text or "") + "\n"
+        with NamedTemporaryFile(suffix=".pdf") as tmpfile:
+            sha256 = hashlib.sha256()
+            data = minio_client.get_object(minio_file_bucket, file.get_storage_name())
+            for chunk in iter(lambda: data.read(64 * 1024), b""):
+                tmpfile.write(chunk)
+                sha256.update(chunk)
+            data.close()
+            tmpfile.flush()
+
+            recognized_text = pipeline.recognize(tmpfile.name, sha256.hexdigest())
+
+        if len(recognized_text) == 0:
+            logging.warning("Nothing recognized")
+            return
+
+        parsed_text = cleanup_extracted_text(recognized_text)
+        locations = extract_locations(parsed_text)
+        text_persons = extract_persons("\n" + parsed_text + "\n")
+
+        if file.blob:
+            # The text is shared by all files with the same content
+            blob = file.blob
+            blob.parsed_text = parsed_text
+            blob.extracted = True
+            blob.ocr = True
+            blob.locations.set(locations)
+            blob.mentioned_persons.set(text_persons)
+            blob.extraction_version = get_extraction_version()
+            blob.save()
+            same_content = list(blob.file_set.all())
+        else:
+            same_content = [file]
+
+        for file in same_content:
+            file.parsed_text = parsed_text
+            file.locations.set(locations)
+            file.mentioned_persons.set(
+                set(text_persons) | set(extract_persons(file.name))
             )
-            file.locations.set(extract_locations(file.parsed_text))
             file.save()
-        else:
-            logging.warning("Nothing recognized")
 
     def handle(self, *args, **options):
+        pipeline = OCRPipeline(workers=options["workers"])
         if options["all_empty"]:
             all_files = File.objects.filter(
                 Q(parsed_text="") | Q(parsed_text__isnull=True)
             ).all()
+            recognized_blobs = set()
             for file in all_files:
+                # Recognized together with a file with the same content
+                if file.blob_id and file.blob_id in recognized_blobs:
+                    continue
+                recognized_blobs.add(file.blob_id)
                 try:
-                    self.parse_file(file)
+                    self.parse_file(pipeline, file)
                 except Exception as e:
                     logging.error("Error parsing file {}: {}".format(str(file.id), e))
         elif options["id"]:
             file = File.objects.get(id=options["id"])
-            self.parse_file(file)
+            self.parse_file(pipeline, file)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from mainapp.functions.alert_percolator import rebuild_alert_index
+from mainapp.models import UserAlert
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreates the index with the percolator queries of all alerts. Needed before enabling "
+        "ELASTICSEARCH_PERCOLATE_ALERTS and after changes to the mappings of the documents"
+    )
+
+    def handle(self, *args, **options):
+        rebuild_alert_index()
+        count = UserAlert.objects.values("search_string").distinct().count()
+        self.stdout.write("Registered {} alert searches".format(count))
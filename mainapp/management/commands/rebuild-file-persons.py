@@ -16,9 +16,8 @@ class Command(BaseCommand):
 
     def parse_file(self, file: File):
         logging.info("- Parsing: " + str(file.id) + " (" + file.name + ")")
-        file.mentioned_persons = extract_persons(
-            file.name + "\n" + (file.parsed_text or "") + "\n"
-        )
+        persons = extract_persons(file.name + "\n" + (file.parsed_text or "") + "\n")
+        file.mentioned_persons.set(persons)
         file.save()
 
     def handle(self, *args, **options):
@@ -0,0 +1,181 @@
+import shutil
+import time
+from collections import OrderedDict
+from concurrent.futures import wait, FIRST_COMPLETED
+from tempfile import NamedTemporaryFile
+from typing import Dict, List, Optional
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from mainapp.functions.document_parsing import (
+    extract_locations,
+    extract_persons,
+    get_extraction_version,
+)
+from mainapp.functions.extraction import ExtractionPool, extractable_mime_types
+from mainapp.functions.minio import minio_client, minio_file_bucket
+from mainapp.models import File
+
+
+class Command(BaseCommand):
+    help = (
+        "Extracts the text and the page count of the stored files again, in parallel worker processes. "
+        "Reports the progress and the throughput in pages per second. The text recognized by ocr-file is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--id", type=int, nargs="*", help="Extract only the given files"
+        )
+        parser.add_argument(
+            "--empty",
+            dest="only_empty",
+            action="store_true",
+            help="Extract only the files with empty parsed_text",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Number of worker processes, defaults to the number of cpus",
+        )
+        parser.add_argument(
+            "--benchmark",
+            action="store_true",
+            help="Only measure the throughput, don't write the results to the database",
+        )
+
+    def handle(self, *args, **options):
+        files = (
+            File.objects.filter(mime_type__in=extractable_mime_types, filesize__gt=0)
+            .exclude(blob__ocr=True)
+            .select_related("blob")
+            .order_by("id")
+        )
+        if options["id"]:
+            files = files.filter(id__in=options["id"])
+        if options["only_empty"]:
+            files = files.filter(Q(parsed_text="") | Q(parsed_text__isnull=True))
+
+        # Files with the same content are only extracted once
+        by_storage_name = OrderedDict()  # type: Dict[str, List[File]]
+        for file in files:
+            by_storage_name.setdefault(file.get_storage_name(), []).append(file)
+
+        pool = ExtractionPool(options["workers"])
+        self.stdout.write(
+            "Extracting {} files with {} workers".format(
+                len(by_storage_name), pool.workers
+            )
+        )
+
+        self.total = len(by_storage_name)
+        self.done = 0
+        self.pages = 0
+        self.start = time.perf_counter()
+
+        # The main thread fetches the next files from minio while the workers extract the queued ones,
+        # but only a few files are queued at a time so the temporary files don't fill up the disk
+        max_queued = 2 * max(pool.workers, 1)
+        queued = {}
+        try:
+            for storage_name, same_content in by_storage_name.items():
+                if len(queued) >= max_queued:
+                    finished, _ = wait(queued, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        self.finish(future, queued.pop(future), options["benchmark"])
+
+                tmpfile = NamedTemporaryFile()
+                data = minio_client.get_object(minio_file_bucket, storage_name)
+                shutil.copyfileobj(data, tmpfile)
+                data.close()
+                tmpfile.flush()
+                mime_type = same_content[0].mime_type
+                queued[pool.submit(tmpfile.name, mime_type)] = (tmpfile, same_content)
+
+            for future in list(queued):
+                self.finish(future, queued.pop(future), options["benchmark"])
+        finally:
+            pool.close()
+            for tmpfile, _ in queued.values():
+                tmpfile.close()
+
+        self.report()
+
+    def finish(self, future, queued, benchmark: bool):
+        tmpfile, same_content = queued
+        try:
+            parsed_text, page_count = future.result()
+        except Exception as e:
+            self.stderr.write(
+                "Error extracting file {}: {}".format(same_content[0].id, e)
+            )
+            return
+        finally:
+            tmpfile.close()
+            self.done += 1
+
+        self.pages += page_count or 0
+        if not benchmark:
+            self.update_files(same_content, parsed_text, page_count)
+
+        if self.done % 100 == 0:
+            self.report()
+
+    def update_files(
+        self,
+        same_content: List[File],
+        parsed_text: Optional[str],
+        page_count: Optional[int],
+    ):
+        # All files with the same storage name share the blob (if any)
+        blob = same_content[0].blob
+        if not (parsed_text or "").strip():
+            # Scanned documents have no text layer, so this would replace the text recognized by ocr-file
+            same_content = [file for file in same_content if not file.parsed_text]
+            if blob and blob.parsed_text:
+                blob = None
+        changed = [file for file in same_content if file.parsed_text != parsed_text]
+        version = get_extraction_version()
+        blob_changed = blob and (
+            not blob.extracted
+            or blob.parsed_text != parsed_text
+            or blob.extraction_version != version
+        )
+
+        if changed or blob_changed:
+            # Those are derived from the text
+            locations = extract_locations(parsed_text)
+            text_persons = extract_persons("\n" + (parsed_text or "") + "\n")
+
+        if blob:
+            if blob_changed:
+                blob.locations.set(locations)
+                blob.mentioned_persons.set(text_persons)
+                blob.extraction_version = version
+            blob.extracted = True
+            blob.parsed_text = parsed_text
+            blob.page_count = page_count
+            blob.save()
+
+        for file in same_content:
+            if file in changed:
+                file.locations.set(locations)
+                file.mentioned_persons.set(
+                    set(text_persons) | set(extract_persons(file.name))
+                )
+            file.parsed_text = parsed_text
+            file.page_count = page_count
+            file.save()
+
+    def report(self):
+        duration = time.perf_counter() - self.start
+        self.stdout.write(
+            "{}/{} files, {} pages in {:.1f}s: {:.1f} pages/s".format(
+                self.done,
+                self.total,
+                self.pages,
+                duration,
+                self.pages / duration if duration else 0,
+            )
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from mainapp.functions.search_tools import get_search_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Shows the hits and misses of the search result cache, which is only used when SEARCH_CACHE_URL is set"
+
+    def handle(self, *args, **options):
+        stats = get_search_cache_stats()
+        total = stats["hits"] + stats["misses"]
+        self.stdout.write(
+            "{} hits, {} misses, {:.0%} hit rate".format(
+                stats["hits"], stats["misses"], stats["hits"] / total if total else 0
+            )
+        )
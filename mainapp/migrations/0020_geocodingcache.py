@@ -0,0 +1,23 @@
+# Generated by Django 2.1.4 on 2026-10-17 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0019_auto_20181227_1534'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodingCache',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('query', models.TextField()),
+                ('result', models.TextField(blank=True, null=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.1.4 on 2026-10-17 03:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0020_geocodingcache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('size', models.IntegerField()),
+                ('mime_type', models.CharField(max_length=255)),
+                ('extracted', models.BooleanField(default=False)),
+                ('parsed_text', models.TextField(blank=True, null=True)),
+                ('page_count', models.IntegerField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('locations', models.ManyToManyField(blank=True, to='mainapp.Location')),
+                ('mentioned_persons', models.ManyToManyField(blank=True, to='mainapp.Person')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='mainapp.FileBlob'),
+        ),
+        migrations.AddField(
+            model_name='historicalfile',
+            name='blob',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='mainapp.FileBlob'),
+        ),
+    ]
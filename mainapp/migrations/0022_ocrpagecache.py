@@ -0,0 +1,26 @@
+# Generated by Django 2.1.4 on 2026-10-17 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0021_fileblob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OCRPageCache',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('page', models.IntegerField()),
+                ('text', models.TextField()),
+                ('modified', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('sha256', 'page')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 2.1.4 on 2026-10-17 03:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0022_ocrpagecache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('list_name', models.CharField(max_length=20)),
+                ('modified', models.DateTimeField()),
+                ('body', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mainapp.Body')),
+            ],
+            options={
+                'unique_together': {('body', 'list_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.1.4 on 2026-10-17 04:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0023_syncwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJournal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entrypoint', models.CharField(max_length=255, unique=True)),
+                ('started', models.DateTimeField(auto_now_add=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('failures', models.TextField(default='[]')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('list_name', models.CharField(max_length=20)),
+                ('first_page', models.TextField()),
+                ('queues', models.TextField(default='{}')),
+                ('failures', models.TextField(default='[]')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='mainapp.ImportJournal')),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.1.4 on 2026-10-17 06:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0025_oparl_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAlertMatch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_type', models.CharField(max_length=20)),
+                ('document_id', models.IntegerField()),
+                ('title', models.TextField()),
+                ('highlight', models.TextField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('alert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mainapp.UserAlert')),
+            ],
+            options={
+                'unique_together': {('alert', 'document_type', 'document_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.1.4 on 2026-10-17 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0026_user_alert_match'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='source_etag',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='source_last_modified',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='historicalfile',
+            name='source_etag',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='historicalfile',
+            name='source_last_modified',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.4 on 2026-10-17 08:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0027_file_source_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileblob',
+            name='extraction_version',
+            field=models.CharField(blank=True, max_length=150, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.4 on 2026-10-17 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0028_file_blob_extraction_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileblob',
+            name='ocr',
+            field=models.BooleanField(default=False),
+        ),
+    ]
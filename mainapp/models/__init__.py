@@ -3,9 +3,14 @@ from .body import Body
 from .consultation import Consultation
 from .default_fields import DefaultFields
 from .file import File
+from .file_blob import FileBlob
+from .geocoding_cache import GeocodingCache
+from .import_checkpoint import ImportCheckpoint
+from .import_journal import ImportJournal
 from .legislative_term import LegislativeTerm
 from .location import Location
 from .meeting import Meeting
+from .ocr_page_cache import OCRPageCache
 from .organization import Organization
 from .organization_membership import OrganizationMembership
 from .organization_type import OrganizationType
@@ -14,5 +19,7 @@ from .paper_type import PaperType
 from .person import Person
 from .search_poi import SearchPoi
 from .search_street import SearchStreet
+from .sync_watermark import SyncWatermark
 from .user_alert import UserAlert
+from .user_alert_match import UserAlertMatch
 from .user_profile import UserProfile
@@ -35,6 +35,8 @@ class DefaultFields(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
     deleted = models.BooleanField(default=False, db_index=True)
+    # The hash of the oparl json the object was imported from, so unchanged objects can be skipped
+    oparl_fingerprint = models.CharField(max_length=64, null=True, blank=True)
 
     objects = SoftDeleteModelManager()
     objects_with_deleted = SoftDeleteModelManagerWithDeleted()
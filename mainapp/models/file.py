@@ -2,6 +2,7 @@ from django.db import models
 from django.urls import reverse
 
 from .default_fields import DefaultFields
+from .file_blob import FileBlob
 from .location import Location
 from .person import Person
 
@@ -25,6 +26,11 @@ class File(DefaultFields):
     # Store these values for we might need them for a proxy
     oparl_access_url = models.CharField(max_length=512, null=True, blank=True)
     oparl_download_url = models.CharField(max_length=512, null=True, blank=True)
+    # The validators of the source server for conditional downloads, which belong to the url of this file
+    source_etag = models.CharField(max_length=255, null=True, blank=True)
+    source_last_modified = models.CharField(max_length=64, null=True, blank=True)
+    # Files with the same content share the stored object and the extraction results
+    blob = models.ForeignKey(FileBlob, null=True, blank=True, on_delete=models.SET_NULL)
 
     def __str__(self):
         return self.displayed_filename
@@ -46,6 +52,12 @@ class File(DefaultFields):
     def person_ids(self):
         return [person.id for person in self.mentioned_persons.all()]
 
+    def get_storage_name(self) -> str:
+        """ The object in the files bucket, which is named by its content or by the id for older files """
+        if self.blob_id:
+            return self.blob.sha256
+        return str(self.id)
+
     def get_default_link(self):
         return reverse("file", args=[self.id])
 
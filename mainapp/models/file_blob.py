@@ -0,0 +1,32 @@
+from django.db import models
+
+from .location import Location
+from .person import Person
+
+
+class FileBlob(models.Model):
+    """
+    The content of one or more files, which is stored in minio under its sha256 only once.
+
+    The results of the extraction only depend on the content, so they are kept here and reused for every
+    file with the same content. The locations and persons also depend on the streets and persons, so they
+    are extracted again when those changed.
+    """
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.IntegerField()
+    mime_type = models.CharField(max_length=255)
+    # Set once text, page count, locations and persons have been extracted, as an empty text is a valid result
+    extracted = models.BooleanField(default=False)
+    parsed_text = models.TextField(null=True, blank=True)
+    page_count = models.IntegerField(null=True, blank=True)
+    locations = models.ManyToManyField(Location, blank=True)
+    mentioned_persons = models.ManyToManyField(Person, blank=True)
+    # The text was recognized by ocr-file, which reextract-files mustn't replace with the (empty) extracted text
+    ocr = models.BooleanField(default=False)
+    # get_extraction_version() when the locations and persons were extracted
+    extraction_version = models.CharField(max_length=150, null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class GeocodingCache(models.Model):
+    """ Results of the geocoder, so the same address or coordinates are only looked up once """
+
+    # sha256 of the normalized query, as the query itself might be too long for an unique index
+    key = models.CharField(max_length=64, unique=True)
+    query = models.TextField()
+    # json encoded, null if the geocoder found nothing
+    result = models.TextField(null=True, blank=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.query
@@ -0,0 +1,23 @@
+from django.db import models
+
+from .import_journal import ImportJournal
+
+
+class ImportCheckpoint(models.Model):
+    """ A shard of an import that was imported completely, with what couldn't be finished yet """
+
+    journal = models.ForeignKey(
+        ImportJournal, on_delete=models.CASCADE, related_name="checkpoints"
+    )
+    # paper, person, organization or meeting
+    list_name = models.CharField(max_length=20)
+    # The url of the first page of the shard, which identifies it
+    first_page = models.TextField()
+    # json encoded queues for add_missing_associations, see OParlObjects.export_queues
+    queues = models.TextField(default="{}")
+    # json encoded list of [oparl id or null, error]
+    failures = models.TextField(default="[]")
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return "{}: {}".format(self.list_name, self.first_page)
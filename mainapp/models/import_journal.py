@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class ImportJournal(models.Model):
+    """ The progress of the sharded import of an oparl api, so an interrupted import can be resumed """
+
+    entrypoint = models.CharField(max_length=255, unique=True)
+    started = models.DateTimeField(auto_now_add=True)
+    # Null while the import is running or if it was interrupted
+    finished = models.DateTimeField(null=True, blank=True)
+    # json encoded list of [oparl id, error] of the objects that failed even after the retries
+    failures = models.TextField(default="[]")
+
+    def __str__(self):
+        return self.entrypoint
@@ -0,0 +1,17 @@
+from django.db import models
+
+
+class OCRPageCache(models.Model):
+    """ The recognized text of every page, so an interrupted ocr run doesn't pay for the same page twice """
+
+    # The sha256 of the content of the file, so files with the same content share the results
+    sha256 = models.CharField(max_length=64)
+    page = models.IntegerField()
+    text = models.TextField()
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("sha256", "page")
+
+    def __str__(self):
+        return "{} page {}".format(self.sha256, self.page)
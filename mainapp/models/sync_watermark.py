@@ -0,0 +1,19 @@
+from django.db import models
+
+from .body import Body
+
+
+class SyncWatermark(models.Model):
+    """ When a list of a body was last imported completely, so the next sync only loads what changed since """
+
+    body = models.ForeignKey(Body, on_delete=models.CASCADE)
+    # paper, person, organization or meeting
+    list_name = models.CharField(max_length=20)
+    # The start of the last successful sync
+    modified = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("body", "list_name")
+
+    def __str__(self):
+        return "{} {}: {}".format(self.body, self.list_name, self.modified)
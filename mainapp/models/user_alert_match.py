@@ -0,0 +1,21 @@
+from django.db import models
+
+from .user_alert import UserAlert
+
+
+class UserAlertMatch(models.Model):
+    """ A document that matched the percolator query of an alert and wasn't sent yet """
+
+    alert = models.ForeignKey(UserAlert, on_delete=models.CASCADE)
+    # file, meeting or paper
+    document_type = models.CharField(max_length=20)
+    document_id = models.IntegerField()
+    title = models.TextField()
+    highlight = models.TextField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("alert", "document_type", "document_id")
+
+    def __str__(self):
+        return "{} {}: {}".format(self.document_type, self.document_id, self.alert)
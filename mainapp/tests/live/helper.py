@@ -75,12 +75,15 @@ class MockMainappSearchEndlessScroll(MainappSearch):
     """ The execute method is injected in the test for the endless scroll"""
 
     def execute(self):
+        search = self._s.to_dict()
+        if "search_after" in search:
+            start = search["search_after"][0] + 1
+        else:
+            start = search["from"]
         out = []
-        for position in range(
-            self._s.to_dict()["from"],
-            self._s.to_dict()["from"] + self._s.to_dict()["size"],
-        ):
+        for position in range(start, start + search["size"]):
             result = template.copy()
+            result["sort"] = [position, "file_document#" + str(position)]
             result["highlight"] = {"name": ["<mark>" + str(position) + "</mark>"]}
             result["fields"]["name"] = str(position)
             result["fields"]["name_escaped"] = str(position)
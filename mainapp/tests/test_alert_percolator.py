@@ -0,0 +1,135 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from elasticsearch_dsl import Search
+from elasticsearch_dsl.response import Response
+
+from mainapp.functions.alert_percolator import get_alert_query, percolate
+from mainapp.functions.search_tools import MULTI_MATCH_FIELDS
+from mainapp.models import Paper, UserAlert, UserAlertMatch, UserProfile
+
+
+def percolate_response(search_strings):
+    hits = [
+        {
+            "_index": "meine_stadt_transparent_documents_alerts",
+            "_type": "alert_query",
+            "_id": str(i),
+            "_score": 1.0,
+            "_source": {"search_string": search_string},
+            "highlight": {"type": ["<mark>Bill</mark> & more"]},
+        }
+        for i, search_string in enumerate(search_strings)
+    ]
+    return Response(Search(), {"hits": {"total": len(hits), "hits": hits}})
+
+
+class TestAlertPercolator(TestCase):
+    fixtures = ["initdata"]
+
+    def setUp(self):
+        self.user = User.objects.create(
+            username="test@example.org", email="test@example.org"
+        )
+        UserProfile.objects.create(user=self.user)
+        self.alert = UserAlert.objects.create(user=self.user, search_string="bill")
+
+    def test_alert_query(self):
+        query = get_alert_query("document-type:file,paper bill")
+        self.assertEqual(
+            query,
+            {
+                "bool": {
+                    "must": [
+                        {
+                            "multi_match": {
+                                "query": "bill",
+                                "operator": "and",
+                                "fields": MULTI_MATCH_FIELDS,
+                                "fuzziness": "1",
+                                "prefix_length": 1,
+                            }
+                        }
+                    ],
+                    "filter": [
+                        {"terms": {"_type": ["file_document", "paper_document"]}}
+                    ],
+                }
+            },
+        )
+        self.assertEqual(get_alert_query(""), {"match_all": {}})
+
+    @override_settings(ELASTICSEARCH_ENABLED=True, ELASTICSEARCH_PERCOLATE_ALERTS=True)
+    def test_percolate(self):
+        from mainapp.documents import PaperDocument
+
+        papers = list(Paper.objects.filter(id__in=[1, 2]).order_by("id"))
+        # A pending match of an earlier version that doesn't match anymore
+        UserAlertMatch.objects.create(
+            alert=self.alert, document_type="paper", document_id=2, title="Old"
+        )
+
+        with mock.patch(
+            "mainapp.functions.alert_percolator.get_percolated_documents",
+            return_value=[PaperDocument],
+        ), mock.patch(
+            "elasticsearch_dsl.MultiSearch.execute",
+            return_value=[
+                percolate_response(["bill", "unknown"]),
+                percolate_response([]),
+            ],
+        ):
+            percolate(Paper, papers)
+
+        matches = list(UserAlertMatch.objects.all())
+        self.assertEqual(len(matches), 1)
+        self.assertEqual(matches[0].alert, self.alert)
+        self.assertEqual(matches[0].document_id, 1)
+        self.assertEqual(matches[0].title, "Bill for Education")
+        self.assertEqual(matches[0].highlight, "<mark>Bill</mark> &amp; more")
+
+    @override_settings(ELASTICSEARCH_ENABLED=True, ELASTICSEARCH_PERCOLATE_ALERTS=True)
+    def test_percolate_duplicates(self):
+        from mainapp.documents import PaperDocument
+
+        paper = Paper.objects.get(id=1)
+        with mock.patch(
+            "mainapp.functions.alert_percolator.get_percolated_documents",
+            return_value=[PaperDocument],
+        ), mock.patch(
+            "elasticsearch_dsl.MultiSearch.execute",
+            return_value=[percolate_response(["bill"])],
+        ) as execute:
+            percolate(Paper, [paper, Paper.objects.get(id=1)])
+
+        self.assertEqual(execute.call_count, 1)
+        match = UserAlertMatch.objects.get()
+        self.assertEqual((match.alert, match.document_id), (self.alert, 1))
+
+    @override_settings(ELASTICSEARCH_PERCOLATE_ALERTS=True)
+    @mock.patch("mainapp.management.commands.notifyusers.Command.send_mail")
+    @mock.patch("mainapp.management.commands.notifyusers.execute_multi_search")
+    def test_notify_pending_matches(self, execute_multi_search, send_mail_function):
+        UserAlertMatch.objects.create(
+            alert=self.alert,
+            document_type="paper",
+            document_id=1,
+            title="Bill for Education",
+            highlight="<mark>Bill</mark> for Education",
+        )
+
+        call_command("notifyusers", stdout=StringIO())
+
+        execute_multi_search.assert_not_called()
+        self.assertEqual(send_mail_function.call_count, 1)
+        self.assertTrue("Bill for Education" in send_mail_function.call_args[0][1])
+        self.assertFalse(UserAlertMatch.objects.exists())
+        self.alert.refresh_from_db()
+        self.assertIsNotNone(self.alert.last_match)
+
+        # Nothing new since then
+        call_command("notifyusers", stdout=StringIO())
+        self.assertEqual(send_mail_function.call_count, 1)
@@ -0,0 +1,86 @@
+import hashlib
+import tracemalloc
+from unittest import mock
+
+import requests
+from django.test import TestCase
+
+from importer.download import (
+    get_conditional_headers,
+    get_stored_object,
+    store_blob,
+    stream_download,
+    upload_download,
+)
+from importer.oparl_stub_server import OParlStubServer, file_header
+from mainapp.models import File
+from mainapp.tests.tools import MinioMock
+
+
+class TestDownload(TestCase):
+    def setUp(self):
+        self.stub_server = OParlStubServer(papers=1, file_size=8 * 1024 * 1024)
+        self.stub_server.start()
+        self.addCleanup(self.stub_server.stop)
+        self.url = self.stub_server.url + "/file/0.pdf"
+        self.session = requests.Session()
+
+        self.minio_mock = MinioMock()
+        patcher = mock.patch("importer.download.minio_client", self.minio_mock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_size_and_hash(self):
+        download = stream_download(self.session, self.url)
+        expected = file_header + b"0" * self.stub_server.file_size
+        self.assertEqual(download.size, len(expected))
+        self.assertEqual(download.sha256, hashlib.sha256(expected).hexdigest())
+        with open(download.name, "rb") as f:
+            self.assertEqual(f.read(), expected)
+        download.close()
+
+    def test_flat_memory(self):
+        tracemalloc.start()
+        try:
+            download = stream_download(self.session, self.url)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        download.close()
+        # The file has 8MB
+        self.assertLess(peak, 1024 * 1024)
+
+    def test_conditional(self):
+        self.assertIsNone(get_stored_object("files", "1"))
+
+        download = stream_download(self.session, self.url)
+        upload_download(download, "files", "1", "application/pdf")
+        download.close()
+
+        stored = get_stored_object("files", "1")
+        self.assertEqual(stored.size, download.size)
+        file = File(
+            source_etag=download.etag, source_last_modified=download.last_modified
+        )
+        headers = get_conditional_headers(file)
+        self.assertEqual(headers["If-None-Match"], download.etag)
+        self.assertIsNone(stream_download(self.session, self.url, headers))
+
+        self.stub_server.file_size += 1
+        self.assertIsNotNone(stream_download(self.session, self.url, headers))
+
+    def test_deduplication(self):
+        self.stub_server.file_size = 1024
+        blobs = []
+        for _ in range(2):
+            download = stream_download(self.session, self.url)
+            blobs.append(store_blob(download, "files", "application/pdf"))
+            download.close()
+
+        self.assertEqual(blobs[0].id, blobs[1].id)
+        self.assertEqual(list(self.minio_mock.storage["files"]), [download.sha256])
+
+        file = File(name="file", filesize=download.size, blob=blobs[0])
+        self.assertEqual(file.get_storage_name(), download.sha256)
+        # Another file with the same content has never been downloaded from its own url
+        self.assertEqual(get_conditional_headers(file), {})
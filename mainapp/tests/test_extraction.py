@@ -0,0 +1,132 @@
+from importlib import import_module
+from io import BytesIO, StringIO
+from tempfile import NamedTemporaryFile
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from mainapp.functions.document_parsing import get_extraction_version
+from mainapp.functions.extraction import ExtractionPool
+from mainapp.models import File, FileBlob, Person
+from mainapp.tests.tools import MinioMock
+
+
+class TestExtraction(TestCase):
+    def test_pool(self):
+        for workers in [0, 2]:
+            pool = ExtractionPool(workers)
+            with NamedTemporaryFile(mode="w", suffix=".txt") as tmpfile:
+                tmpfile.write("Some text")
+                tmpfile.flush()
+                self.assertEqual(
+                    pool.extract(tmpfile.name, "text/text"), ("Some text", None)
+                )
+                self.assertEqual(pool.extract(tmpfile.name, "image/png"), (None, None))
+            pool.close()
+
+    def test_reextract_files(self):
+        minio_mock = MinioMock()
+        blob = FileBlob.objects.create(sha256="a" * 64, size=9, mime_type="text/text")
+        minio_mock.put_object("files", blob.sha256, BytesIO(b"Same text"), 9)
+
+        for i in range(2):
+            File.objects.create(
+                name="File {}".format(i), filesize=9, mime_type="text/text", blob=blob
+            )
+        single = File.objects.create(name="File 3", filesize=10, mime_type="text/text")
+        minio_mock.put_object("files", str(single.id), BytesIO(b"Other text"), 10)
+
+        out = StringIO()
+        command = import_module("mainapp.management.commands.reextract-files")
+        with mock.patch.object(
+            command, "minio_file_bucket", "files"
+        ), mock.patch.object(command, "minio_client", minio_mock):
+            call_command("reextract-files", workers=2, stdout=out)
+
+        self.assertIn("Extracting 2 files with 2 workers", out.getvalue())
+        self.assertIn("2/2 files", out.getvalue())
+        self.assertEqual(
+            list(File.objects.order_by("id").values_list("parsed_text", flat=True)),
+            ["Same text", "Same text", "Other text"],
+        )
+        blob.refresh_from_db()
+        self.assertTrue(blob.extracted)
+        self.assertEqual(blob.parsed_text, "Same text")
+        self.assertEqual(blob.extraction_version, get_extraction_version())
+
+    def test_reextract_keeps_ocr(self):
+        """ pdftotext finds no text in scanned documents, so the recognized text is kept """
+        minio_mock = MinioMock()
+        ocr_blob = FileBlob.objects.create(
+            sha256="b" * 64,
+            size=9,
+            mime_type="text/text",
+            extracted=True,
+            parsed_text="Recognized",
+            ocr=True,
+        )
+        ocr_file = File.objects.create(
+            name="Scan",
+            filesize=9,
+            mime_type="text/text",
+            blob=ocr_blob,
+            parsed_text="Recognized",
+        )
+        # Recognized before the text was stored in the blob
+        single = File.objects.create(
+            name="Old scan", filesize=1, mime_type="text/text", parsed_text="Recognized"
+        )
+        minio_mock.put_object("files", str(single.id), BytesIO(b" "), 1)
+
+        command = import_module("mainapp.management.commands.reextract-files")
+        with mock.patch.object(
+            command, "minio_file_bucket", "files"
+        ), mock.patch.object(command, "minio_client", minio_mock):
+            call_command("reextract-files", workers=0, stdout=StringIO())
+
+        ocr_file.refresh_from_db()
+        single.refresh_from_db()
+        self.assertEqual(ocr_file.parsed_text, "Recognized")
+        self.assertEqual(single.parsed_text, "Recognized")
+
+    def test_ocr_file(self):
+        minio_mock = MinioMock()
+        blob = FileBlob.objects.create(sha256="c" * 64, size=4, mime_type="text/text")
+        minio_mock.put_object("files", blob.sha256, BytesIO(b"Scan"), 4)
+        files = [
+            File.objects.create(
+                name="Scan {}".format(i), filesize=4, mime_type="text/text", blob=blob
+            )
+            for i in range(2)
+        ]
+
+        command = import_module("mainapp.management.commands.ocr-file")
+        with mock.patch.object(
+            command, "minio_file_bucket", "files"
+        ), mock.patch.object(command, "minio_client", minio_mock), mock.patch.object(
+            command.OCRPipeline, "recognize", return_value="Recognized text"
+        ) as recognize:
+            call_command("ocr-file", all_empty=True, workers=1)
+
+        self.assertEqual(recognize.call_count, 1)
+        blob.refresh_from_db()
+        self.assertTrue(blob.extracted)
+        self.assertTrue(blob.ocr)
+        self.assertEqual(blob.parsed_text, "Recognized text")
+        for file in files:
+            file.refresh_from_db()
+            self.assertEqual(file.parsed_text, "Recognized text")
+
+    def test_extraction_version(self):
+        """ The persons and locations of a blob are extracted again after a person changed """
+        version = get_extraction_version()
+        self.assertEqual(get_extraction_version(), version)
+        person = Person.objects.create(
+            name="Max Mustermann", given_name="Max", family_name="Mustermann"
+        )
+        changed = get_extraction_version()
+        self.assertNotEqual(changed, version)
+        person.name = "Erika Mustermann"
+        person.save()
+        self.assertNotEqual(get_extraction_version(), changed)
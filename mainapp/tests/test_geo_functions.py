@@ -0,0 +1,97 @@
+from collections import namedtuple
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from mainapp.functions.geo_functions import geocode, geocode_many, latlng_to_address
+from mainapp.models import GeocodingCache
+
+ResponseMock = namedtuple("ResponseMock", "latitude longitude")
+
+
+# noinspection PyUnusedLocal
+class StubGeocoder:
+    """ Counts the lookups and knows exactly one address """
+
+    def __init__(self):
+        self.calls = 0
+
+    def geocode(self, search_str, language, exactly_one):
+        self.calls += 1
+        if search_str.startswith("Tel-Aviv-Straße"):
+            return [ResponseMock(latitude=50.9315404, longitude=6.9541377)]
+        return None
+
+    def reverse(self, query):
+        self.calls += 1
+        if query.startswith("50.93"):
+            return ["Tel-Aviv-Straße, Köln, Deutschland"]
+        return []
+
+
+class TestGeoFunctions(TestCase):
+    def setUp(self):
+        self.geocoder = StubGeocoder()
+        patcher = mock.patch(
+            "mainapp.functions.geo_functions.get_geolocator", return_value=self.geocoder
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_geocode_cached(self):
+        expected = {"lat": 50.9315404, "lng": 6.9541377}
+        self.assertEqual(geocode("Tel-Aviv-Straße, Köln"), expected)
+        # Only case and whitespace differ
+        self.assertEqual(geocode(" tel-aviv-straße,  Köln"), expected)
+        self.assertEqual(self.geocoder.calls, 1)
+
+    def test_not_found_cached(self):
+        self.assertIsNone(geocode("Wolfsweg, Köln"))
+        self.assertIsNone(geocode("Wolfsweg, Köln"))
+        self.assertEqual(self.geocoder.calls, 1)
+
+        # Not found results expire earlier than found ones
+        GeocodingCache.objects.update(modified=self.days_ago(8))
+        self.assertIsNone(geocode("Wolfsweg, Köln"))
+        self.assertEqual(self.geocoder.calls, 2)
+
+    def test_expired(self):
+        geocode("Tel-Aviv-Straße, Köln")
+        GeocodingCache.objects.update(modified=self.days_ago(8))
+        geocode("Tel-Aviv-Straße, Köln")
+        self.assertEqual(self.geocoder.calls, 1)
+
+        GeocodingCache.objects.update(modified=self.days_ago(91))
+        geocode("Tel-Aviv-Straße, Köln")
+        self.assertEqual(self.geocoder.calls, 2)
+        self.assertEqual(GeocodingCache.objects.count(), 1)
+
+    def test_geocode_many(self):
+        geocode("Wolfsweg, Köln")
+        results = geocode_many(
+            [
+                "Tel-Aviv-Straße, Köln",
+                "Wolfsweg, Köln",
+                "Bärenweg, Köln",
+                "TEL-AVIV-STRASSE,  Köln",
+            ]
+        )
+        self.assertEqual(results["Tel-Aviv-Straße, Köln"]["lat"], 50.9315404)
+        self.assertIsNone(results["Wolfsweg, Köln"])
+        self.assertIsNone(results["Bärenweg, Köln"])
+        self.assertEqual(results["TEL-AVIV-STRASSE,  Köln"]["lat"], 50.9315404)
+        # Wolfsweg was cached before and Tel-Aviv-Straße is only looked up once
+        self.assertEqual(self.geocoder.calls, 3)
+
+    def test_latlng_to_address(self):
+        self.assertEqual(latlng_to_address(50.9315404, 6.9541377), "Tel-Aviv-Straße")
+        self.assertEqual(latlng_to_address("50.931540", "6.954138"), "Tel-Aviv-Straße")
+        self.assertEqual(latlng_to_address(10.5, 20.5), "10.5, 20.5")
+        self.assertEqual(latlng_to_address(10.5, 20.5), "10.5, 20.5")
+        self.assertEqual(self.geocoder.calls, 2)
+
+    @staticmethod
+    def days_ago(days):
+        return timezone.now() - timedelta(days=days)
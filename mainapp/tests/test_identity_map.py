@@ -0,0 +1,57 @@
+from django.test import TestCase
+
+from importer.bulk import bulk_save
+from importer.identity_map import IdentityMap
+from mainapp.models import Person
+
+
+class TestIdentityMap(TestCase):
+    def create_person(self, number, deleted=False):
+        return Person.objects.create(
+            oparl_id="https://oparl.example.org/person/{}".format(number),
+            name="Person {}".format(number),
+            given_name="Person",
+            family_name=str(number),
+            deleted=deleted,
+        )
+
+    def test_lookups(self):
+        existing = self.create_person(1)
+        deleted = self.create_person(2, deleted=True)
+
+        identity_map = IdentityMap()
+        with self.assertNumQueries(1):
+            self.assertEqual(identity_map.get(Person, existing.oparl_id), existing.id)
+            self.assertIsNone(identity_map.get(Person, deleted.oparl_id))
+            self.assertEqual(
+                identity_map.get(Person, deleted.oparl_id, with_deleted=True),
+                deleted.id,
+            )
+        self.assertEqual(identity_map.hits["Person"], 3)
+
+        # Saved objects are added through the signal
+        created = self.create_person(3)
+        deleted.deleted = False
+        deleted.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(identity_map.get(Person, created.oparl_id), created.id)
+            self.assertEqual(identity_map.get(Person, deleted.oparl_id), deleted.id)
+
+        # Unknown ids might have been imported by another process
+        with self.assertNumQueries(1):
+            self.assertIsNone(identity_map.get(Person, "https://oparl.example.org/x"))
+        self.assertEqual(identity_map.queries["Person"], 1)
+
+    def test_bulk_saved(self):
+        identity_map = IdentityMap()
+        identity_map.preload(Person)
+        person = Person(
+            oparl_id="https://oparl.example.org/person/1",
+            name="Person 1",
+            given_name="Person",
+            family_name="1",
+        )
+        bulk_save(Person, [person], [])
+        identity_map.add([person])
+        with self.assertNumQueries(0):
+            self.assertEqual(identity_map.get(Person, person.oparl_id), person.id)
@@ -6,11 +6,14 @@ import shutil
 import tempfile
 from importlib.util import find_spec
 from io import BytesIO
+from typing import List
 from unittest import skipIf
 from unittest.mock import patch
 
 from dateutil.relativedelta import relativedelta
-from django.test import TestCase
+from django.db import connection
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
 from django.utils import timezone
 
 from importer.functions import normalize_body_name
@@ -27,7 +30,12 @@ from mainapp.models import (
     Consultation,
     Location,
     File,
+    SyncWatermark,
+    ImportCheckpoint,
+    UserAlert,
+    UserAlertMatch,
 )
+from mainapp.tests.test_alert_percolator import percolate_response
 from mainapp.tests.tools import MinioMock
 
 gi_not_available = find_spec("gi") is None
@@ -36,6 +44,8 @@ if not gi_not_available:
     from importer.oparl_helper import default_options
     from importer.oparl_import import OParlImport
     from importer.oparl_resolve import OParlResolver
+    from importer.oparl_stub_server import OParlStubServer
+    from importer.resolver_cache import MinioResolverCache
 
 logger = logging.getLogger(__name__)
 
@@ -71,7 +81,7 @@ class TestImporter(TestCase):
         super().setUpClass()
         cls.tempdir = tempfile.mkdtemp()
         cls.options = cls.build_options()
-        cls.resolver = OParlResolver(cls.entrypoint, True)
+        cls.resolver = OParlResolver(cls.entrypoint, True, cache=MinioResolverCache())
         cls.minio_mock = MinioMock()
 
     @classmethod
@@ -143,20 +153,31 @@ class TestImporter(TestCase):
         self.dump(membership["id"], membership)
 
     def test_importer(self):
-        with patch("importer.oparl_resolve.minio_client", self.minio_mock):
+        with patch("importer.resolver_cache.minio_client", self.minio_mock):
             self.check_basic_import()
             self.check_ignoring_unmodified()
             self.check_update()
             self.check_deletion()
 
     def test_deletion(self):
-        with patch("importer.oparl_resolve.minio_client", self.minio_mock):
+        with patch("importer.resolver_cache.minio_client", self.minio_mock):
             self.check_deletion()
 
     def test_update(self):
-        with patch("importer.oparl_resolve.minio_client", self.minio_mock):
+        with patch("importer.resolver_cache.minio_client", self.minio_mock):
             self.check_update()
 
+    def test_prefetch_urls(self):
+        paper_list = self.external_list(self.load("Paper.json"))
+        paper_list["links"]["next"] = "https://oparl.example.org/papers?page=2"
+        self.assertEqual(
+            self.resolver.get_prefetch_urls(paper_list),
+            [
+                "https://oparl.example.org/papers?page=2",
+                "https://oparl.example.org/meeting/281",
+            ],
+        )
+
     def test_normalize_body_name(self):
         body = Body()
         body.short_name = "Stadt  Bedburg"
@@ -240,3 +261,314 @@ class TestImporter(TestCase):
         options["batchsize"] = 1
         options["download_files"] = False  # TODO
         return options
+
+
+@skipIf(gi_not_available, "gi is not available")
+class TestIncrementalSync(TestCase):
+    def sync(self, stub_server, full=False):
+        options = default_options.copy()
+        options.update(
+            {
+                "entrypoint": stub_server.entrypoint,
+                "use_cache": False,
+                "download_files": False,
+                "no_threads": True,
+                "prefetch_workers": 0,
+            }
+        )
+        resolver = OParlResolver(
+            stub_server.entrypoint, False, cache=MinioResolverCache()
+        )
+        stub_server.request_count = 0
+        OParlImport(options, resolver).run_incremental(full)
+        return stub_server.request_count
+
+    def test_sync(self):
+        with patch("importer.resolver_cache.minio_client", MinioMock()):
+            with OParlStubServer(
+                papers=20, persons=5, organizations=2, meetings=4
+            ) as stub_server:
+                full_requests = self.sync(stub_server)
+                self.assertEqual(Paper.objects.count(), 20)
+                self.assertEqual(SyncWatermark.objects.count(), 4)
+
+                stub_server.modify("/paper/1", name="Geänderter Antrag")
+                stub_server.delete("/paper/2")
+                incremental_requests = self.sync(stub_server)
+                self.assertLess(incremental_requests, full_requests)
+                self.assertEqual(
+                    Paper.by_oparl_id(stub_server.url + "/paper/1").name,
+                    "Geänderter Antrag",
+                )
+                self.assertEqual(Paper.objects.count(), 19)
+
+                # A full sync loads everything again
+                self.assertGreater(
+                    self.sync(stub_server, full=True), incremental_requests
+                )
+
+
+@skipIf(gi_not_available, "gi is not available")
+class TestShardedImport(TestCase):
+    def test_shards(self):
+        with patch("importer.resolver_cache.minio_client", MinioMock()):
+            with OParlStubServer(
+                papers=25, persons=5, organizations=2, meetings=4, page_size=10
+            ) as stub_server:
+                options = default_options.copy()
+                options.update(
+                    {
+                        "entrypoint": stub_server.entrypoint,
+                        "download_files": False,
+                        "prefetch_workers": 0,
+                        "pages_per_shard": 2,
+                    }
+                )
+                resolver = OParlResolver(
+                    stub_server.entrypoint, True, cache=MinioResolverCache()
+                )
+                importer = OParlImport(options, resolver)
+                bodies = importer.get_bodies()
+                importer.bodies_singlethread(bodies)
+
+                shards = importer.get_shards(bodies)
+                paper_shards = [s for s in shards if s.list_name == "paper"]
+                self.assertEqual([len(s.pages) for s in paper_shards], [2, 1])
+
+                # The second shard only has the last page with 5 papers
+                importer.import_shard(paper_shards[1])
+                self.assertEqual(Paper.objects.count(), 5)
+                importer.import_shard(paper_shards[0])
+                self.assertEqual(Paper.objects.count(), 25)
+
+                # The persons don't exist yet, so the participants are queued
+                meeting_shard = [s for s in shards if s.list_name == "meeting"][0]
+                importer.import_shard(meeting_shard)
+                self.assertEqual(len(importer.meeting_person_queue), 4)
+
+                # The queues of two workers survive the way to the main process
+                queues = json.loads(json.dumps(importer.export_queues()))
+                merged = OParlImport(options, resolver)
+                merged.merge_queues(queues)
+                merged.merge_queues(queues)
+                self.assertEqual(len(merged.meeting_person_queue), 4)
+                for meeting_id, person_ids in merged.meeting_person_queue.items():
+                    self.assertEqual(
+                        person_ids, 2 * importer.meeting_person_queue[meeting_id]
+                    )
+
+    def test_merged_consultation_foreign_keys(self):
+        """ A consultation waiting for both its paper and its meeting must get both """
+        with patch("importer.resolver_cache.minio_client", MinioMock()):
+            with OParlStubServer(papers=2, persons=2, meetings=2) as stub_server:
+                options = default_options.copy()
+                options.update(
+                    {
+                        "entrypoint": stub_server.entrypoint,
+                        "download_files": False,
+                        "prefetch_workers": 0,
+                    }
+                )
+                resolver = OParlResolver(
+                    stub_server.entrypoint, True, cache=MinioResolverCache()
+                )
+                importer = OParlImport(options, resolver)
+                importer.run_singlethread()
+
+                paper = Paper.objects.first()
+                meeting = Meeting.objects.first()
+                consultation = Consultation.objects.create(
+                    oparl_id=stub_server.url + "/consultation/queued"
+                )
+                importer.reset_queues()
+                importer.consultation_paper_queue.append((consultation, paper.oparl_id))
+                importer.consultation_meeting_queue.append(
+                    (consultation, meeting.oparl_id)
+                )
+
+                queues = json.loads(json.dumps(importer.export_queues()))
+                merged = OParlImport(options, resolver)
+                merged.merge_queues(queues)
+                merged.add_missing_associations()
+
+                consultation.refresh_from_db()
+                self.assertEqual(consultation.paper_id, paper.id)
+                self.assertEqual(consultation.meeting_id, meeting.id)
+
+    def test_journal(self):
+        with patch("importer.resolver_cache.minio_client", MinioMock()):
+            with OParlStubServer(papers=5, persons=5) as stub_server:
+                options = default_options.copy()
+                options.update(
+                    {
+                        "entrypoint": stub_server.entrypoint,
+                        "download_files": False,
+                        "prefetch_workers": 0,
+                    }
+                )
+                resolver = OParlResolver(
+                    stub_server.entrypoint, True, cache=MinioResolverCache()
+                )
+                importer = OParlImport(options, resolver)
+                importer.failure_backoff = 0
+
+                journal = importer.get_journal(resume=True)
+                ImportCheckpoint.objects.create(
+                    journal=journal, list_name="paper", first_page="page"
+                )
+                # An interrupted import is continued, a finished one is started again
+                self.assertEqual(importer.get_journal(resume=True), journal)
+                journal.finished = timezone.now()
+                journal.save()
+                self.assertEqual(
+                    importer.get_journal(resume=True).checkpoints.count(), 0
+                )
+
+                importer.errorlist = [
+                    (stub_server.url + "/paper/1", ValueError("Broken"), ""),
+                    "Missing Paper",
+                ]
+                failures = importer.get_failures()
+                self.assertEqual(
+                    failures,
+                    [[stub_server.url + "/paper/1", "Broken"], [None, "Missing Paper"]],
+                )
+
+                failed = importer.retry_failures(
+                    [stub_server.url + "/paper/1", stub_server.url + "/file/0.pdf"]
+                )
+                self.assertEqual(list(failed), [stub_server.url + "/file/0.pdf"])
+                self.assertTrue(
+                    Paper.objects.filter(oparl_id=stub_server.url + "/paper/1").exists()
+                )
+
+
+@skipIf(gi_not_available, "gi is not available")
+class TestFingerprints(TestCase):
+    def run_import(self, stub_server) -> List[str]:
+        """ Returns the queries that changed something """
+        options = default_options.copy()
+        options.update(
+            {
+                "entrypoint": stub_server.entrypoint,
+                "use_cache": False,
+                "download_files": False,
+                "no_threads": True,
+                "prefetch_workers": 0,
+            }
+        )
+        resolver = OParlResolver(
+            stub_server.entrypoint, False, cache=MinioResolverCache()
+        )
+        writes = []
+
+        def count_writes(execute, sql, params, many, context):
+            if sql.split()[0].upper() in ["INSERT", "UPDATE", "DELETE"]:
+                writes.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_writes):
+            OParlImport(options, resolver).run_singlethread()
+        return writes
+
+    def test_unchanged_objects_are_skipped(self):
+        with patch("importer.resolver_cache.minio_client", MinioMock()):
+            with OParlStubServer(
+                papers=10, persons=5, organizations=2, meetings=4
+            ) as stub_server:
+                self.assertNotEqual(self.run_import(stub_server), [])
+                self.assertEqual(self.run_import(stub_server), [])
+
+                # Some servers don't update modified
+                paper = stub_server.objects["/paper/1"]
+                modified = paper["modified"]
+                stub_server.modify("/paper/1", name="Geänderter Antrag")
+                paper["modified"] = modified
+                self.assertNotEqual(self.run_import(stub_server), [])
+                self.assertEqual(
+                    Paper.by_oparl_id(stub_server.url + "/paper/1").name,
+                    "Geänderter Antrag",
+                )
+
+    def test_new_objects_are_written_once(self):
+        """ Setting the associations of a new object in a batch doesn't update it again """
+        with patch("importer.resolver_cache.minio_client", MinioMock()):
+            with OParlStubServer(
+                papers=10, persons=5, organizations=2, meetings=4
+            ) as stub_server:
+                self.run_import(stub_server)
+
+        for model in [Paper, Person, Organization, Meeting]:
+            self.assertNotEqual(model.objects.count(), 0)
+            history_types = model.history.values_list("history_type", flat=True)
+            self.assertEqual(
+                list(history_types), ["+"] * model.objects.count(), model.__name__
+            )
+
+
+@skipIf(gi_not_available, "gi is not available")
+class TestAlertPercolation(TestCase):
+    def run_import(self, stub_server):
+        options = default_options.copy()
+        options.update(
+            {
+                "entrypoint": stub_server.entrypoint,
+                "use_cache": False,
+                "download_files": False,
+                "no_threads": True,
+                "prefetch_workers": 0,
+            }
+        )
+        resolver = OParlResolver(
+            stub_server.entrypoint, False, cache=MinioResolverCache()
+        )
+        OParlImport(options, resolver).run_singlethread()
+
+    @override_settings(ELASTICSEARCH_ENABLED=True, ELASTICSEARCH_PERCOLATE_ALERTS=True)
+    def test_organization_alert(self):
+        """ Papers are percolated by process_object once their organizations are set """
+        from elasticsearch_dsl import MultiSearch
+        from mainapp.documents import PaperDocument
+
+        def percolate_organizations(multi_search):
+            responses = []
+            for search in multi_search:
+                document = search.to_dict()["query"]["percolate"]["document"]
+                organizations = document.get("organization_ids") or []
+                responses.append(
+                    percolate_response(
+                        ["organization:{}".format(i) for i in organizations]
+                    )
+                )
+            return responses
+
+        with patch("importer.resolver_cache.minio_client", MinioMock()), patch(
+            "django_elasticsearch_dsl.DocType.update"
+        ), patch(
+            "mainapp.functions.alert_percolator.get_percolated_documents",
+            side_effect=lambda model: [PaperDocument] if model is Paper else [],
+        ), patch.object(
+            MultiSearch, "execute", autospec=True, side_effect=percolate_organizations
+        ):
+            with OParlStubServer(papers=2, persons=2, organizations=2) as stub_server:
+                self.run_import(stub_server)
+                organization = Organization.by_oparl_id(
+                    stub_server.url + "/organization/0"
+                )
+                user = User.objects.create(username="alert", email="alert@example.org")
+                alert = UserAlert.objects.create(
+                    user=user, search_string="organization:{}".format(organization.id)
+                )
+                self.assertFalse(UserAlertMatch.objects.exists())
+
+                stub_server.modify(
+                    "/paper/0", underDirectionOf=[stub_server.url + "/organization/0"]
+                )
+                self.run_import(stub_server)
+
+                paper = Paper.by_oparl_id(stub_server.url + "/paper/0")
+                match = UserAlertMatch.objects.get()
+                self.assertEqual(match.alert, alert)
+                self.assertEqual(
+                    (match.document_type, match.document_id), ("paper", paper.id)
+                )
@@ -0,0 +1,105 @@
+from django.test import TestCase
+
+from importer.bulk import bulk_save, M2MBatch, sync_m2m
+from mainapp.models import Paper, File, Location
+
+
+class TestImporterBulk(TestCase):
+    def create_papers(self, count):
+        papers = [
+            Paper(
+                oparl_id="https://oparl.example.org/paper/{}".format(i),
+                name="Paper {}".format(i),
+                short_name="Paper {}".format(i),
+                reference_number="{}/2018".format(i),
+            )
+            for i in range(count)
+        ]
+        bulk_save(Paper, papers, [])
+        return papers
+
+    def test_bulk_save(self):
+        papers = self.create_papers(3)
+        for paper in papers:
+            self.assertEqual(Paper.objects.get(id=paper.id).oparl_id, paper.oparl_id)
+            self.assertEqual(paper.history.get().history_type, "+")
+
+        papers[0].name = "Changed"
+        papers[1].deleted = True
+        with self.assertNumQueries(2):
+            bulk_save(Paper, [], papers[:2])
+        self.assertEqual(Paper.objects.get(id=papers[0].id).name, "Changed")
+        self.assertEqual(Paper.objects.get(id=papers[0].id).reference_number, "0/2018")
+        self.assertTrue(Paper.objects_with_deleted.get(id=papers[1].id).deleted)
+        self.assertEqual(Paper.objects.count(), 2)
+        self.assertEqual(papers[0].history.first().history_type, "~")
+        self.assertEqual(papers[0].history.first().name, "Changed")
+        self.assertEqual(papers[2].history.count(), 1)
+
+    def test_bulk_save_without_history(self):
+        paper = Paper(oparl_id="https://oparl.example.org/paper/0", name="Paper")
+        bulk_save(Paper, [paper], [], history=False)
+        paper.name = "Changed"
+        bulk_save(Paper, [], [paper], history=False)
+        self.assertEqual(Paper.objects.get(id=paper.id).name, "Changed")
+        self.assertFalse(paper.history.exists())
+
+    def test_bulk_update_json(self):
+        location = Location(
+            oparl_id="https://oparl.example.org/location/1", is_official=False
+        )
+        bulk_save(Location, [location], [])
+        location.geometry = {"type": "Point", "coordinates": [6.9, 50.9]}
+        bulk_save(Location, [], [location])
+        self.assertEqual(
+            Location.objects.get(id=location.id).geometry["coordinates"], [6.9, 50.9]
+        )
+
+    def test_m2m_batch(self):
+        papers = self.create_papers(2)
+        files = [File.objects.create(name=str(i), filesize=0) for i in range(3)]
+        papers[0].files.set(files[:2])
+
+        with self.assertNumQueries(3):
+            m2m = M2MBatch(Paper, papers)
+        self.assertFalse(m2m.set(papers[0], "files", [files[1].id, files[0].id]))
+        self.assertTrue(m2m.set(papers[1], "files", [files[2].id]))
+        self.assertFalse(m2m.set(papers[0], "organizations", []))
+        with self.assertNumQueries(1):
+            m2m.flush()
+        self.assertEqual(set(papers[0].files.all()), set(files[:2]))
+        self.assertEqual(list(papers[1].files.all()), [files[2]])
+
+        m2m = M2MBatch(Paper, papers)
+        self.assertTrue(m2m.set(papers[0], "files", [files[2].id]))
+        with self.assertNumQueries(2):
+            m2m.flush()
+        self.assertEqual(list(papers[0].files.all()), [files[2]])
+        self.assertEqual(list(papers[1].files.all()), [files[2]])
+
+    def test_m2m_batch_add(self):
+        papers = self.create_papers(1)
+        files = [File.objects.create(name=str(i), filesize=0) for i in range(3)]
+        papers[0].files.set(files[:1])
+
+        m2m = M2MBatch(Paper, papers)
+        self.assertFalse(m2m.add(papers[0], "files", [files[0].id]))
+        self.assertTrue(m2m.add(papers[0], "files", [files[1].id]))
+        self.assertTrue(m2m.add(papers[0], "files", [files[2].id]))
+        with self.assertNumQueries(1):
+            m2m.flush()
+        self.assertEqual(set(papers[0].files.all()), set(files))
+
+    def test_sync_m2m(self):
+        papers = self.create_papers(1)
+        files = [File.objects.create(name=str(i), filesize=0) for i in range(3)]
+        papers[0].files.set(files[:2])
+
+        with self.assertNumQueries(1):
+            self.assertFalse(sync_m2m(papers[0], "files", [files[1].id, files[0].id]))
+        with self.assertNumQueries(3):
+            self.assertTrue(sync_m2m(papers[0], "files", [files[1].id, files[2].id]))
+        self.assertEqual(set(papers[0].files.all()), set(files[1:]))
+        with self.assertNumQueries(2):
+            self.assertTrue(sync_m2m(papers[0], "files", []))
+        self.assertEqual(papers[0].files.count(), 0)
@@ -32,8 +32,10 @@ class TestNotifyUsers(TestCase):
 
     @mock.patch("mainapp.management.commands.notifyusers.Command.send_mail")
     @mock.patch(
-        "mainapp.functions.search_tools.MainappSearch.execute",
-        new=MockMainappSearch.execute,
+        "mainapp.management.commands.notifyusers.execute_multi_search",
+        new=lambda searches, batch_size: [
+            MockMainappSearch.execute(i) for i in searches
+        ],
     )
     def test_notify(self, send_mail_function):
         self._create_user_with_alerts("test@example.org", ["test"])
@@ -49,3 +51,19 @@ class TestNotifyUsers(TestCase):
         )
         self.assertTrue("Unsubscribe" in send_mail_function.call_args[0][1])
         self.assertTrue("Unsubscribe" in send_mail_function.call_args[0][2])
+
+    @mock.patch("mainapp.management.commands.notifyusers.Command.send_mail")
+    @mock.patch("mainapp.management.commands.notifyusers.execute_multi_search")
+    def test_shared_searches(self, execute_multi_search, send_mail_function):
+        execute_multi_search.side_effect = lambda searches, batch_size: [
+            MockMainappSearch.execute(i) for i in searches
+        ]
+        self._create_user_with_alerts("test1@example.org", ["test"])
+        self._create_user_with_alerts("test2@example.org", ["test", "other"])
+
+        call_command("notifyusers", stdout=StringIO(), override_since="2017-01-01")
+
+        # Both users subscribed to "test", so there are only two distinct searches
+        self.assertEqual(execute_multi_search.call_count, 1)
+        self.assertEqual(len(execute_multi_search.call_args[0][0]), 2)
+        self.assertEqual(send_mail_function.call_count, 2)
@@ -0,0 +1,55 @@
+import os
+import threading
+
+from django.test import TransactionTestCase
+
+from mainapp.functions.ocr import OCRBackend, OCRPipeline
+from mainapp.models import OCRPageCache
+
+pdf = "testdata/media/Donald Knuth - The Complexity of Songs.pdf"
+
+
+class StubOCRBackend(OCRBackend):
+    """ Returns the page number, which is passed as image by StubOCRPipeline """
+
+    def __init__(self, fail_on_page=None):
+        self.fail_on_page = fail_on_page
+        self.recognized = []
+        self.lock = threading.Lock()
+
+    def recognize(self, image: bytes) -> str:
+        page = int(image.decode())
+        if page == self.fail_on_page:
+            raise RuntimeError("OCR failed")
+        with self.lock:
+            self.recognized.append(page)
+        return "Page {}\n".format(page)
+
+
+class StubOCRPipeline(OCRPipeline):
+    def rasterize_page(self, path: str, page: int) -> bytes:
+        return str(page).encode()
+
+
+class TestOCR(TransactionTestCase):
+    # The pages are cached from the threads of the pipeline, which use their own database connections
+
+    def test_pages(self):
+        backend = StubOCRBackend()
+        pipeline = StubOCRPipeline(backend, workers=2)
+        text = pipeline.recognize(os.path.abspath(pdf), "a" * 64)
+        self.assertEqual(text, "Page 0\nPage 1\nPage 2\n")
+        self.assertEqual(sorted(backend.recognized), [0, 1, 2])
+
+    def test_resume(self):
+        pipeline = StubOCRPipeline(StubOCRBackend(fail_on_page=1), workers=1)
+        with self.assertRaises(RuntimeError):
+            pipeline.recognize(os.path.abspath(pdf), "a" * 64)
+        self.assertEqual(OCRPageCache.objects.get(page=0).text, "Page 0\n")
+
+        backend = StubOCRBackend()
+        pipeline = StubOCRPipeline(backend, workers=1)
+        text = pipeline.recognize(os.path.abspath(pdf), "a" * 64)
+        self.assertEqual(text, "Page 0\nPage 1\nPage 2\n")
+        # The other pages were cached by the interrupted run
+        self.assertEqual(backend.recognized, [1])
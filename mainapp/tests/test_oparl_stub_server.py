@@ -0,0 +1,61 @@
+import tempfile
+
+import requests
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from importer.oparl_stub_server import OParlStubServer
+from mainapp.functions.document_parsing import get_page_count_from_pdf
+
+
+class TestOParlStubServer(SimpleTestCase):
+    def setUp(self):
+        self.stub_server = OParlStubServer(papers=5, page_size=2)
+        self.stub_server.start()
+        self.addCleanup(self.stub_server.stop)
+        self.papers_url = self.stub_server.url + "/body/0/papers"
+
+    def get_list(self, url, **params):
+        ids = []
+        data = requests.get(url, params=params).json()
+        ids.extend(paper["id"] for paper in data["data"])
+        while "next" in data["links"]:
+            data = requests.get(data["links"]["next"]).json()
+            ids.extend(paper["id"] for paper in data["data"])
+        return ids
+
+    def test_modified_since(self):
+        self.assertEqual(len(self.get_list(self.papers_url)), 5)
+
+        since = timezone.now().replace(microsecond=0).isoformat()
+        self.assertEqual(self.get_list(self.papers_url, modified_since=since), [])
+
+        self.stub_server.modify("/paper/1", name="Geänderter Antrag")
+        self.stub_server.delete("/paper/3")
+        changed = self.get_list(self.papers_url, modified_since=since)
+        self.assertEqual(
+            changed,
+            [self.stub_server.url + "/paper/1", self.stub_server.url + "/paper/3"],
+        )
+
+        # Deleted objects are only listed with the filter
+        self.assertEqual(len(self.get_list(self.papers_url)), 4)
+        paper = requests.get(self.stub_server.url + "/paper/3").json()
+        self.assertTrue(paper["deleted"])
+
+    def test_bodies_and_pdf_files(self):
+        stub_server = OParlStubServer(
+            bodies=2, papers=3, agenda_items=2, pdf_files=True
+        )
+        with stub_server:
+            bodies = requests.get(stub_server.url + "/bodies").json()["data"]
+            self.assertEqual(len(bodies), 2)
+            papers = self.get_list(stub_server.url + "/body/1/papers")
+            self.assertEqual(papers[0], stub_server.url + "/paper/3")
+
+            pdf = requests.get(stub_server.url + "/file/4.pdf").content
+        self.assertIn(b"(Antrag 4) Tj", pdf)
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as fp:
+            fp.write(pdf)
+            fp.flush()
+            self.assertEqual(get_page_count_from_pdf(fp.name), 1)
@@ -0,0 +1,86 @@
+import json
+import threading
+from typing import Dict, List
+
+from django.test import TestCase
+
+from importer.pipeline import ImportPipeline
+
+
+class FakeResolver:
+    """ Serves two pages per list and remembers the page range of each thread """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def load_ahead(self, url: str) -> str:
+        if url.endswith("?page=2"):
+            return json.dumps({"data": [], "links": {}})
+        return json.dumps({"data": [], "links": {"next": url + "?page=2"}})
+
+    def set_list_range(self, url, first_page, last_page):
+        self.local.page = first_page
+
+
+class FakeBody:
+    def __init__(self, resolver: FakeResolver):
+        self.resolver = resolver
+
+    def __getattr__(self, name: str):
+        # get_paper, get_person, ...
+        return lambda: [self.resolver.local.page + "#" + str(i) for i in range(3)]
+
+
+class FakeClient:
+    def __init__(self, resolver: FakeResolver):
+        self.resolver = resolver
+
+    def parse_url(self, url: str):
+        return FakeBody(self.resolver)
+
+
+class FakeBodyObject:
+    def get_id(self):
+        return "https://oparl.example.org/body/1"
+
+
+class FakeImporter:
+    def __init__(self):
+        self.resolver = FakeResolver()
+        self.client = FakeClient(self.resolver)
+        self.errorlist = []  # type: List[str]
+        self.download_queue = None
+        self.persisted = []  # type: List[str]
+        self.lock = threading.Lock()
+
+    def get_list_urls(self, body) -> Dict[str, str]:
+        return {
+            name: "https://oparl.example.org/" + name
+            for name in ["paper", "person", "organization", "meeting"]
+        }
+
+    def get_list_functions(self, list_name: str):
+        return None, None
+
+    def process_caught(self, objects, fn, batchfn) -> int:
+        with self.lock:
+            self.persisted.extend(objects)
+        return 0
+
+
+class TestPipeline(TestCase):
+    def test_pipeline(self):
+        importer = FakeImporter()
+        pipeline = ImportPipeline(importer, 2, 2, 1, queue_size=1)
+        pipeline.run([FakeBodyObject()])
+
+        self.assertEqual(pipeline.pages, 8)
+        self.assertEqual(pipeline.objects, 24)
+        self.assertEqual(importer.errorlist, [])
+        self.assertEqual(len(set(importer.persisted)), 24)
+        self.assertIsNone(importer.download_queue)
+
+        # The organizations come first
+        self.assertTrue(
+            importer.persisted[0].startswith("https://oparl.example.org/organization")
+        )
@@ -0,0 +1,52 @@
+import json
+import os
+import pstats
+import tempfile
+
+from django.test import TestCase
+
+from importer.profiling import ImportProfiler, profile_import, profiled, profiler
+from mainapp.models import Paper
+
+
+@profiled("count_papers", 0)
+def count_papers(model):
+    return model.objects.count()
+
+
+class TestProfiling(TestCase):
+    def test_stages(self):
+        profiler = ImportProfiler()
+        profiler.enable()
+        with profiler.stage("outer"):
+            with profiler.stage("inner", "Paper"):
+                Paper.objects.count()
+                profiler.add_bytes("inner", 100, "Paper")
+            Paper.objects.exists()
+        profiler.disable()
+        # Disabled profilers record nothing
+        with profiler.stage("outer"):
+            Paper.objects.count()
+
+        stages = profiler.report()["stages"]
+        self.assertEqual(stages["outer"]["calls"], 1)
+        self.assertEqual(stages["outer"]["queries"], 2)
+        self.assertEqual(stages["inner"]["queries"], 1)
+        self.assertEqual(stages["inner"]["by_type"]["Paper"]["bytes"], 100)
+        self.assertGreaterEqual(stages["outer"]["time"], stages["inner"]["time"])
+
+    def test_profile_import(self):
+        with tempfile.TemporaryDirectory() as directory:
+            report_path = os.path.join(directory, "report.json")
+            cprofile_path = os.path.join(directory, "import.pstats")
+            with profile_import(report_path, cprofile_path):
+                count_papers(Paper)
+            self.assertFalse(profiler.enabled)
+
+            with open(report_path) as fp:
+                report = json.load(fp)
+            self.assertEqual(report["stages"]["count_papers"]["calls"], 1)
+            self.assertEqual(
+                report["stages"]["count_papers"]["by_type"]["Paper"]["queries"], 1
+            )
+            self.assertTrue(pstats.Stats(cprofile_path).total_calls > 0)
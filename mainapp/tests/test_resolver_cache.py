@@ -0,0 +1,53 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from importer.resolver_cache import SQLiteResolverCache, MinioResolverCache
+from mainapp.tests.tools import MinioMock
+
+
+class TestResolverCache(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "oparl.sqlite3")
+
+    def test_local(self):
+        cache = SQLiteResolverCache(self.path, 1024 * 1024)
+        self.assertIsNone(cache.get("https://oparl.example.org/"))
+        cache.set("https://oparl.example.org/", b'{"id": 1}', '"1"', None)
+        entry = cache.get("https://oparl.example.org/")
+        self.assertEqual(entry.data, b'{"id": 1}')
+        self.assertEqual(entry.etag, '"1"')
+        self.assertIsNone(entry.last_modified)
+        cache.close()
+
+        # The cache survives restarts
+        cache = SQLiteResolverCache(self.path, 1024 * 1024)
+        self.assertEqual(cache.get("https://oparl.example.org/").data, b'{"id": 1}')
+        cache.close()
+
+    def test_eviction(self):
+        # Random data doesn't compress, so every response takes a bit more than 1000 bytes
+        responses = [os.urandom(1000) for _ in range(5)]
+        cache = SQLiteResolverCache(self.path, 4500)
+        for i, data in enumerate(responses[:4]):
+            cache.set(str(i), data)
+        # The first one is the least recently used one afterwards
+        self.assertIsNotNone(cache.get("0"))
+        cache.set("4", responses[4])
+
+        self.assertIsNone(cache.get("1"))
+        for i in [0, 2, 3, 4]:
+            self.assertTrue(cache.get(str(i)).data == responses[i])
+        self.assertLessEqual(cache.size, 4500 * 0.9)
+        cache.close()
+
+    def test_minio(self):
+        with mock.patch("importer.resolver_cache.minio_client", MinioMock()):
+            cache = MinioResolverCache()
+            self.assertIsNone(cache.get("https://oparl.example.org/"))
+            cache.set("https://oparl.example.org/", b"{}", '"1"')
+            self.assertEqual(cache.get("https://oparl.example.org/").data, b"{}")
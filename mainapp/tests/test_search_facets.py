@@ -0,0 +1,42 @@
+from django.test import TestCase
+
+from mainapp.models import Organization
+from mainapp.views.search import aggs_to_context
+
+
+class FakeExecuted:
+    def __init__(self, facets):
+        self.facets = facets
+
+
+class TestSearchFacets(TestCase):
+    fixtures = ["initdata"]
+
+    def test_aggs_to_context(self):
+        organization = Organization.objects.first()
+        executed = FakeExecuted(
+            {
+                "organization": [(organization.id, 3, False), (-1, 2, False)],
+                "person": [],
+                "document_type": [("paper_document", 5, False)],
+            }
+        )
+        context = aggs_to_context(executed)
+        self.assertEqual(context["organization"]["count"], 1)
+        self.assertEqual(
+            len(context["organization"]["list"]), Organization.objects.count()
+        )
+        entry = [i for i in context["organization"]["list"] if i["doc_count"]]
+        self.assertEqual(
+            entry, [{"id": organization.id, "name": organization.name, "doc_count": 3}]
+        )
+        self.assertEqual(context["person"]["count"], 0)
+
+        # The names are only loaded again after a change
+        with self.assertNumQueries(3):
+            aggs_to_context(executed)
+        organization.name = "Renamed"
+        organization.save()
+        context = aggs_to_context(executed)
+        entry = [i for i in context["organization"]["list"] if i["doc_count"]]
+        self.assertEqual(entry[0]["name"], "Renamed")
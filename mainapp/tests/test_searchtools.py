@@ -1,10 +1,18 @@
-from django.test import TestCase
+from copy import deepcopy
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from elasticsearch_dsl.faceted_search import FacetedResponse
 
 from mainapp.functions.search_tools import (
     search_string_to_params,
     params_to_search_string,
     MainappSearch,
     MULTI_MATCH_FIELDS,
+    bump_search_generation,
+    get_search_cache_stats,
+    encode_search_cursor,
+    decode_search_cursor,
 )
 from django.test import TestCase
 
@@ -40,7 +48,7 @@ expected_params = {
             "aggs": {"organization": {"terms": {"field": "organization_ids"}}},
         },
     },
-    "sort": [{"sort_date": {"order": "desc"}}],
+    "sort": [{"sort_date": {"order": "desc"}}, "_uid"],
     "highlight": {
         "fields": {
             "*": {"fragment_size": 150, "pre_tags": "<mark>", "post_tags": "</mark>"}
@@ -73,3 +81,82 @@ class TestSearchtools(TestCase):
         expected = "document-type:file,committee radius:50 sort:date_newest word radius anotherword"
         search_string = params_to_search_string(self.params)
         self.assertEqual(search_string, expected)
+
+    @override_settings(
+        CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "search": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        }
+    )
+    def test_result_cache(self):
+        response = {
+            "hits": {"total": 0, "hits": []},
+            "aggregations": {
+                "_filter_" + name: {name: {"buckets": [{"key": 1, "doc_count": 2}]}}
+                for name in ["document_type", "person", "organization"]
+            },
+        }
+        before = get_search_cache_stats()
+        with mock.patch(
+            "elasticsearch_dsl.Search.execute",
+            side_effect=lambda: FacetedResponse(None, deepcopy(response)),
+        ) as execute:
+            MainappSearch(self.params, limit=10).execute()
+            cached = MainappSearch(self.params, limit=10).execute()
+            self.assertEqual(execute.call_count, 1)
+            self.assertEqual(cached.facets["person"], [(1, 2, False)])
+            self.assertEqual(cached.hits.total, 0)
+
+            MainappSearch(self.params, offset=10, limit=10).execute()
+            self.assertEqual(execute.call_count, 2)
+
+            bump_search_generation()
+            MainappSearch(self.params, limit=10).execute()
+            self.assertEqual(execute.call_count, 3)
+
+        stats = get_search_cache_stats()
+        self.assertEqual(stats["hits"] - before["hits"], 1)
+        self.assertEqual(stats["misses"] - before["misses"], 3)
+
+    def test_no_result_cache(self):
+        """ Without a shared cache, every search goes to elasticsearch """
+        response = {"hits": {"total": 0, "hits": []}}
+        with mock.patch(
+            "elasticsearch_dsl.Search.execute",
+            side_effect=lambda: FacetedResponse(None, deepcopy(response)),
+        ) as execute:
+            MainappSearch(self.params, limit=10, aggregations=False).execute()
+            MainappSearch(self.params, limit=10, aggregations=False).execute()
+            self.assertEqual(execute.call_count, 2)
+
+    def test_cursor(self):
+        sort_values = [1514764800000, "paper_document#3"]
+        cursor = encode_search_cursor(sort_values)
+        self.assertEqual(decode_search_cursor(cursor), sort_values)
+        self.assertIsNone(decode_search_cursor("invalid"))
+        self.assertIsNone(decode_search_cursor(encode_search_cursor({})))
+
+        search = MainappSearch(self.params, limit=10, cursor=cursor, aggregations=False)
+        query = search._s.to_dict()
+        self.assertEqual(query["search_after"], sort_values)
+        self.assertEqual((query["from"], query["size"]), (0, 10))
+        self.assertNotIn("aggs", query)
+
+        search = MainappSearch(self.params, limit=10, cursor="invalid")
+        self.assertEqual(search._s.to_dict()["size"], 0)
+        self.assertEqual(len(search.errors), 1)
+
+        hits = [
+            {
+                "_type": "paper_document",
+                "_id": str(i),
+                "sort": [i, "paper_document#" + str(i)],
+            }
+            for i in range(10)
+        ]
+        search = MainappSearch(self.params, limit=10)
+        response = FacetedResponse(search._s, {"hits": {"total": 20, "hits": hits}})
+        next_cursor = search.get_next_cursor(response)
+        self.assertEqual(decode_search_cursor(next_cursor), [9, "paper_document#9"])
+        last_page = MainappSearch(self.params, limit=20).get_next_cursor(response)
+        self.assertIsNone(last_page)
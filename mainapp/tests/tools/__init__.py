@@ -2,20 +2,43 @@ from collections import defaultdict
 from io import BytesIO
 from typing import Dict, DefaultDict
 
+from minio.definitions import Object
+from minio.error import NoSuchKey
+
 test_media_root = "testdata/media"
 
 
 class MinioMock:
     storage = None  # type: DefaultDict[str, Dict[str, bytes]]
+    metadata = None  # type: DefaultDict[str, Dict[str, Dict[str, str]]]
 
     def __init__(self):
         self.storage = defaultdict(dict)
+        self.metadata = defaultdict(dict)
 
-    def put_object(self, bucket, object_name, data, _len):
+    def put_object(
+        self, bucket, object_name, data, _len, content_type=None, metadata=None
+    ):
         self.storage[bucket][object_name] = data.read()
+        self.metadata[bucket][object_name] = metadata or {}
+
+    def stat_object(self, bucket, object_name):
+        if object_name not in self.storage[bucket]:
+            raise NoSuchKey(None)
+        return Object(
+            bucket,
+            object_name,
+            None,
+            None,
+            len(self.storage[bucket][object_name]),
+            metadata=self.metadata[bucket][object_name],
+        )
 
     def get_object(self, bucket, object_name):
+        if object_name not in self.storage[bucket]:
+            raise NoSuchKey(None)
         return BytesIO(self.storage[bucket][object_name])
 
     def remove_object(self, bucket, object_name):
         del self.storage[bucket][object_name]
+        self.metadata[bucket].pop(object_name, None)
@@ -10,8 +10,9 @@ from mainapp.functions.document_parsing import (
     extract_text_from_pdf,
     get_page_count_from_pdf,
     extract_persons,
+    extract_found_locations,
 )
-from mainapp.models import File, Person
+from mainapp.models import File, Person, SearchStreet
 from mainapp.tests.tools import test_media_root
 
 values = {
@@ -67,6 +68,14 @@ class TestDocumentParsing(TestCase):
         self.assertTrue("Karlstraße 7" in location_names)
         self.assertFalse("Wolfsweg" in location_names)
 
+    def test_location_extraction_after_change(self):
+        """ The cached pipeline must be rebuilt when streets are added """
+        text = "Die Baustelle im Bärenweg wird verlängert."
+        self.assertEqual(extract_found_locations(text), [])
+
+        SearchStreet.objects.create(displayed_name="Bärenweg")
+        self.assertEqual(extract_found_locations(text), [{"name": "Bärenweg"}])
+
     def test_person_extraction(self):
         frank = Person.objects.get(pk=1)
         doug = Person.objects.get(pk=4)
@@ -84,6 +93,27 @@ class TestDocumentParsing(TestCase):
         self.assertTrue(frank in persons)
         self.assertFalse(will in persons)
 
+    def test_person_extraction_after_change(self):
+        """ The cached matcher must be rebuilt when persons are added, renamed or deleted """
+        text = "A text about Zoe Barnes and Frank Underwood."
+        self.assertEqual(
+            [person.name for person in extract_persons(text)], ["Frank Underwood"]
+        )
+
+        zoe = Person.objects.create(
+            name="Zoe Barnes", given_name="Zoe", family_name="Barnes"
+        )
+        self.assertTrue(zoe in extract_persons(text))
+
+        zoe.name = "Zoe Adams"
+        zoe.family_name = "Adams"
+        zoe.save()
+        self.assertFalse(zoe in extract_persons(text))
+
+        frank = Person.objects.get(pk=1)
+        frank.delete()
+        self.assertEqual(extract_persons(text), [])
+
     def test_pdf_parsing(self):
         file = os.path.abspath(os.path.dirname(__name__))
         file = os.path.join(
@@ -1,5 +1,7 @@
 import json
 import logging
+import threading
+from typing import Dict, List, Optional, Tuple
 
 # noinspection PyPackageRequirements
 from csp.decorators import csp_update
@@ -13,6 +15,7 @@ from django.utils.translation import ugettext as _
 from elasticsearch_dsl import Search
 
 from mainapp.documents import DOCUMENT_TYPE_NAMES
+from mainapp.functions.document_parsing import get_table_version
 from mainapp.functions.geo_functions import latlng_to_address
 from mainapp.functions.search_tools import (
     search_string_to_params,
@@ -22,7 +25,7 @@ from mainapp.functions.search_tools import (
     params_to_search_string,
 )
 from mainapp.functions.search_notification_tools import params_are_subscribable
-from mainapp.models import Body, Organization, Person
+from mainapp.models import Body, Organization, Person, OrganizationMembership
 from mainapp.views.utils import (
     handle_subscribe_requests,
     is_subscribed_to_search,
@@ -42,6 +45,7 @@ def _search_to_context(query, main_search: MainappSearch, executed, results, req
         "map": build_map_object(),
         "pagination_length": settings.SEARCH_PAGINATION_LENGTH,
         "total_hits": executed.hits.total,
+        "cursor": main_search.get_next_cursor(executed),
         "subscribable": params_are_subscribable(main_search.params),
         "is_subscribed": is_subscribed_to_search(request.user, main_search.params),
     }
@@ -78,28 +82,44 @@ def search(request, query):
     return render(request, "mainapp/search/search.html", context)
 
 
+_facet_names = None  # type: Optional[Dict[str, List[Tuple[int, str]]]]
+_facet_names_version = None
+_facet_names_lock = threading.Lock()
+
+
+def get_facet_names() -> Dict[str, List[Tuple[int, str]]]:
+    """
+    Returns the ids and names of the organizations and persons that the search can be filtered by, which are
+    only loaded again when one of the tables has changed
+    """
+    global _facet_names, _facet_names_version
+
+    version = [
+        get_table_version(model)
+        for model in [Organization, Person, OrganizationMembership]
+    ]
+
+    with _facet_names_lock:
+        if _facet_names is None or _facet_names_version != version:
+            org = settings.SITE_DEFAULT_ORGANIZATION
+            persons = Person.objects.filter(organizationmembership__organization=org)
+            _facet_names = {
+                "organization": list(Organization.objects.values_list("id", "name")),
+                "person": list(persons.distinct().values_list("id", "name")),
+            }
+            _facet_names_version = version
+        return _facet_names
+
+
 def aggs_to_context(executed):
-    # TODO: Optimize this to get the names from elasticsearch
     new_facets_context = {}
-    org = settings.SITE_DEFAULT_ORGANIZATION
-    bucketing = {
-        "organization": Organization.objects.all(),
-        "person": Person.objects.filter(
-            organizationmembership__organization=org
-        ).distinct(),
-    }
-    for aggs_field, queryset in bucketing.items():
-        aggs_count = 0
-        view_list = []
-        for db_object in queryset:
-            view_object = {"id": db_object.id, "name": db_object.name, "doc_count": 0}
-            setattr(db_object, "doc_count", 0)
-            for bucket in executed.facets[aggs_field]:
-                if bucket[0] == db_object.id:
-                    view_object["doc_count"] = bucket[1]
-                    aggs_count += 1
-                    break
-            view_list.append(view_object)
+    for aggs_field, names in get_facet_names().items():
+        doc_counts = {bucket[0]: bucket[1] for bucket in executed.facets[aggs_field]}
+        view_list = [
+            {"id": db_id, "name": name, "doc_count": doc_counts.get(db_id, 0)}
+            for db_id, name in names
+        ]
+        aggs_count = sum(1 for db_id, name in names if db_id in doc_counts)
         new_facets_context[aggs_field] = {"count": aggs_count, "list": view_list}
 
     searchable_document_types = []
@@ -121,10 +141,20 @@ def search_results_only(request, query):
     """ Returns only the result list items. Used for the endless scrolling """
     params = search_string_to_params(query)
     normalized = params_to_search_string(params)
-    after = int(request.GET.get("after", 0))
-    main_search = MainappSearch(
-        params, offset=after, limit=settings.SEARCH_PAGINATION_LENGTH
-    )
+    cursor = request.GET.get("cursor")
+    if cursor:
+        # The facets don't change while scrolling
+        main_search = MainappSearch(
+            params,
+            limit=settings.SEARCH_PAGINATION_LENGTH,
+            cursor=cursor,
+            aggregations=False,
+        )
+    else:
+        after = int(request.GET.get("after", 0))
+        main_search = MainappSearch(
+            params, offset=after, limit=settings.SEARCH_PAGINATION_LENGTH
+        )
 
     executed = main_search.execute()
     results = [parse_hit(hit) for hit in executed.hits]
@@ -139,12 +169,14 @@ def search_results_only(request, query):
             "partials/subscribe_widget.html", context, request
         ),
         "more_link": reverse(search_results_only, args=[normalized]),
-        # TOOD: Currently we need both because the js for the dropdown facet
-        # and document type facet hasn't been unified
-        "facets": executed.facets.to_dict(),
-        "new_facets": aggs_to_context(executed),
+        "cursor": context["cursor"],
         "query": normalized,
     }
+    if main_search.aggregations:
+        # TOOD: Currently we need both because the js for the dropdown facet
+        # and document type facet hasn't been unified
+        result["facets"] = executed.facets.to_dict()
+        result["new_facets"] = aggs_to_context(executed)
 
     return JsonResponse(result, safe=False)
 
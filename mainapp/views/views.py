@@ -154,7 +154,7 @@ def organization(request, pk):
 
 @csp_update(FRAME_SRC=("'self'", "blob:"))  # Needed for downloading the PDF in PDF.JS
 def file(request, pk, context_meeting_id=None):
-    file = get_object_or_404(File, id=pk)
+    file = get_object_or_404(File.objects.select_related("blob"), id=pk)
     if context_meeting_id:
         context_meeting = get_object_or_404(Meeting, id=context_meeting_id)
     else:
@@ -191,7 +191,7 @@ def file(request, pk, context_meeting_id=None):
     if renderer == "pdf":
         context["pdfjs_iframe_url"] = static("web/viewer.html")
         context["pdfjs_iframe_url"] += "?file=" + reverse(
-            "file-content", args=[file.id]
+            "file-content", args=[file.get_storage_name()]
         )
         if request.GET.get("pdfjs_search"):
             context["pdfjs_iframe_url"] += "#search=" + quote(
@@ -162,6 +162,10 @@ ELASTICSEARCH_ENABLED = env.bool("ELASTICSEARCH_ENABLED", True)
 if ELASTICSEARCH_ENABLED:
     INSTALLED_APPS.append("django_elasticsearch_dsl")
 
+ELASTICSEARCH_DSL_SIGNAL_PROCESSOR = (
+    "mainapp.documents.signals.SearchCacheSignalProcessor"
+)
+
 ELASTICSEARCH_URL = env.str("ELASTICSEARCH_URL", "localhost:9200")
 
 ELASTICSEARCH_DSL = {"default": {"hosts": ELASTICSEARCH_URL}}
@@ -170,6 +174,10 @@ ELASTICSEARCH_INDEX = env.str(
     "ELASTICSEARCH_INDEX", "meine_stadt_transparent_documents"
 )
 
+# Match the documents against the alerts as they are indexed instead of searching each alert in notifyusers.
+# Needs ./manage.py rebuild-alert-percolator first
+ELASTICSEARCH_PERCOLATE_ALERTS = env.bool("ELASTICSEARCH_PERCOLATE_ALERTS", False)
+
 # Language use for stemming, stop words, etc.
 ELASTICSEARCH_LANG = env.str("ELASTICSEARCH_LANG", "german")
 
@@ -185,16 +193,27 @@ if GEOEXTRACT_ENGINE.lower() == "opencage":
 GEOEXTRACT_SEARCH_COUNTRY = env.str("GEOEXTRACT_SEARCH_COUNTRY", "Deutschland")
 GEOEXTRACT_DEFAULT_CITY = env.str("GEOEXTRACT_DEFAULT_CITY")
 
+# Geocoding results are cached in the database. Addresses that couldn't be found are retried earlier
+GEOCODING_CACHE_DAYS = env.int("GEOCODING_CACHE_DAYS", 90)
+GEOCODING_CACHE_NOT_FOUND_DAYS = env.int("GEOCODING_CACHE_NOT_FOUND_DAYS", 7)
+# Nominatim and the free tier of OpenCage allow one request per second
+GEOCODING_MIN_DELAY = env.float("GEOCODING_MIN_DELAY", 1.0)
+
 CITY_AFFIXES = env.list(
     "CITY_AFFIXES",
     default=["Stadt", "Landeshauptstadt", "Gemeinde", "Kreis", "Landkreis"],
 )
 
+# Possible values: azure, tesseract
+OCR_BACKEND = env.str("OCR_BACKEND", "azure")
 OCR_AZURE_KEY = env.str("OCR_AZURE_KEY", None)
 OCR_AZURE_LANGUAGE = env.str("OCR_AZURE_LANGUAGE", "de")
 OCR_AZURE_API = env.str(
     "OCR_AZURE_API", "https://westcentralus.api.cognitive.microsoft.com"
 )
+OCR_TESSERACT_LANGUAGE = env.str("OCR_TESSERACT_LANGUAGE", "deu")
+# Number of pages that are rasterized and recognized at the same time
+OCR_WORKERS = env.int("OCR_WORKERS", 4)
 
 # Configuration regarding the city of choice
 SITE_DEFAULT_BODY = env.int("SITE_DEFAULT_BODY", 1)
@@ -233,6 +252,15 @@ EMBED_PARSED_TEXT_FOR_SCREENREADERS = env.bool(
 
 SEARCH_PAGINATION_LENGTH = 20
 
+# The search results are cached until something is indexed. The web server and the importer need a shared cache,
+# e.g. filecache:// or rediscache://, for the importer to invalidate the results of the web server, so there's
+# no result caching unless one is configured
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "search": env.cache("SEARCH_CACHE_URL", "dummycache://"),
+}
+SEARCH_CACHE_TIMEOUT = env.int("SEARCH_CACHE_TIMEOUT", 300)
+
 SENTRY_DSN = env.str("SENTRY_DSN", None)
 
 # SENTRY_HEADER_ENDPOINT is defined in security.py
@@ -288,6 +316,13 @@ LOGGING.update(env.json("LOGGING", {}))
 OPARL_INDEX = env.str("OPARL_INDEX", "https://mirror.oparl.org/bodies")
 
 OPARL_ENDPOINT = env.str("OPARL_ENDPOINT", None)
+# Where the responses of the oparl server are cached. Possible values: local, minio
+OPARL_CACHE_BACKEND = env.str("OPARL_CACHE_BACKEND", "local")
+OPARL_CACHE_PATH = env.str(
+    "OPARL_CACHE_PATH", os.path.join(BASE_DIR, "cache", "oparl.sqlite3")
+)
+# In megabytes, the least recently used responses are evicted beyond that
+OPARL_CACHE_MAX_SIZE = env.int("OPARL_CACHE_MAX_SIZE", 2048)
 
 TEMPLATE_META = {
     "logo_name": env.str("TEMPLATE_LOGO_NAME", "MST"),